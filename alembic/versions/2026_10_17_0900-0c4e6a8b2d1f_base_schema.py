@@ -0,0 +1,52 @@
+"""base schema
+
+Revision ID: 0c4e6a8b2d1f
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c4e6a8b2d1f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Раньше эти таблицы создавал create_all при старте приложения: в такой
+    # базе ревизия только отмечается, в пустой - цепочка строится с нуля
+    if not op.get_context().as_sql and "tickets" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    for table in ("users", "operators"):
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False, unique=True),
+        )
+        op.create_index(f"ix_{table}_id", table, ["id"])
+    op.create_table(
+        "tickets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("status", sa.Enum("NEW", "IN_PROGRESS", "CLOSED", name="ticketstatus"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("operator_id", sa.Integer(), sa.ForeignKey("operators.id"), nullable=True),
+    )
+    op.create_index("ix_tickets_id", "tickets", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_tickets_id", table_name="tickets")
+    op.drop_table("tickets")
+    sa.Enum(name="ticketstatus").drop(op.get_bind(), checkfirst=True)
+    for table in ("operators", "users"):
+        op.drop_index(f"ix_{table}_id", table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,50 @@
+"""ticket filter indexes
+
+Revision ID: 3f1a9c2e7b41
+Revises: 0c4e6a8b2d1f
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2e7b41'
+down_revision = '0c4e6a8b2d1f'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ("ix_tickets_created_at_id", ["created_at", "id"], None),
+    ("ix_tickets_status_created_at_id", ["status", "created_at", "id"], None),
+    ("ix_tickets_open_created_at_id", ["created_at", "id"], sa.text("status <> 'CLOSED'")),
+    ("ix_tickets_user_id", ["user_id"], None),
+    ("ix_tickets_operator_id_status", ["operator_id", "status"], None),
+)
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в tickets, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                "tickets",
+                columns,
+                postgresql_where=where,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name="tickets",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,31 @@
+"""mailbox checkpoints
+
+Revision ID: 8b2d4f6a1c93
+Revises: 3f1a9c2e7b41
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4f6a1c93'
+down_revision = '3f1a9c2e7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "mailbox_checkpoints",
+        sa.Column("mailbox", sa.String(), nullable=False),
+        sa.Column("uidvalidity", sa.BigInteger(), nullable=False),
+        sa.Column("last_uid", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("mailbox"),
+    )
+
+
+def downgrade():
+    op.drop_table("mailbox_checkpoints")
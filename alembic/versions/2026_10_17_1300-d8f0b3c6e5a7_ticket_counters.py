@@ -0,0 +1,51 @@
+"""ticket counters
+
+Revision ID: d8f0b3c6e5a7
+Revises: c5e7a9b1d2f4
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f0b3c6e5a7'
+down_revision = 'c5e7a9b1d2f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ticket_counters",
+        sa.Column("scope", sa.String(), nullable=False),
+        sa.Column("scope_key", sa.String(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM("NEW", "IN_PROGRESS", "CLOSED", name="ticketstatus", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("slot", sa.Integer(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("scope", "scope_key", "status", "slot"),
+    )
+    # Начальное заполнение, дальше счётчики ведут переходы тикетов
+    op.execute(
+        """
+        INSERT INTO ticket_counters (scope, scope_key, status, slot, count)
+        SELECT 'status', '', status, 0, count(*) FROM tickets
+        WHERE status IS NOT NULL GROUP BY status
+        UNION ALL
+        SELECT 'operator', coalesce(operator_id::text, ''), status, 0, count(*) FROM tickets
+        WHERE status IS NOT NULL GROUP BY 2, status
+        UNION ALL
+        SELECT 'day', coalesce(created_at::date::text, ''), status, 0, count(*) FROM tickets
+        WHERE status IS NOT NULL GROUP BY 2, status
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("ticket_counters")
@@ -0,0 +1,36 @@
+"""ticket search index
+
+Revision ID: e1a4c7d9b2f6
+Revises: d8f0b3c6e5a7
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a4c7d9b2f6'
+down_revision = 'd8f0b3c6e5a7'
+branch_labels = None
+depends_on = None
+
+
+# Выражение должно совпадать с ticket_search_document в models.py, иначе поиск не попадёт в индекс
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', description), 'B')"
+)
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в tickets, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tickets_search "
+            f"ON tickets USING gin (({SEARCH_DOCUMENT}))"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_tickets_search")
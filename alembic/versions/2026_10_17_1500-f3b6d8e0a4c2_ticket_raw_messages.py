@@ -0,0 +1,41 @@
+"""ticket raw messages and attachments
+
+Revision ID: f3b6d8e0a4c2
+Revises: e1a4c7d9b2f6
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b6d8e0a4c2'
+down_revision = 'e1a4c7d9b2f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ticket_raw_messages',
+        sa.Column('ticket_id', sa.Integer(), sa.ForeignKey('tickets.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+    )
+    op.create_table(
+        'ticket_attachments',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('ticket_id', sa.Integer(), sa.ForeignKey('tickets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+    )
+    op.create_index('ix_ticket_attachments_ticket_id', 'ticket_attachments', ['ticket_id'])
+
+
+def downgrade():
+    op.drop_index('ix_ticket_attachments_ticket_id', table_name='ticket_attachments')
+    op.drop_table('ticket_attachments')
+    op.drop_table('ticket_raw_messages')
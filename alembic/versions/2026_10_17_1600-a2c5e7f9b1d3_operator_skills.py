@@ -0,0 +1,24 @@
+"""operator skills
+
+Revision ID: a2c5e7f9b1d3
+Revises: f3b6d8e0a4c2
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c5e7f9b1d3'
+down_revision = 'f3b6d8e0a4c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('operators', sa.Column('skills', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('operators', 'skills')
@@ -0,0 +1,32 @@
+"""ticket source key
+
+Revision ID: b4d6f8a0c2e5
+Revises: a2c5e7f9b1d3
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d6f8a0c2e5'
+down_revision = 'a2c5e7f9b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Колонка без значения по умолчанию: ALTER не переписывает таблицу,
+    # у старых тикетов ключа нет, а NULL не конфликтуют в уникальном индексе
+    op.add_column('tickets', sa.Column('source_key', sa.String(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_tickets_source_key ON tickets (source_key)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_tickets_source_key")
+    op.drop_column('tickets', 'source_key')
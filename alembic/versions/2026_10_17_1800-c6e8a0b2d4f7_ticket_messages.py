@@ -0,0 +1,51 @@
+"""ticket messages
+
+Revision ID: c6e8a0b2d4f7
+Revises: b4d6f8a0c2e5
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e8a0b2d4f7'
+down_revision = 'b4d6f8a0c2e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ticket_messages',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('ticket_id', sa.Integer(), sa.ForeignKey('tickets.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('sender_email', sa.String(), nullable=False),
+        sa.Column('body', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('source_key', sa.String(), nullable=True),
+        sa.Column('raw_size', sa.Integer(), nullable=False),
+        sa.Column('raw', sa.LargeBinary(), nullable=False),
+    )
+    op.create_index(
+        'ix_ticket_messages_ticket_id_created_at', 'ticket_messages', ['ticket_id', 'created_at', 'id']
+    )
+    op.create_index('ix_ticket_messages_source_key', 'ticket_messages', ['source_key'], unique=True)
+    op.add_column(
+        'ticket_attachments',
+        sa.Column(
+            'message_id',
+            sa.Integer(),
+            sa.ForeignKey('ticket_messages.id', name='ticket_attachments_message_id_fkey', ondelete='CASCADE'),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_constraint('ticket_attachments_message_id_fkey', 'ticket_attachments', type_='foreignkey')
+    op.drop_column('ticket_attachments', 'message_id')
+    op.drop_index('ix_ticket_messages_source_key', table_name='ticket_messages')
+    op.drop_index('ix_ticket_messages_ticket_id_created_at', table_name='ticket_messages')
+    op.drop_table('ticket_messages')
@@ -1,23 +1,67 @@
+import asyncio
+import os
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import asc, desc
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.api.v1.enums.enums import SortOrder
-from app.api.v1.models.models import Operator, Ticket, TicketStatus, User
+from app.api.v1.enums.enums import BulkOutcome, ExportFormat, ImportFormat, SortOrder
+from app.api.v1.handlers.attachments import attachment_path, decompress_raw_message
+from app.api.v1.models.models import (
+    Operator,
+    Ticket,
+    TicketAttachment,
+    TicketMessage,
+    TicketRawMessage,
+    TicketStatus,
+    User,
+)
 from app.api.v1.shemas.shemas import (
+    BulkAssignRequest,
+    BulkOperationResponse,
+    BulkStatusRequest,
+    BulkTicketRequest,
+    ImportResult,
+    TicketAttachmentResponse,
     OperatorCreate,
     OperatorResponse,
     TicketCreateRequest,
+    TicketMessageResponse,
+    TicketPage,
     TicketResponse,
+    TicketStats,
     UserCreate,
     UserResponse,
 )
-from app.core.db.session import get_db
-from app.workers.tasks import send_auto_reply, send_close_notification, send_email
+from app.api.v1.services.contacts import import_contacts, insert_contact, iter_lines, iter_records
+from app.api.v1.services.export import EXPORT_MEDIA_TYPES, stream_tickets_export
+from app.api.v1.services.feed import (
+    InvalidEventIdError,
+    parse_event_id,
+    publish_ticket_events,
+    queue_ticket_events,
+    ticket_event,
+    ticket_feed,
+)
+from app.api.v1.services import transitions
+from app.api.v1.services.idempotency import api_source_key, find_tickets_by_source, remember_sources
+from app.api.v1.services.outbox import enqueue_notification, enqueue_notifications
+from app.api.v1.services.stats import read_ticket_stats, record_created_tickets
+from app.api.v1.services.tickets import (
+    CURSOR_NEXT,
+    InvalidCursorError,
+    decode_cursor,
+    fetch_tickets_page,
+    tickets_cache,
+)
+from app.api.v1.services.transitions import TransitionError
+from app.core.config import settings
+from app.core.db.dialect import dialect_insert
+from app.core.db.session import get_db, get_read_db
+from app.workers.tasks import send_email
 
 
 router = APIRouter()
@@ -35,141 +79,377 @@ async def test_email(to_email: str):
 
 @router.put("/tickets/{ticket_id}/close")
 async def close_ticket(ticket_id: int, db: AsyncSession = Depends(get_db)):
-    query = select(Ticket).filter(Ticket.id == ticket_id)
-    result = await db.execute(query)
-    ticket = result.scalars().first()
-    if not ticket:
-        raise HTTPException(status_code=404, detail="Ticket not found")
-
-    if ticket.status == TicketStatus.CLOSED:
-        raise HTTPException(status_code=400, detail="Ticket is already closed")
+    try:
+        user_email = await transitions.close_ticket(db, ticket_id)
+    except TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    ticket.status = TicketStatus.CLOSED
-    db.add(ticket)
+    if user_email:
+        await enqueue_notification(db, "close", user_email)
     await db.commit()
-    await db.refresh(ticket)
-
-    user_query = select(User).filter(User.id == ticket.user_id)
-    user_result = await db.execute(user_query)
-    user = user_result.scalars().first()
-
-    if user:
-        send_close_notification.delay(user.email)
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
 
     return {"message": "Ticket closed and notification sent"}
 
 
 @router.post("/create_ticket", response_model=TicketResponse)
-async def create_ticket(request: TicketCreateRequest, db: AsyncSession = Depends(get_db)):
+async def create_ticket(
+    request: TicketCreateRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Создание тикета.
+
+    С заголовком Idempotency-Key повтор запроса (таймаут клиента, ретрай прокси)
+    возвращает уже созданный тикет с заголовком Idempotent-Replayed: true,
+    ничего не записывая и не отправляя повторный автоответ.
+    """
+    source_key = api_source_key(request.user_id, idempotency_key) if idempotency_key else None
+    if source_key:
+        existing = await find_tickets_by_source(db, [source_key])
+        if existing:
+            response.headers["Idempotent-Replayed"] = "true"
+            return await db.get(Ticket, existing[source_key])
+
     query = select(User).filter(User.id == request.user_id)
     result = await db.execute(query)
     user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    ticket = Ticket(
-        title=request.title,
-        description=request.description,
-        user_id=request.user_id,
-        status=TicketStatus.NEW
+    result = await db.execute(
+        dialect_insert(db, Ticket)
+        .values(
+            title=request.title,
+            description=request.description,
+            user_id=request.user_id,
+            status=TicketStatus.NEW,
+            created_at=datetime.utcnow(),
+            source_key=source_key,
+        )
+        .on_conflict_do_nothing(index_elements=["source_key"])
+        .returning(Ticket)
     )
-    db.add(ticket)
+    ticket = result.scalars().first()
+    if ticket is None:
+        # Параллельный запрос с тем же ключом успел вставить тикет первым
+        await db.rollback()
+        response.headers["Idempotent-Replayed"] = "true"
+        return (await db.execute(select(Ticket).filter(Ticket.source_key == source_key))).scalars().one()
+    await record_created_tickets(db, [(ticket.status, None, ticket.created_at)])
+    queue_ticket_events(db, [ticket_event("created", ticket.id, ticket.status)])
+    await enqueue_notification(db, "auto_reply", user.email, ticket_id=ticket.id)
     await db.commit()
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
     await db.refresh(ticket)
-    send_auto_reply.delay(user.email)
+    if source_key:
+        await remember_sources({source_key: ticket.id})
     return ticket
 
 
 @router.patch("/assign/{ticket_id}/{operator_id}")
 async def assign_ticket(ticket_id: int, operator_id: int, db: AsyncSession = Depends(get_db)):
     """Назначение тикета оператору."""
-    ticket_query = select(Ticket).filter(Ticket.id == ticket_id)
-    ticket_result = await db.execute(ticket_query)
-    ticket = ticket_result.scalars().first()
-    if not ticket:
-        raise HTTPException(status_code=404, detail="Ticket not found")
-    if ticket.status != TicketStatus.NEW:
-        raise HTTPException(status_code=400, detail="Ticket is not in a valid state to be assigned")
-    operator_query = select(Operator).filter(Operator.id == operator_id)
-    operator_result = await db.execute(operator_query)
-    operator = operator_result.scalars().first()
-    if not operator:
-        raise HTTPException(status_code=404, detail="Operator not found")
-    ticket.operator_id = operator_id
-    ticket.status = TicketStatus.IN_PROGRESS
-    db.add(ticket)
+    try:
+        await transitions.assign_ticket(db, ticket_id, operator_id)
+    except TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     await db.commit()
-    await db.refresh(ticket)
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
     return {"message": f"Ticket {ticket_id} assigned to operator {operator_id}"}
 
 
 @router.patch("/update-status/{ticket_id}")
 async def update_ticket_status(ticket_id: int, status: TicketStatus, db: AsyncSession = Depends(get_db)):
-    ticket_query = select(Ticket).filter(Ticket.id == ticket_id)
-    ticket_result = await db.execute(ticket_query)
-    ticket = ticket_result.scalars().first()
-    if not ticket:
-        raise HTTPException(status_code=404, detail="Ticket not found")
-    if ticket.status == TicketStatus.CLOSED:
-        raise HTTPException(status_code=400, detail="Cannot update a closed ticket")
-    ticket.status = status
-    db.add(ticket)
+    try:
+        await transitions.update_ticket_status(db, ticket_id, status)
+    except TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     await db.commit()
-    await db.refresh(ticket)
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
     return {"message": f"Ticket {ticket_id} status updated to {status.value}"}
 
 
-@router.get("/", response_model=List[TicketResponse])
+def bulk_selection(request: BulkTicketRequest):
+    """Список ID или фильтр с позицией курсора из тела bulk-запроса в аргументы сервиса переходов"""
+    filters = after = None
+    if request.filter is not None:
+        filters = request.filter.model_dump()
+        if filters["status"] is not None:
+            filters["status"] = TicketStatus(filters["status"].value)
+    if request.cursor is not None:
+        try:
+            created_at, ticket_id, direction, rank = decode_cursor(request.cursor)
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if direction != CURSOR_NEXT or rank is not None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (created_at, ticket_id)
+    return {"ticket_ids": request.ticket_ids, "filters": filters, "after": after}
+
+
+def bulk_response(results, next_cursor):
+    return {
+        "updated": sum(result["outcome"] == BulkOutcome.ok for result in results),
+        "results": results,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.post("/bulk/close", response_model=BulkOperationResponse)
+async def bulk_close_tickets(request: BulkTicketRequest, db: AsyncSession = Depends(get_db)):
+    """Закрытие тикетов по списку ID или фильтру одним запросом, уведомления уходят одной пачкой."""
+    results, next_cursor, emails = await transitions.bulk_close_tickets(db, **bulk_selection(request))
+    await enqueue_notifications(db, [("close", email, None) for email in emails])
+    await db.commit()
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
+    return bulk_response(results, next_cursor)
+
+
+@router.post("/bulk/assign", response_model=BulkOperationResponse)
+async def bulk_assign_tickets(request: BulkAssignRequest, db: AsyncSession = Depends(get_db)):
+    """Назначение новых тикетов оператору по списку ID или фильтру одним запросом."""
+    try:
+        results, next_cursor = await transitions.bulk_assign_tickets(db, request.operator_id, **bulk_selection(request))
+    except TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await db.commit()
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
+    return bulk_response(results, next_cursor)
+
+
+@router.post("/bulk/update-status", response_model=BulkOperationResponse)
+async def bulk_update_ticket_status(request: BulkStatusRequest, db: AsyncSession = Depends(get_db)):
+    """Смена статуса незакрытых тикетов по списку ID или фильтру одним запросом."""
+    results, next_cursor = await transitions.bulk_update_status(
+        db, TicketStatus(request.status.value), **bulk_selection(request)
+    )
+    await db.commit()
+    await tickets_cache.invalidate()
+    await publish_ticket_events(db)
+    return bulk_response(results, next_cursor)
+
+
+@router.get("/", response_model=TicketPage)
 async def get_tickets(
     status: Optional[TicketStatus] = None,
     start_date: Optional[datetime] = Query(None, description="Начальная дата создания тикета"),
     end_date: Optional[datetime] = Query(None, description="Конечная дата создания тикета"),
-    sort_order: SortOrder = Query(SortOrder.late, description="Сортировка: asc -'Ранние' для старых тикетов, desc - 'Поздние' для новых тикетов"),
-    db: AsyncSession = Depends(get_db),
+    sort_order: Optional[SortOrder] = Query(None, description="Сортировка: asc -'Ранние' для старых тикетов, desc - 'Поздние' для новых тикетов; по умолчанию desc, а с поиском q - по релевантности"),
+    q: Optional[str] = Query(None, min_length=1, max_length=200, description="Поиск по словам из заголовка и описания тикета"),
+    cursor: Optional[str] = Query(None, description="Курсор страницы из next_cursor или prev_cursor предыдущего ответа"),
+    limit: int = Query(settings.TICKETS_PAGE_SIZE, ge=1, le=settings.TICKETS_MAX_PAGE_SIZE, description="Размер страницы"),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
-    Получение списка тикетов с фильтрацией по статусу, дате и сортировкой по времени создания.
+    Получение страницы тикетов с фильтрацией по статусу, дате, поиском по тексту и сортировкой.
+
+    Пагинация курсорная по ключу (created_at, id), с поиском - (релевантность, created_at, id),
+    поэтому время ответа не зависит от глубины страницы.
+    Готовые ответы кэшируются в Redis на TICKETS_CACHE_TTL секунд, промахи
+    читаются с реплики. Записи сбрасывают поколение кэша после коммита, и
+    DATABASE_REPLICA_MAX_LAG секунд после сброса страницы с реплики не
+    сохраняются, чтобы отстающая реплика не закрепила старый список на весь TTL.
     """
-    query = select(Ticket)
-    if status:
-        query = query.filter(Ticket.status == status)
-    if start_date:
-        query = query.filter(Ticket.created_at >= start_date)
-    if end_date:
-        query = query.filter(Ticket.created_at <= end_date)
-    if sort_order == SortOrder.early:
-        query = query.order_by(asc(Ticket.created_at))
-    else:
-        query = query.order_by(desc(Ticket.created_at))
-    result = await db.execute(query)
-    tickets = result.scalars().all()
-    return tickets
+    q = q.strip() if q else None
+    params = {
+        "status": status.name if status else None,
+        "start_date": start_date,
+        "end_date": end_date,
+        "sort_order": sort_order.value if sort_order else None,
+        "q": q,
+        "cursor": cursor,
+        "limit": limit,
+    }
+
+    async def produce():
+        page = await fetch_tickets_page(db, status, start_date, end_date, sort_order, cursor, limit, q)
+        return TicketPage.model_validate(page).model_dump_json()
+
+    try:
+        body = await tickets_cache.get_or_set(params, produce)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/stats", response_model=TicketStats)
+async def get_ticket_stats(
+    days: int = Query(30, ge=1, le=366, description="За сколько последних дней вернуть разбивку по дням создания"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Количество тикетов по статусам, по операторам и по дням создания.
+
+    Читается из счётчиков, которые обновляются при каждом переходе, поэтому
+    не зависит от размера таблицы тикетов.
+    """
+    return await read_ticket_stats(db, days)
+
+
+@router.get("/feed")
+async def get_ticket_feed(
+    status: Optional[TicketStatus] = Query(None, description="Только тикеты, которые входят в этот статус или выходят из него"),
+    operator_id: Optional[int] = Query(None, description="Только тикеты, которые назначаются этому оператору или снимаются с него"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Лента созданий и изменений тикетов в формате Server-Sent Events.
+
+    Браузерный EventSource сам передаёт Last-Event-ID при переподключении,
+    и лента продолжается с пропущенного события.
+    """
+    if last_event_id is not None:
+        try:
+            parse_event_id(last_event_id)
+        except InvalidEventIdError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    def matches(data):
+        if status is not None and status.value not in (data["status"], data["previous_status"]):
+            return False
+        if operator_id is not None and operator_id not in (data["operator_id"], data["previous_operator_id"]):
+            return False
+        return True
+
+    return StreamingResponse(
+        ticket_feed(matches, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Счётчики попаданий и промахов кэша списка тикетов в этом процессе."""
+    return {"tickets": tickets_cache.stats()}
+
+
+@router.get("/export")
+async def export_tickets(
+    format: ExportFormat = Query(ExportFormat.ndjson, description="Формат выгрузки: ndjson или csv"),
+    status: Optional[TicketStatus] = None,
+    start_date: Optional[datetime] = Query(None, description="Начальная дата создания тикета"),
+    end_date: Optional[datetime] = Query(None, description="Конечная дата создания тикета"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Потоковая выгрузка тикетов в NDJSON или CSV с теми же фильтрами, что и список."""
+    return StreamingResponse(
+        stream_tickets_export(db, format, status, start_date, end_date),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="tickets.{format.value}"'},
+    )
+
+
+@router.get("/{ticket_id}/raw")
+async def get_ticket_raw_message(ticket_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Исходное письмо тикета (message/rfc822), из которого он создан."""
+    data = await db.scalar(select(TicketRawMessage.data).where(TicketRawMessage.ticket_id == ticket_id))
+    if data is None:
+        raise HTTPException(status_code=404, detail="Raw message not found")
+    raw = await asyncio.to_thread(decompress_raw_message, data)
+    return Response(content=raw, media_type="message/rfc822")
+
+
+@router.get("/{ticket_id}/messages", response_model=List[TicketMessageResponse])
+async def get_ticket_messages(ticket_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Переписка по тикету: ответы, пришедшие после первого письма, в порядке получения."""
+    result = await db.execute(
+        select(TicketMessage)
+        .where(TicketMessage.ticket_id == ticket_id)
+        .order_by(TicketMessage.created_at, TicketMessage.id)
+    )
+    return result.scalars().all()
+
+
+@router.get("/{ticket_id}/messages/{message_id}/raw")
+async def get_ticket_message_raw(ticket_id: int, message_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Исходное письмо ответа из переписки тикета (message/rfc822)."""
+    data = await db.scalar(
+        select(TicketMessage.raw).where(TicketMessage.id == message_id, TicketMessage.ticket_id == ticket_id)
+    )
+    if data is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    raw = await asyncio.to_thread(decompress_raw_message, data)
+    return Response(content=raw, media_type="message/rfc822")
+
+
+@router.get("/{ticket_id}/attachments", response_model=List[TicketAttachmentResponse])
+async def get_ticket_attachments(ticket_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Список вложений письма тикета."""
+    result = await db.execute(
+        select(TicketAttachment).where(TicketAttachment.ticket_id == ticket_id).order_by(TicketAttachment.id)
+    )
+    return result.scalars().all()
+
+
+@router.get("/{ticket_id}/attachments/{attachment_id}")
+async def download_ticket_attachment(ticket_id: int, attachment_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Содержимое вложения, файл отдаётся с диска потоком."""
+    attachment = await db.scalar(
+        select(TicketAttachment).where(TicketAttachment.id == attachment_id, TicketAttachment.ticket_id == ticket_id)
+    )
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    path = attachment_path(attachment.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Attachment file is missing")
+    return FileResponse(path, media_type=attachment.content_type, filename=attachment.filename)
 
 
 @router.post("/create_user", response_model=UserResponse)
 async def create_user(request: UserCreate, db: AsyncSession = Depends(get_db)):
     """Создание нового пользователя."""
-    query = select(User).filter(User.email == request.email)
-    result = await db.execute(query)
-    existing_user = result.scalars().first()
-    if existing_user:
+    new_user = await insert_contact(db, User, request.name, request.email)
+    if new_user is None:
         raise HTTPException(status_code=400, detail="User already exists")
-    new_user = User(name=request.name, email=request.email)
-    db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     return new_user
 
 
 @router.post("/create_operator", response_model=OperatorResponse)
 async def create_operator(request: OperatorCreate, db: AsyncSession = Depends(get_db)):
     """Создание нового оператора."""
-    query = select(Operator).filter(Operator.email == request.email)
-    result = await db.execute(query)
-    existing_operator = result.scalar()
-    if existing_operator:
+    new_operator = await insert_contact(db, Operator, request.name, request.email, skills=request.skills)
+    if new_operator is None:
         raise HTTPException(status_code=400, detail="Operator already exists")
-    new_operator = Operator(name=request.name, email=request.email)
-    db.add(new_operator)
     await db.commit()
-    await db.refresh(new_operator)
     return new_operator
+
+
+@router.post("/import_users", response_model=ImportResult)
+async def import_users(
+    request: Request,
+    format: ImportFormat = Query(ImportFormat.ndjson, description="Формат тела: ndjson или csv"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Массовый импорт пользователей с upsert по email.
+
+    Тело: JSON lines ({"name": ..., "email": ...} на строку) или CSV с заголовком name,email.
+    """
+    records = iter_records(iter_lines(request.stream()), format)
+    return await import_contacts(db, User, UserCreate, records)
+
+
+@router.post("/import_operators", response_model=ImportResult)
+async def import_operators(
+    request: Request,
+    format: ImportFormat = Query(ImportFormat.ndjson, description="Формат тела: ndjson или csv"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Массовый импорт операторов с upsert по email.
+
+    Тело: JSON lines ({"name": ..., "email": ..., "skills": [...]} на строку)
+    или CSV с заголовком name,email[,skills], навыки в ячейке через запятую.
+    """
+    records = iter_records(iter_lines(request.stream()), format)
+    return await import_contacts(db, Operator, OperatorCreate, records)
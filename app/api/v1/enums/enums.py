@@ -6,6 +6,22 @@ class SortOrder(str, Enum):
     late = "desc"
 
 
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class ImportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class BulkOutcome(str, Enum):
+    ok = "ok"
+    not_found = "not_found"
+    invalid_state = "invalid_state"
+
+
 class TicketStatusEnum(str, Enum):
     NEW = "new"
     IN_PROGRESS = "in_progress"
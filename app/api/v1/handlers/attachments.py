@@ -0,0 +1,74 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from collections import namedtuple
+from email.header import decode_header, make_header
+
+from app.core.config import settings
+
+# Уровень zlib для исходных писем: почти тот же размер, что у 9, но заметно быстрее
+RAW_MESSAGE_COMPRESSION_LEVEL = 6
+
+StoredAttachment = namedtuple("StoredAttachment", "filename content_type size sha256")
+
+
+def attachment_path(sha256):
+    """Путь файла вложения: ATTACHMENTS_DIR/ab/cd/<sha256>"""
+    return os.path.join(settings.ATTACHMENTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def write_attachment(payload):
+    """
+    Запись содержимого вложения на диск по его sha256, возвращает хэш.
+
+    Одинаковые вложения из разных писем хранятся одним файлом. Запись идёт во
+    временный файл и атомарно переименовывается, поэтому читатель никогда не
+    увидит недописанный файл.
+    """
+    sha256 = hashlib.sha256(payload).hexdigest()
+    path = attachment_path(sha256)
+    if os.path.exists(path):
+        return sha256
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return sha256
+
+
+def _filename(part):
+    filename = part.get_filename()
+    if not filename:
+        return "attachment"
+    # Имена вида =?utf-8?b?...?= приходят ещё не декодированными
+    return os.path.basename(str(make_header(decode_header(filename)))) or "attachment"
+
+
+def save_attachments(msg):
+    """
+    Вложения письма на диск по одному: в памяти держится только текущая часть.
+
+    Возвращает [StoredAttachment]; само письмо остаётся прежним.
+    """
+    stored = []
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() != "attachment":
+            continue
+        payload = part.get_payload(decode=True) or b""
+        stored.append(StoredAttachment(_filename(part), part.get_content_type(), len(payload), write_attachment(payload)))
+    return stored
+
+
+def compress_raw_message(raw):
+    return zlib.compress(raw, RAW_MESSAGE_COMPRESSION_LEVEL)
+
+
+def decompress_raw_message(data):
+    return zlib.decompress(data)
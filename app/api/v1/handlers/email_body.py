@@ -0,0 +1,118 @@
+import re
+from html.parser import HTMLParser
+
+from app.core.config import settings
+
+# Блочные теги, после которых в тексте начинается новая строка
+BLOCK_TAGS = {
+    "address", "article", "br", "dd", "div", "dl", "dt", "footer", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hr", "li", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul",
+}
+# Содержимое этих тегов в текст не попадает; blockquote - цитата предыдущего письма
+SKIPPED_TAGS = {"blockquote", "head", "script", "style", "title"}
+
+# Строки, с которых начинается цитируемая переписка
+REPLY_HEADER = re.compile(
+    r"^(On\s.+\swrote:|.+\s(написал|написала|написал\(а\)):"
+    r"|-{2,}\s*(Original Message|Исходное сообщение)\s*-{2,})\s*$",
+    re.IGNORECASE,
+)
+OUTLOOK_FROM = re.compile(r"^(From|От):\s", re.IGNORECASE)
+OUTLOOK_DATE = re.compile(r"^(Sent|Date|Отправлено|Дата):\s", re.IGNORECASE)
+# Разделитель подписи по RFC 3676 и его вариант без пробела
+SIGNATURE_SEPARATOR = re.compile(r"^--\s?$")
+BLANK_LINES = re.compile(r"\n{3,}")
+SPACES = re.compile(r"[ \t\r\f\v]+")
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(SPACES.sub(" ", data))
+
+
+def html_to_text(html):
+    """Текст HTML-письма: без разметки, стилей, скриптов и цитат в blockquote"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def strip_quoted(text):
+    """Отрезание цитируемой переписки и подписи, строки с '>' выбрасываются"""
+    lines = text.splitlines()
+    kept = []
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if REPLY_HEADER.match(stripped) or SIGNATURE_SEPARATOR.match(line):
+            break
+        if OUTLOOK_FROM.match(stripped) and index + 1 < len(lines) and OUTLOOK_DATE.match(lines[index + 1].strip()):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line.rstrip())
+    return "\n".join(kept)
+
+
+def normalize_body(text, html=False, max_length=None):
+    """
+    Описание тикета из тела письма: HTML в текст, без цитат и подписи, не
+    длиннее max_length (по умолчанию TICKET_DESCRIPTION_MAX_LENGTH).
+
+    Если после удаления цитат ничего не осталось, используется текст целиком.
+    """
+    max_length = max_length or settings.TICKET_DESCRIPTION_MAX_LENGTH
+    if html:
+        text = html_to_text(text)
+    text = text.replace("\r\n", "\n").replace("\xa0", " ")
+    body = BLANK_LINES.sub("\n\n", strip_quoted(text)).strip()
+    if not body:
+        body = BLANK_LINES.sub("\n\n", "\n".join(line.rstrip() for line in text.splitlines())).strip()
+    if len(body) > max_length:
+        body = body[:max_length - 1].rstrip() + "…"
+    return body
+
+
+def decode_part(part):
+    """Текст части письма в её кодировке; битые байты заменяются, а не роняют разбор"""
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def extract_body(msg):
+    """
+    Нормализованное тело письма: первая text/plain часть, иначе первая
+    text/html. Вложения (Content-Disposition: attachment) не учитываются.
+    """
+    html = None
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return normalize_body(decode_part(part))
+        if content_type == "text/html" and html is None:
+            html = decode_part(part)
+    return normalize_body(html, html=True) if html is not None else ""
@@ -3,147 +3,538 @@ import email
 import imaplib
 import logging
 import re
-from email.header import decode_header
+from collections import namedtuple
+from datetime import datetime
+from email.header import decode_header, make_header
 
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.api.v1.models.models import Ticket, TicketStatus, User
+from app.api.v1.handlers.attachments import compress_raw_message, save_attachments
+from app.api.v1.handlers.email_body import extract_body
+from app.api.v1.handlers.imap_client import AsyncIMAPClient
+from app.api.v1.models.models import (
+    MailboxCheckpoint,
+    Ticket,
+    TicketAttachment,
+    TicketMessage,
+    TicketRawMessage,
+    TicketStatus,
+    User,
+)
+from app.api.v1.services.feed import publish_ticket_events, queue_ticket_events, ticket_event
+from app.api.v1.services.idempotency import (
+    email_source_key,
+    find_tickets_by_source,
+    message_source_key,
+    remember_sources,
+)
+from app.api.v1.services.outbox import enqueue_notifications
+from app.api.v1.services.stats import record_created_tickets
+from app.api.v1.services.tickets import tickets_cache
 from app.core.config import settings
+from app.core.db.dialect import dialect_insert
 from app.core.db.session import get_db
-from app.workers.tasks import send_auto_reply
+from app.core.metrics import INGEST_MESSAGES, INGEST_STAGE_DURATION
 
-IMAP_SERVER = settings.IMAP_SERVER
-IMAP_PORT = settings.IMAP_PORT
-EMAIL_ACCOUNT = settings.EMAIL_ACCOUNT
-EMAIL_PASSWORD = settings.EMAIL_PASSWORD
+IMAP_FETCH_BATCH_SIZE = settings.IMAP_FETCH_BATCH_SIZE
+
+UID_PATTERN = re.compile(rb"UID (\d+)")
+MESSAGE_ID_PATTERN = re.compile(r"<[^<>\s]+>")
+# Номер тикета в теме: "Re: Ваше обращение #42 принято" - так его пишут все наши уведомления
+TICKET_SUBJECT_TOKEN = re.compile(r"обращени\w*\s+#(\d+)", re.IGNORECASE)
+
+# Принятое письмо: raw - оригинал, сжатый zlib, size - его исходный размер,
+# source_key - ключ идемпотентности (см. services/idempotency.py), references -
+# ключи писем, на которые это письмо отвечает, от ближайшего к началу переписки,
+# ticket_ref - номер тикета из темы
+IncomingEmail = namedtuple(
+    "IncomingEmail", "subject sender_email body raw size attachments source_key references ticket_ref"
+)
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def connect_to_mail():
-    """Подключение к почтовому серверу через IMAP"""
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-        mail.login(EMAIL_ACCOUNT, EMAIL_PASSWORD)
-        logger.info("Успешно подключено к почтовому серверу")
-        return mail
-    except Exception as e:
-        logger.error(f"Ошибка подключения к почтовому серверу: {e}")
-        raise
+async def search_uids(mail: AsyncIMAPClient, *criteria):
+    """UID SEARCH по выбранному ящику"""
+    status, messages = await mail.uid("SEARCH", None, *criteria)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID SEARCH failed: {messages}")
+    return messages[0].split()
+
+
+def build_message_set(uids):
+    """Сжатие списка UID в IMAP message set: 1,2,3,7 -> 1:3,7"""
+    numbers = sorted(int(uid) for uid in uids)
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number != prev + 1:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = number
+        prev = number
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+async def fetch_messages(mail: AsyncIMAPClient, uids):
+    """
+    Получение пачки писем одной командой UID FETCH, возвращает [(uid, raw)].
 
+    BODY.PEEK[] не ставит флаг \\Seen: его выставляет mark_seen после коммита тикетов.
+    """
+    status, msg_data = await mail.uid("FETCH", build_message_set(uids), "(UID BODY.PEEK[])")
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID FETCH failed: {msg_data}")
+    messages = []
+    for response_part in msg_data:
+        if isinstance(response_part, tuple):
+            uid_match = UID_PATTERN.search(response_part[0])
+            messages.append([uid_match.group(1) if uid_match else None, response_part[1]])
+        elif messages and messages[-1][0] is None:
+            # Сервер может прислать UID после литерала: "BODY[] {n} ... UID 42)"
+            uid_match = UID_PATTERN.search(response_part)
+            if uid_match:
+                messages[-1][0] = uid_match.group(1)
+    return [tuple(message) for message in messages]
 
-async def fetch_unread_emails(mail):
-    """Получение всех непрочитанных писем"""
+
+async def mark_seen(mail: AsyncIMAPClient, uids):
+    await mail.uid("STORE", build_message_set(uids), "+FLAGS.SILENT", "(\\Seen)")
+
+
+def read_message(msg):
+    """Разбор письма в (тема, email отправителя, нормализованное тело)"""
+    # "Re: =?utf-8?b?...?=" декодируется в несколько кусков, склеиваем все
+    subject = str(make_header(decode_header(msg["Subject"])))
+    from_ = msg.get("From")
+    name_match = re.search(r'^(.*) <', from_)
+    email_match = re.search(r'<(.+?)>', from_)
+    sender_name = name_match.group(1).strip() if name_match else None
+    sender_email = email_match.group(1).strip() if email_match else None
+
+    logger.info(f"Обрабатываем письмо от {sender_name} ({sender_email}) с темой: {subject}")
+    if sender_name == settings.SENDER_NAME and sender_email == settings.SMTP_EMAIL:
+        return subject, sender_email, extract_body(msg)
+    logger.info(f"Игнорируем письмо от {sender_name} ({sender_email}) с темой: {subject}")
+    return None, None, None
+
+
+def parse_message(raw):
+    """Разбор сырого письма в (тема, email отправителя, тело)"""
     try:
-        mail.select("inbox")
-        status, messages = mail.search(None, 'UNSEEN')
-        if status != "OK":
-            logger.error("Не удалось получить список сообщений")
-            return []
-
-        email_ids = messages[0].split()
-        logger.info(f"Найдено {len(email_ids)} непрочитанных писем")
-        return email_ids
+        return read_message(email.message_from_bytes(raw))
     except Exception as e:
-        logger.error(f"Ошибка получения непрочитанных писем: {e}")
-        return []
+        logger.error(f"Ошибка при парсинге письма: {e}")
+        return None, None, None
 
 
-async def parse_email(mail, email_id):
-    """Парсинг письма для извлечения информации"""
-    try:
-        status, msg_data = mail.fetch(email_id, "(RFC822)")
-        for response_part in msg_data:
-            if isinstance(response_part, tuple):
-                msg = email.message_from_bytes(response_part[1])
-                subject, encoding = decode_header(msg["Subject"])[0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(encoding if encoding else 'utf-8')
-                from_ = msg.get("From")
-                body = ""
-                name_match = re.search(r'^(.*) <', from_)
-                email_match = re.search(r'<(.+?)>', from_)
-                sender_name = name_match.group(1).strip() if name_match else None
-                sender_email = email_match.group(1).strip() if email_match else None
-
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        if content_type == "text/plain":
-                            body = part.get_payload(decode=True).decode()
-                            break
-                        elif content_type == "text/html":
-                            body = part.get_payload(decode=True).decode()
-                            break
-                else:
-                    body = msg.get_payload(decode=True).decode()
-                logger.info(f"Обрабатываем письмо от {sender_name} ({sender_email}) с темой: {subject}")
-                if sender_name == settings.SENDER_NAME and sender_email == settings.SMTP_EMAIL:
-                    return subject, sender_email, body
-                else:
-                    logger.info(f"Игнорируем письмо от {sender_name} ({sender_email}) с темой: {subject}")
+def thread_references(msg):
+    """Ключи источника из In-Reply-To и References: сначала прямой родитель, затем предки от новых к старым"""
+    message_ids = MESSAGE_ID_PATTERN.findall(msg.get("In-Reply-To") or "")
+    message_ids += reversed(MESSAGE_ID_PATTERN.findall(msg.get("References") or ""))
+    return list(dict.fromkeys(message_source_key(message_id) for message_id in message_ids))
 
-        return None, None, None
+
+def subject_ticket_ref(subject):
+    match = TICKET_SUBJECT_TOKEN.search(subject)
+    if match and len(match.group(1)) < 10:  # не выходит за INTEGER id
+        return int(match.group(1))
+    return None
+
+
+def prepare_message(raw):
+    """
+    Принятое письмо в IncomingEmail: тело для описания тикета, сжатый оригинал
+    и вложения, уже записанные на диск. Для отброшенных писем - None.
+
+    Ошибка записи вложений не глотается: пачка откатится и будет прочитана заново.
+    """
+    try:
+        msg = email.message_from_bytes(raw)
+        subject, sender_email, body = read_message(msg)
     except Exception as e:
         logger.error(f"Ошибка при парсинге письма: {e}")
-        return None, None, None
+        return None
+    if not (subject and sender_email and body):
+        return None
+    return IncomingEmail(
+        subject,
+        sender_email,
+        body,
+        compress_raw_message(raw),
+        len(raw),
+        save_attachments(msg),
+        email_source_key(msg.get("Message-ID"), raw),
+        thread_references(msg),
+        subject_ticket_ref(subject),
+    )
 
 
 async def ensure_user_exists(db: AsyncSession, email):
     """Создание пользователя, если он не существует"""
-    user_query = select(User).filter(User.email == email)
-    user_result = await db.execute(user_query)
-    user = user_result.scalars().first()
-    if not user:
-        user = User(name="Generated User", email=email)
-        db.add(user)
+    users = await ensure_users_exist(db, [email])
+    await db.commit()
+    return await db.get(User, users[email])
+
+
+async def ensure_users_exist(db: AsyncSession, emails):
+    """Пакетное создание недостающих пользователей, возвращает {email: id}"""
+    emails = set(emails)
+    result = await db.execute(select(User.email, User.id).filter(User.email.in_(emails)))
+    users = dict(result.all())
+    missing = emails - users.keys()
+    if missing:
+        insert_query = (
+            dialect_insert(db, User)
+            .values([{"name": "Generated User", "email": email} for email in missing])
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(User.email, User.id)
+        )
+        result = await db.execute(insert_query)
+        users.update(result.all())
+        # Пользователей, созданных параллельно другим процессом, дочитываем
+        missing = emails - users.keys()
+        if missing:
+            result = await db.execute(select(User.email, User.id).filter(User.email.in_(missing)))
+            users.update(result.all())
+    return users
+
+
+def parse_messages(messages):
+    return [prepare_message(raw) for _, raw in messages]
+
+
+def mailbox_key(folder):
+    return f"{settings.EMAIL_ACCOUNT}/{folder}"
+
+
+async def save_checkpoint(db: AsyncSession, mailbox, uidvalidity, last_uid):
+    """Сдвиг UID-чекпоинта ящика в текущей транзакции"""
+    upsert = dialect_insert(db, MailboxCheckpoint).values(
+        mailbox=mailbox, uidvalidity=uidvalidity, last_uid=last_uid, updated_at=datetime.utcnow()
+    )
+    await db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["mailbox"],
+            set_={
+                "uidvalidity": upsert.excluded.uidvalidity,
+                "last_uid": upsert.excluded.last_uid,
+                "updated_at": upsert.excluded.updated_at,
+            },
+        )
+    )
+
+
+async def resolve_threads(db: AsyncSession, messages):
+    """
+    {ключ письма: id тикета} для ответов на уже принятые письма.
+
+    Родитель ищется по In-Reply-To/References одним поиском по ключам
+    источника (Redis, затем уникальные индексы source_key тикетов и
+    сообщений), поэтому цена не зависит от числа хранимых писем. Если
+    заголовков нет, тикет берётся по номеру из темы, но только когда
+    отправитель - автор тикета.
+    """
+    references = await find_tickets_by_source(db, [key for message in messages for key in message.references])
+    threads = {}
+    by_subject = []
+    for message in messages:
+        ticket_id = next((references[key] for key in message.references if key in references), None)
+        if ticket_id is not None:
+            threads[message.source_key] = ticket_id
+        elif message.ticket_ref is not None:
+            by_subject.append(message)
+    if by_subject:
+        result = await db.execute(
+            select(Ticket.id, User.email)
+            .join(User, Ticket.user_id == User.id)
+            .filter(Ticket.id.in_({message.ticket_ref for message in by_subject}))
+        )
+        authors = dict(result.all())
+        for message in by_subject:
+            if authors.get(message.ticket_ref) == message.sender_email:
+                threads[message.source_key] = message.ticket_ref
+    return threads
+
+
+async def create_tickets(db: AsyncSession, messages):
+    """Тикеты из писем с исходниками, вложениями, счётчиками, событиями и автоответами, возвращает [(id тикета, письмо)]"""
+    users = await ensure_users_exist(db, [message.sender_email for message in messages])
+    created_at = datetime.utcnow()
+    result = await db.execute(
+        dialect_insert(db, Ticket)
+        .on_conflict_do_nothing(index_elements=["source_key"])
+        .returning(Ticket.source_key, Ticket.id),
+        [
+            {
+                "title": message.subject,
+                "description": message.body,
+                "user_id": users[message.sender_email],
+                "status": TicketStatus.NEW,
+                "created_at": created_at,
+                "source_key": message.source_key,
+            }
+            for message in messages
+        ],
+    )
+    ticket_ids = dict(result.all())
+    created = [(ticket_ids[message.source_key], message) for message in messages if message.source_key in ticket_ids]
+    if not created:
+        return created
+    await db.execute(
+        insert(TicketRawMessage),
+        [{"ticket_id": ticket_id, "size": message.size, "data": message.raw} for ticket_id, message in created],
+    )
+    attachments = [
+        {"ticket_id": ticket_id, **attachment._asdict()}
+        for ticket_id, message in created
+        for attachment in message.attachments
+    ]
+    if attachments:
+        await db.execute(insert(TicketAttachment), attachments)
+    await record_created_tickets(db, [(TicketStatus.NEW, None, created_at)] * len(created))
+    queue_ticket_events(db, [ticket_event("created", ticket_id, TicketStatus.NEW) for ticket_id, _ in created])
+    await enqueue_notifications(db, [
+        ("auto_reply", message.sender_email, {"ticket_id": ticket_id}) for ticket_id, message in created
+    ])
+    return created
+
+
+async def append_replies(db: AsyncSession, replies):
+    """Ответы [(id тикета, письмо)] в переписку тикетов вместе с вложениями, возвращает добавленные"""
+    created_at = datetime.utcnow()
+    result = await db.execute(
+        dialect_insert(db, TicketMessage)
+        .on_conflict_do_nothing(index_elements=["source_key"])
+        .returning(TicketMessage.source_key, TicketMessage.id),
+        [
+            {
+                "ticket_id": ticket_id,
+                "sender_email": message.sender_email,
+                "body": message.body,
+                "created_at": created_at,
+                "source_key": message.source_key,
+                "raw_size": message.size,
+                "raw": message.raw,
+            }
+            for ticket_id, message in replies
+        ],
+    )
+    message_ids = dict(result.all())
+    appended = [(ticket_id, message) for ticket_id, message in replies if message.source_key in message_ids]
+    attachments = [
+        {"ticket_id": ticket_id, "message_id": message_ids[message.source_key], **attachment._asdict()}
+        for ticket_id, message in appended
+        for attachment in message.attachments
+    ]
+    if attachments:
+        await db.execute(insert(TicketAttachment), attachments)
+    return appended
+
+
+async def adopt_orphan_replies(db: AsyncSession, replies):
+    """
+    Проверка тикетов ответов [(id тикета, письмо)] перед записью в переписку.
+
+    Тикеты блокируются FOR KEY SHARE до коммита, чтобы их не удалили между
+    проверкой и вставкой. Ответы на тикет, которого уже нет, не должны
+    ронять внешний ключ и останавливать всю папку: первое такое письмо
+    становится новым тикетом, остальные ответы той же ветки - его перепиской.
+    Возвращает (ответы на существующие тикеты, [(id тикета, письмо)] созданных).
+    """
+    result = await db.execute(
+        select(Ticket.id).where(Ticket.id.in_({ticket_id for ticket_id, _ in replies})).with_for_update(key_share=True)
+    )
+    parents = set(result.scalars())
+    orphans = {}
+    for ticket_id, message in replies:
+        if ticket_id not in parents:
+            orphans.setdefault(ticket_id, []).append(message)
+    if not orphans:
+        return replies, []
+    logger.warning(f"Тикеты {sorted(orphans)} из переписки не найдены, ответы станут новыми тикетами")
+    created = await create_tickets(db, [messages[0] for messages in orphans.values()])
+    created_ids = {message.source_key: ticket_id for ticket_id, message in created}
+    adopted = [
+        (created_ids[messages[0].source_key], message)
+        for messages in orphans.values()
+        if messages[0].source_key in created_ids
+        for message in messages[1:]
+    ]
+    return [(ticket_id, message) for ticket_id, message in replies if ticket_id in parents] + adopted, created
+
+
+async def process_email_batch(db: AsyncSession, mail: AsyncIMAPClient, uids, checkpoint=None):
+    """
+    Обработка пачки писем: один FETCH, одна транзакция, одна пачка автоответов.
+
+    checkpoint - (mailbox, uidvalidity): если задан, чекпоинт сдвигается на
+    последний UID пачки в той же транзакции, что и тикеты и автоответы в outbox.
+
+    Письмо, тикет по которому уже есть (тот же Message-ID: повторная доставка,
+    повторное чтение после сбоя до сдвига чекпоинта), не создаёт ни тикета,
+    ни автоответа. Параллельную вставку того же письма отсекает
+    ON CONFLICT (source_key) DO NOTHING. Ответы на существующие тикеты
+    (resolve_threads) и на письма этой же пачки добавляются в переписку
+    тикета без автоответа; ответ на тикет, которого уже нет, становится новым
+    тикетом (adopt_orphan_replies). Возвращает число созданных тикетов и ответов.
+    """
+    with INGEST_STAGE_DURATION.labels("fetch").time():
+        messages = await fetch_messages(mail, uids)
+    # Разбор MIME, сжатие и запись вложений нагружают CPU и диск, уводим их с event loop
+    with INGEST_STAGE_DURATION.labels("parse").time():
+        parsed = await asyncio.get_running_loop().run_in_executor(None, parse_messages, messages)
+    accepted = [message for message in parsed if message is not None]
+    skipped = len(messages) - len(accepted)
+    if skipped:
+        logger.info(f"{skipped} писем не прошли фильтрацию и были пропущены")
+
+    # Одинаковые письма внутри пачки считаются одним
+    unique = {}
+    for message in accepted:
+        unique.setdefault(message.source_key, message)
+    existing = await find_tickets_by_source(db, unique)
+    duplicates = len(accepted) - len(unique) + len(existing)
+    if duplicates:
+        logger.info(f"{duplicates} писем уже приняты раньше и были пропущены")
+
+    fresh = [message for key, message in unique.items() if key not in existing]
+    threads = await resolve_threads(db, fresh)
+    # Ответы на письма этой же пачки: threads пополняется по ходу, а для писем,
+    # из которых тикет только создаётся, запоминается ключ этого письма (batch_roots)
+    new_messages = []
+    replies = []  # [(id тикета, письмо)]
+    batch_replies = []  # [(ключ письма, из которого создаётся тикет, письмо)]
+    batch_roots = {}
+    for message in fresh:
+        parent = next((key for key in message.references if key in threads or key in batch_roots), None)
+        if message.source_key in threads or parent in threads:
+            threads[message.source_key] = threads.get(message.source_key) or threads[parent]
+            replies.append((threads[message.source_key], message))
+        elif parent is not None:
+            batch_roots[message.source_key] = batch_roots[parent]
+            batch_replies.append((batch_roots[parent], message))
+        else:
+            batch_roots[message.source_key] = message.source_key
+            new_messages.append(message)
+
+    created = await create_tickets(db, new_messages) if new_messages else []
+    if batch_replies:
+        created_ids = {message.source_key: ticket_id for ticket_id, message in created}
+        lost = [root for root, _ in batch_replies if root not in created_ids]
+        if lost:
+            # Тикет из письма пачки успел создать параллельный процесс
+            created_ids.update(await find_tickets_by_source(db, lost))
+        replies += [(created_ids[root], message) for root, message in batch_replies]
+    if replies:
+        replies, recreated = await adopt_orphan_replies(db, replies)
+        created += recreated
+    appended = await append_replies(db, replies) if replies else []
+    if checkpoint is not None:
+        mailbox, uidvalidity = checkpoint
+        await save_checkpoint(db, mailbox, uidvalidity, max(int(uid) for uid in uids))
+    with INGEST_STAGE_DURATION.labels("commit").time():
         await db.commit()
-        await db.refresh(user)
-    return user
+    INGEST_MESSAGES.labels("filtered").inc(skipped)
+    INGEST_MESSAGES.labels("duplicate").inc(duplicates)
+    INGEST_MESSAGES.labels("ticket").inc(len(created))
+    INGEST_MESSAGES.labels("reply").inc(len(appended))
 
+    await mark_seen(mail, uids)
+    if created or appended:
+        await remember_sources({message.source_key: ticket_id for ticket_id, message in created + appended})
+    if created:
+        await tickets_cache.invalidate()
+        await publish_ticket_events(db)
+        logger.info(f"Создано {len(created)} тикетов из {len(messages)} писем")
+    if appended:
+        logger.info(f"{len(appended)} ответов добавлено в переписку существующих тикетов")
+    return len(created) + len(appended)
 
-async def process_incoming_emails(db: AsyncSession):
-    """Обработка входящих писем, извлечение данных и создание тикетов"""
+
+async def process_incoming_emails(db: AsyncSession, mail: AsyncIMAPClient, folder=None):
+    """
+    Обработка новых писем ящика пачками по IMAP_FETCH_BATCH_SIZE, возвращает число писем.
+
+    Новые письма определяются по UID-чекпоинту в базе, а не по флагу UNSEEN:
+    если UIDNEXT не сдвинулся, ящик даже не ищется, иначе запрашиваются только
+    UID выше последнего закоммиченного. При первом запуске и смене UIDVALIDITY
+    обрабатываются непрочитанные письма, после чего чекпоинт ставится на UIDNEXT - 1.
+    """
+    folder = folder or settings.IMAP_FOLDER
+    mailbox = mailbox_key(folder)
     try:
-        mail = await connect_to_mail()
-        email_ids = await fetch_unread_emails(mail)
-
-        if email_ids:
-            for email_id in email_ids:
-                subject, from_, body = await parse_email(mail, email_id)
-                if subject and from_ and body:
-                    user = await ensure_user_exists(db, from_)
-                    ticket = Ticket(
-                        title=subject,
-                        description=body,
-                        user_id=user.id,
-                        status=TicketStatus.NEW
-                    )
-                    db.add(ticket)
-                    await db.commit()
-                    await db.refresh(ticket)
-                    send_auto_reply.delay(user.email)
-                    logger.info(f"Тикет создан для пользователя {user.email}")
-                else:
-                    logger.info("Письмо не прошло фильтрацию и было пропущено")
-        else:
-            logger.info("Нет непрочитанных писем для обработки")
+        await mail.ensure_connected()
+        uidvalidity, uidnext = await mail.select(folder)
+        result = await db.execute(
+            select(MailboxCheckpoint.uidvalidity, MailboxCheckpoint.last_uid)
+            .filter(MailboxCheckpoint.mailbox == mailbox)
+        )
+        checkpoint = result.first()
+
+        if checkpoint is None or checkpoint.uidvalidity != uidvalidity:
+            logger.info(f"Чекпоинт ящика {mailbox} не найден или устарел, обрабатываем непрочитанные письма")
+            uids = await search_uids(mail, "UNSEEN")
+            for start in range(0, len(uids), IMAP_FETCH_BATCH_SIZE):
+                await process_email_batch(db, mail, uids[start:start + IMAP_FETCH_BATCH_SIZE])
+            last_uid = max([int(uid) for uid in uids] + [(uidnext or 1) - 1])
+            await save_checkpoint(db, mailbox, uidvalidity, last_uid)
+            await db.commit()
+            return len(uids)
+
+        last_uid = checkpoint.last_uid
+        if uidnext is not None and uidnext - 1 <= last_uid:
+            return 0
+        # "N:*" всегда включает последнее письмо, даже если его UID меньше N
+        uids = [uid for uid in await search_uids(mail, "UID", f"{last_uid + 1}:*") if int(uid) > last_uid]
+        for start in range(0, len(uids), IMAP_FETCH_BATCH_SIZE):
+            await process_email_batch(
+                db, mail, uids[start:start + IMAP_FETCH_BATCH_SIZE], checkpoint=(mailbox, uidvalidity)
+            )
+        if not uids:
+            logger.info("Нет новых писем для обработки")
+        return len(uids)
     except Exception as e:
         logger.error(f"Ошибка при обработке входящих писем: {e}")
+        await db.rollback()
+        await mail.reset()
+        return 0
+
+
+async def watch_mailbox(folder=None):
+    """
+    Слушатель папки folder (по умолчанию IMAP_FOLDER) на одном постоянном IMAP-соединении.
+
+    В режиме idle после каждой обработки ящика ждём push-уведомление IMAP IDLE,
+    поэтому тикет появляется примерно через секунду после доставки письма.
+    Если сервер не умеет IDLE (или выбран режим poll), ящик опрашивается с
+    интервалом от EMAIL_POLL_MIN_INTERVAL до EMAIL_POLL_MAX_INTERVAL: пустые
+    опросы удваивают интервал, найденное письмо сбрасывает его к минимуму.
+    """
+    mail = AsyncIMAPClient.from_settings()
+    interval = settings.EMAIL_POLL_MIN_INTERVAL
+    try:
+        while True:
+            try:
+                found = 0
+                async for db in get_db():
+                    found = await process_incoming_emails(db, mail, folder)
+                if mail.connected and settings.EMAIL_LISTENER_MODE == "idle" and mail.supports_idle:
+                    await mail.idle(settings.EMAIL_IDLE_TIMEOUT)
+                    interval = settings.EMAIL_POLL_MIN_INTERVAL
+                    continue
+                if found:
+                    interval = settings.EMAIL_POLL_MIN_INTERVAL
+                else:
+                    interval = min(interval * 2, settings.EMAIL_POLL_MAX_INTERVAL)
+            except Exception as e:
+                logger.error(f"Ошибка при проверке почты: {e}")
+                await mail.reset()
+                interval = min(interval * 2, settings.EMAIL_POLL_MAX_INTERVAL)
+            await asyncio.sleep(interval)
     finally:
-        mail.logout()
-
-
-async def check_emails_periodically():
-    """Проверка почты каждую минуту"""
-    while True:
-        try:
-            async for db in get_db():
-                await process_incoming_emails(db)
-            await asyncio.sleep(60)
-        except Exception as e:
-            logger.error(f"Ошибка при проверке почты: {e}")
-            await asyncio.sleep(60)
+        await mail.close()
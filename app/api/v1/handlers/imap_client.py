@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import imaplib
+import logging
+import socket
+import ssl
+from select import select as wait_readable
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def has_buffered_data(mail):
+    """
+    Есть ли у imaplib уже принятые, но не прочитанные данные.
+
+    peek() буферизованного файла на время вызова переводится в неблокирующий
+    режим: данные из буфера он вернёт сразу, а пустой сокет не заблокирует.
+    """
+    sock = mail.sock
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+class AsyncIMAPClient:
+    """
+    Постоянное IMAP-соединение, не блокирующее event loop.
+
+    imaplib синхронный и не потокобезопасный, поэтому все вызовы идут через
+    выделенный однопоточный executor: команды одного соединения выполняются
+    строго по очереди, а event loop в это время обслуживает API.
+    """
+
+    def __init__(self, host, port, user, password, use_ssl=True):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self._mail = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imap")
+        # Пара сокетов, чтобы прервать ожидание IDLE из event loop
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.IMAP_SERVER,
+            settings.IMAP_PORT,
+            settings.EMAIL_ACCOUNT,
+            settings.EMAIL_PASSWORD,
+            use_ssl=settings.IMAP_SSL,
+        )
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _connect(self):
+        imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+        mail = imap_class(self.host, self.port)
+        mail.login(self.user, self.password)
+        self._mail = mail
+        logger.info("Успешно подключено к почтовому серверу")
+
+    def _ensure_connected(self):
+        if self._mail is not None:
+            try:
+                self._mail.noop()
+                return
+            except (imaplib.IMAP4.error, OSError) as e:
+                logger.warning(f"IMAP-соединение потеряно, переподключаемся: {e}")
+                self._drop()
+        try:
+            self._connect()
+        except Exception as e:
+            logger.error(f"Ошибка подключения к почтовому серверу: {e}")
+            raise
+
+    def _drop(self):
+        mail, self._mail = self._mail, None
+        if mail is not None:
+            try:
+                mail.shutdown()
+            except OSError:
+                pass
+
+    def _logout(self):
+        mail, self._mail = self._mail, None
+        if mail is not None:
+            try:
+                mail.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+
+    def _call(self, name, *args):
+        return getattr(self._mail, name)(*args)
+
+    def _select(self, mailbox):
+        status, data = self._mail.select(mailbox)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"SELECT {mailbox} failed: {data}")
+        _, uidvalidity = self._mail.response("UIDVALIDITY")
+        _, uidnext = self._mail.response("UIDNEXT")
+        uidnext = int(uidnext[0]) if uidnext and uidnext[0] else None
+        return int(uidvalidity[0]), uidnext
+
+    def _idle(self, timeout):
+        mail = self._mail
+        if mail is None:
+            return False
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        response = mail.readline()
+        if not response.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {response!r}")
+
+        # Ждём первое непомеченное сообщение сервера (обычно "* N EXISTS").
+        # Оно могло прийти одним пакетом с "+ idling" и уже лежать в буфере
+        # mail.file (или в буфере TLS), где select по сокету его не увидит
+        sock = mail.sock
+        if has_buffered_data(mail):
+            ready = [sock]
+        else:
+            ready, _, _ = wait_readable([sock, self._wakeup_reader], [], [], timeout)
+        changed = False
+        if self._wakeup_reader in ready:
+            self._drain_wakeup()
+        elif ready:
+            changed = b"EXISTS" in mail.readline()
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            if line.startswith(tag):
+                break
+            changed = changed or b"EXISTS" in line
+        return changed
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_reader.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+
+    @property
+    def connected(self):
+        return self._mail is not None
+
+    @property
+    def supports_idle(self):
+        return self._mail is not None and "IDLE" in self._mail.capabilities
+
+    async def ensure_connected(self):
+        """Проверка соединения через NOOP и переподключение при обрыве"""
+        await self._run(self._ensure_connected)
+
+    async def reset(self):
+        """Сброс соединения после ошибки: следующий вызов переподключится"""
+        await self._run(self._drop)
+
+    async def select(self, mailbox="inbox"):
+        """SELECT ящика, возвращает (UIDVALIDITY, UIDNEXT или None)"""
+        return await self._run(self._select, mailbox)
+
+    async def uid(self, command, *args):
+        return await self._run(self._call, "uid", command, *args)
+
+    async def idle(self, timeout):
+        """
+        IMAP IDLE (RFC 2177) на выбранном ящике: ждёт уведомления о новых
+        письмах не дольше timeout секунд. Возвращает True, если письма пришли.
+        """
+        return await self._run(self._idle, timeout)
+
+    def interrupt(self):
+        """Досрочный выход из IDLE (потокобезопасно)"""
+        self._wakeup_writer.send(b"\0")
+
+    async def close(self):
+        self.interrupt()
+        await self._run(self._logout)
+        self._executor.shutdown(wait=False)
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
@@ -1,8 +1,8 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Enum, ForeignKey, Index, Integer, LargeBinary, String, func, literal_column, text
+from sqlalchemy.orm import declarative_base, deferred, relationship
 
 Base = declarative_base()
 
@@ -27,6 +27,22 @@ class Operator(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
+    # Ключевые слова для автоназначения (стратегия skills), в нижнем регистре
+    skills = Column(JSON, nullable=True, default=list)
+
+
+def ticket_search_document(title, description):
+    """
+    tsvector тикета для полнотекстового поиска: заголовок весом A, описание весом B.
+
+    Конфигурация simple не привязана к языку письма. Константы вписаны в SQL
+    литералами: запрос попадает в GIN-индекс ix_tickets_search, только если
+    выражение совпадает с индексным буквально.
+    """
+    config = literal_column("'simple'")
+    return func.setweight(func.to_tsvector(config, title), literal_column("'A'")).op("||")(
+        func.setweight(func.to_tsvector(config, description), literal_column("'B'"))
+    )
 
 
 class Ticket(Base):
@@ -40,5 +56,119 @@ class Ticket(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
     operator_id = Column(Integer, ForeignKey("operators.id"), nullable=True)
+    # Ключ источника для идемпотентного создания: email:<Message-ID> или api:<user_id>:<Idempotency-Key>
+    source_key = Column(String, nullable=True)
     user = relationship("User")
-    operator = relationship("Operator")
\ No newline at end of file
+    operator = relationship("Operator")
+
+    # Индексы под фильтры и сортировку списка тикетов (см. services/tickets.py)
+    __table_args__ = (
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        # Окна массового закрытия и смены статуса по фильтру (services/transitions.py)
+        Index(
+            "ix_tickets_open_created_at_id",
+            "created_at",
+            "id",
+            postgresql_where=text("status <> 'CLOSED'"),
+        ),
+        Index("ix_tickets_user_id", "user_id"),
+        Index("ix_tickets_operator_id_status", "operator_id", "status"),
+        Index("ix_tickets_source_key", "source_key", unique=True),
+        Index(
+            "ix_tickets_search",
+            ticket_search_document(title, description),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class TicketCounter(Base):
+    """
+    Счётчики тикетов для статистики, обновляются в транзакции каждого перехода.
+
+    scope: status - всего по статусу (scope_key пустой), operator - по оператору
+    (scope_key - id или пустой для неназначенных), day - по дню создания
+    (scope_key - YYYY-MM-DD). Каждый счётчик разбит на slot, чтобы параллельные
+    транзакции не ждали блокировку одной горячей строки; читается сумма слотов.
+    """
+    __tablename__ = "ticket_counters"
+
+    scope = Column(String, primary_key=True)
+    scope_key = Column(String, primary_key=True)
+    status = Column(Enum(TicketStatus), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class TicketRawMessage(Base):
+    """
+    Исходное письмо тикета, сжатое zlib. Отдельная таблица, чтобы запросы к
+    tickets не читали мегабайты MIME: письмо загружается только по запросу.
+    """
+    __tablename__ = "ticket_raw_messages"
+
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), primary_key=True)
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class TicketMessage(Base):
+    """
+    Ответ в переписке по тикету: письмо, которое ingestion привязал к уже
+    существующему тикету по In-Reply-To/References или по номеру в теме.
+
+    Сжатое исходное письмо лежит здесь же, но колонка отложенная и при
+    чтении переписки не загружается.
+    """
+    __tablename__ = "ticket_messages"
+
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False)
+    sender_email = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Тот же формат, что у Ticket.source_key: по нему ищутся и ответы на ответы
+    source_key = Column(String, nullable=True)
+    raw_size = Column(Integer, nullable=False)
+    raw = deferred(Column(LargeBinary, nullable=False))
+
+    __table_args__ = (
+        Index("ix_ticket_messages_ticket_id_created_at", "ticket_id", "created_at", "id"),
+        Index("ix_ticket_messages_source_key", "source_key", unique=True),
+    )
+
+
+class TicketAttachment(Base):
+    """Вложение письма тикета; содержимое лежит на диске по sha256 (см. handlers/attachments.py)"""
+    __tablename__ = "ticket_attachments"
+
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Для вложений ответа - сообщение переписки, для вложений первого письма - NULL
+    message_id = Column(Integer, ForeignKey("ticket_messages.id", ondelete="CASCADE"), nullable=True)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+
+
+class MailboxCheckpoint(Base):
+    """Последний UID почтового ящика, письма до которого уже превращены в тикеты"""
+    __tablename__ = "mailbox_checkpoints"
+
+    mailbox = Column(String, primary_key=True)
+    uidvalidity = Column(BigInteger, nullable=False)
+    last_uid = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class OutboxEvent(Base):
+    """Уведомление, записанное в одной транзакции с изменением тикета (отправляет outbox_relay)"""
+    __tablename__ = "notification_outbox"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    kind = Column(String, nullable=False)
+    to_email = Column(String, nullable=False)
+    context = Column(JSON, nullable=False, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,199 @@
+import heapq
+import re
+from abc import ABC, abstractmethod
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.models.models import Operator, Ticket, TicketStatus
+from app.api.v1.services.outbox import enqueue_notifications
+from app.api.v1.services.stats import read_operator_loads
+from app.api.v1.services.transitions import assign_new_tickets
+from app.core.config import settings
+
+WORD = re.compile(r"\w+")
+
+
+class LoadHeap:
+    """
+    Операторы по возрастанию числа открытых тикетов.
+
+    Нагрузки живут в общем словаре loads; при изменении нагрузки в кучу
+    добавляется новая запись, а устаревшие выбрасываются при чтении (ленивое
+    удаление), поэтому и выбор, и обновление - O(log n).
+    """
+
+    def __init__(self, loads, operator_ids):
+        self.loads = loads
+        self.operator_ids = list(operator_ids)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.heap = [(self.loads[operator_id], operator_id) for operator_id in self.operator_ids]
+        heapq.heapify(self.heap)
+
+    def changed(self, operator_id):
+        heapq.heappush(self.heap, (self.loads[operator_id], operator_id))
+        if len(self.heap) > 2 * len(self.operator_ids) + 64:
+            self._rebuild()
+
+    def least(self):
+        """(оператор, нагрузка) с наименьшей нагрузкой или None для пустой кучи"""
+        while self.heap:
+            load, operator_id = self.heap[0]
+            if load == self.loads[operator_id]:
+                return operator_id, load
+            heapq.heappop(self.heap)
+        return None
+
+
+class OperatorRouter(ABC):
+    """
+    Выбор оператора для нового тикета.
+
+    operators - {operator_id: skills}, loads - открытые тикеты операторов,
+    max_open - предел открытых тикетов на оператора (0 - без предела).
+    После назначения вызывается record(operator_id), после отмены - record(operator_id, -1).
+    """
+
+    def __init__(self, operators, loads, max_open=0):
+        self.operators = operators
+        self.loads = {operator_id: loads.get(operator_id, 0) for operator_id in operators}
+        self.max_open = max_open
+
+    def available(self, load):
+        return not self.max_open or load < self.max_open
+
+    @abstractmethod
+    def route(self, title):
+        """id оператора для тикета с заголовком title или None, если назначить некому"""
+
+    def record(self, operator_id, delta=1):
+        self.loads[operator_id] += delta
+
+
+class RoundRobinRouter(OperatorRouter):
+    """По кругу в порядке id, пропуская операторов на пределе max_open"""
+
+    def __init__(self, operators, loads, max_open=0):
+        super().__init__(operators, loads, max_open)
+        self.order = sorted(operators)
+        self.position = 0
+
+    def route(self, title):
+        for _ in range(len(self.order)):
+            operator_id = self.order[self.position]
+            self.position = (self.position + 1) % len(self.order)
+            if self.available(self.loads[operator_id]):
+                return operator_id
+        return None
+
+
+class LeastOpenRouter(OperatorRouter):
+    """Оператору с наименьшим числом открытых тикетов"""
+
+    def __init__(self, operators, loads, max_open=0):
+        super().__init__(operators, loads, max_open)
+        self.heap = LoadHeap(self.loads, operators)
+
+    def route(self, title):
+        least = self.heap.least()
+        if least is None or not self.available(least[1]):
+            return None
+        return least[0]
+
+    def record(self, operator_id, delta=1):
+        super().record(operator_id, delta)
+        self.heap.changed(operator_id)
+
+
+class SkillRouter(LeastOpenRouter):
+    """
+    Наименее загруженному из операторов, чьё ключевое слово есть в заголовке
+    тикета; если таких нет или все на пределе - наименее загруженному из всех.
+    """
+
+    def __init__(self, operators, loads, max_open=0):
+        super().__init__(operators, loads, max_open)
+        members = {}
+        for operator_id, skills in operators.items():
+            for skill in skills or ():
+                members.setdefault(skill, []).append(operator_id)
+        self.skill_heaps = {skill: LoadHeap(self.loads, operator_ids) for skill, operator_ids in members.items()}
+        self.operator_skills = {
+            operator_id: [skill for skill in skills or () if skill in self.skill_heaps]
+            for operator_id, skills in operators.items()
+        }
+
+    def route(self, title):
+        candidates = [
+            self.skill_heaps[word].least()
+            for word in set(WORD.findall(title.lower()))
+            if word in self.skill_heaps
+        ]
+        candidates = [least for least in candidates if least and self.available(least[1])]
+        if candidates:
+            return min(candidates, key=lambda least: least[1])[0]
+        return super().route(title)
+
+    def record(self, operator_id, delta=1):
+        super().record(operator_id, delta)
+        for skill in self.operator_skills[operator_id]:
+            self.skill_heaps[skill].changed(operator_id)
+
+
+ROUTERS = {
+    "round_robin": RoundRobinRouter,
+    "least_open": LeastOpenRouter,
+    "skills": SkillRouter,
+}
+
+
+async def build_router(db: AsyncSession, strategy=None):
+    """Маршрутизатор с нагрузкой операторов из счётчиков статистики (без скана тикетов)"""
+    operators = dict((await db.execute(select(Operator.id, Operator.skills))).all())
+    loads = await read_operator_loads(db)
+    router_class = ROUTERS[strategy or settings.AUTO_ASSIGN_STRATEGY]
+    return router_class(operators, loads, settings.AUTO_ASSIGN_MAX_OPEN_TICKETS)
+
+
+async def auto_assign_batch(db: AsyncSession, strategy=None, limit=None):
+    """
+    Назначение пачки новых неназначенных тикетов, возвращает (назначено, выбрано).
+
+    Тикеты берутся от старых к новым; в PostgreSQL через SKIP LOCKED, так что
+    параллельные воркеры берут разные тикеты. Маршрутизатор строится на пачку,
+    все назначения применяются одним условным UPDATE, пользователям уходят
+    уведомления через outbox. Транзакция не коммитится.
+    """
+    query = (
+        select(Ticket.id, Ticket.title)
+        .where(Ticket.status == TicketStatus.NEW, Ticket.operator_id.is_(None))
+        .order_by(Ticket.created_at, Ticket.id)
+        .limit(limit or settings.AUTO_ASSIGN_BATCH_SIZE)
+    )
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return 0, 0
+
+    router = await build_router(db, strategy)
+    assignments = {}
+    for ticket_id, title in rows:
+        operator_id = router.route(title)
+        if operator_id is not None:
+            assignments[ticket_id] = operator_id
+            router.record(operator_id)
+
+    changes = await assign_new_tickets(db, assignments)
+    if changes:
+        names = dict((await db.execute(
+            select(Operator.id, Operator.name).where(Operator.id.in_({change.operator_id for change in changes}))
+        )).all())
+        await enqueue_notifications(db, [
+            ("assignment", change.extra[0], {"ticket_id": change.id, "operator_name": names[change.operator_id]})
+            for change in changes
+            if change.extra[0]
+        ])
+    return len(changes), len(rows)
@@ -0,0 +1,200 @@
+import codecs
+import csv
+import json
+from collections import deque
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.enums.enums import ImportFormat
+from app.core.config import settings
+from app.core.db.dialect import dialect_insert
+
+# Сколько ошибок строк возвращать в ответе импорта, остальные только считаются
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+
+async def insert_contact(db: AsyncSession, model, name, email, **values):
+    """
+    Создание пользователя или оператора одним INSERT ... ON CONFLICT (email) DO NOTHING.
+
+    values - дополнительные колонки модели (например, skills оператора).
+
+    Возвращает созданный объект или None, если email уже занят: отдельная
+    проверка SELECT не нужна, и параллельные запросы не создадут дубль.
+    """
+    result = await db.execute(
+        dialect_insert(db, model)
+        .values(name=name, email=email, **values)
+        .on_conflict_do_nothing(index_elements=["email"])
+        .returning(model)
+    )
+    return result.scalars().first()
+
+
+async def upsert_contacts(db: AsyncSession, model, contacts):
+    """
+    Пачка контактов (dict колонок модели) с upsert по email.
+
+    Существующим обновляются все переданные колонки, не только имя.
+    Контакты с разным набором колонок пишутся отдельными INSERT: колонка,
+    которой не было в файле, у существующих не затирается.
+    """
+    groups = {}
+    for contact in contacts:
+        groups.setdefault(tuple(contact), []).append(contact)
+    for columns, rows in groups.items():
+        insert_query = dialect_insert(db, model).values(rows)
+        await db.execute(
+            insert_query.on_conflict_do_update(
+                index_elements=["email"],
+                set_={column: insert_query.excluded[column] for column in columns if column != "email"},
+            )
+        )
+
+
+async def iter_lines(stream):
+    """Строки тела запроса с концами строк по мере получения, без чтения всего тела в память"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+class _IncompleteRecord(Exception):
+    """Строки кончились посреди записи CSV (поле в кавычках с переводом строки)"""
+
+
+class _PendingLines:
+    """
+    Источник строк для csv.reader, пополняемый по мере чтения тела.
+
+    Если строки кончились посреди записи, csv.reader прерывается
+    _IncompleteRecord, а строки записи возвращаются в очередь и разбираются
+    заново, когда придёт продолжение. После close() конец очереди - конец данных.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.record = []
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            if self.closed:
+                raise StopIteration
+            raise _IncompleteRecord
+        line = self.pending.popleft()
+        self.record.append(line)
+        return line
+
+    def rewind(self):
+        self.pending.extendleft(reversed(self.record))
+        self.record.clear()
+
+    def close(self):
+        self.closed = True
+
+
+async def _iter_csv_rows(lines):
+    """(номер первой строки записи, поля или текст ошибки) одним csv.reader по мере поступления строк"""
+    source = _PendingLines()
+    reader = csv.reader(source)
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        source.pending.append(line)
+        try:
+            row = next(reader)
+        except _IncompleteRecord:
+            source.rewind()
+            continue
+        except csv.Error as e:
+            row = f"Invalid CSV: {e}"
+        record_number = line_number - len(source.record) + 1
+        source.record.clear()
+        yield record_number, row
+    # Незакрытая кавычка в конце тела: csv.reader отдаёт запись до конца данных
+    source.close()
+    for row in reader:
+        yield line_number - len(source.record) + 1, row
+
+
+async def iter_records(lines, import_format: ImportFormat):
+    """
+    Разбор JSON lines или CSV с заголовком в (номер строки, dict или текст ошибки).
+
+    Поля CSV в кавычках могут содержать переводы строк, номер записи CSV -
+    номер её первой строки.
+    """
+    if import_format == ImportFormat.csv:
+        header = None
+        async for line_number, row in _iter_csv_rows(lines):
+            if isinstance(row, str):
+                yield line_number, row
+            elif not any(field.strip() for field in row):
+                continue
+            elif header is None:
+                header = [column.strip() for column in row]
+            else:
+                yield line_number, dict(zip(header, row))
+        return
+
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def import_contacts(db: AsyncSession, model, schema, records):
+    """
+    Импорт пользователей или операторов с upsert по email.
+
+    Строки проверяются схемой schema и пишутся пачками по IMPORT_CHUNK_SIZE,
+    каждая пачка - один INSERT и свой коммит. Повтор email внутри пачки
+    схлопывается (побеждает последняя строка), существующим обновляются
+    все колонки, заданные в строке (имя, навыки оператора).
+    """
+    imported = failed = 0
+    errors = []
+    chunk = {}
+
+    async def flush():
+        nonlocal imported
+        if chunk:
+            await upsert_contacts(db, model, chunk.values())
+            await db.commit()
+            imported += len(chunk)
+            chunk.clear()
+
+    async for line_number, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            contact = schema.model_validate(record)
+        except (ValidationError, ValueError) as e:
+            failed += 1
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+        chunk[contact.email] = contact.model_dump(exclude_unset=True)
+        if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+            await flush()
+    await flush()
+    return {"imported": imported, "failed": failed, "errors": errors}
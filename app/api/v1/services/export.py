@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.enums.enums import ExportFormat
+from app.api.v1.models.models import Ticket, TicketStatus
+from app.api.v1.services.tickets import filter_tickets
+from app.core.config import settings
+
+TICKET_EXPORT_COLUMNS = (
+    Ticket.id,
+    Ticket.title,
+    Ticket.description,
+    Ticket.status,
+    Ticket.created_at,
+    Ticket.updated_at,
+    Ticket.user_id,
+    Ticket.operator_id,
+)
+EXPORT_FIELDS = [column.key for column in TICKET_EXPORT_COLUMNS]
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+def _row_values(row):
+    values = []
+    for value in row:
+        if isinstance(value, TicketStatus):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    return values
+
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, _row_values(row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(_row_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_tickets_export(
+    db: AsyncSession,
+    export_format: ExportFormat,
+    status: Optional[TicketStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """
+    Выгрузка тикетов порциями через серверный курсор.
+
+    В памяти одновременно находится не больше TICKETS_EXPORT_CHUNK_SIZE строк,
+    поэтому расход памяти не зависит от размера выгрузки.
+    """
+    query = (
+        filter_tickets(select(*TICKET_EXPORT_COLUMNS), status, start_date, end_date)
+        .order_by(Ticket.id)
+        .execution_options(yield_per=settings.TICKETS_EXPORT_CHUNK_SIZE)
+    )
+    try:
+        if export_format == ExportFormat.csv:
+            yield _csv_chunk([], header=True)
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            if export_format == ExportFormat.csv:
+                yield _csv_chunk(rows)
+            else:
+                yield _ndjson_chunk(rows)
+    finally:
+        # Ответ стримится уже после выхода из зависимости сессии,
+        # поэтому соединение возвращаем в пул сами
+        await db.close()
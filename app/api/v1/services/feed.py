@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import redis_client
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Redis Stream с событиями тикетов: id записи - id события для Last-Event-ID
+FEED_STREAM = "tickets:events"
+# Ключ session.info, где копятся события до коммита транзакции
+PENDING_EVENTS = "ticket_feed_events"
+FEED_READ_COUNT = 500
+FEED_READ_BLOCK_MS = 5000
+
+
+class InvalidEventIdError(ValueError):
+    """Last-Event-ID не похож на id записи Redis Stream"""
+
+
+def parse_event_id(event_id):
+    """Id записи потока "<ms>-<seq>" в кортеж для сравнения"""
+    try:
+        milliseconds, sequence = event_id.split("-")
+        return int(milliseconds), int(sequence)
+    except (AttributeError, ValueError) as e:
+        raise InvalidEventIdError(event_id) from e
+
+
+def ticket_event(kind, ticket_id, status, operator_id=None, previous_status=None, previous_operator_id=None):
+    """Событие ленты: created или updated с состоянием тикета до и после"""
+    return {
+        "type": kind,
+        "ticket_id": ticket_id,
+        "status": status.value if status else None,
+        "operator_id": operator_id,
+        "previous_status": previous_status.value if previous_status else None,
+        "previous_operator_id": previous_operator_id,
+    }
+
+
+def queue_ticket_events(db, events):
+    """События публикуются после коммита (publish_ticket_events), откат их выбрасывает"""
+    db.info.setdefault(PENDING_EVENTS, []).extend(events)
+
+
+def queue_ticket_changes(db, changes):
+    """События updated по изменениям TicketChange из сервиса переходов"""
+    queue_ticket_events(db, [
+        ticket_event(
+            "updated",
+            change.id,
+            change.status,
+            change.operator_id,
+            change.previous_status,
+            change.previous_operator_id,
+        )
+        for change in changes
+    ])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_events(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_EVENTS, None)
+
+
+async def publish_ticket_events(db, client=None):
+    """
+    Запись накопленных событий в поток одним pipeline.
+
+    Поток ограничен FEED_STREAM_MAXLEN записями. Как и кэш, лента не ломает
+    запрос при недоступном Redis: событие теряется, консоль увидит изменение
+    при следующей загрузке списка.
+    """
+    events = db.info.pop(PENDING_EVENTS, None)
+    if not events:
+        return
+    client = client or redis_client
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for payload in events:
+                pipe.xadd(
+                    FEED_STREAM,
+                    {"data": json.dumps(payload, separators=(",", ":"))},
+                    maxlen=settings.FEED_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось опубликовать {len(events)} событий тикетов: {e}")
+
+
+def _decode(entry_id, fields):
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id, json.loads(fields[b"data"])
+
+
+async def stream_tail(client):
+    """Id последней записи потока или 0-0 для пустого потока"""
+    entries = await client.xrevrange(FEED_STREAM, count=1)
+    return _decode(*entries[0])[0] if entries else "0-0"
+
+
+class TicketFeedHub:
+    """
+    Раздача ленты подписчикам процесса.
+
+    Поток читает одна задача на процесс (XREAD BLOCK на своём соединении) и
+    раскладывает события по очередям подписчиков, поэтому тысяча открытых
+    консолей - это тысяча asyncio.Queue, а не тысяча соединений с Redis.
+    Очередь медленного подписчика при переполнении закрывается: консоль
+    переподключится с Last-Event-ID и дочитает пропущенное из потока.
+    """
+
+    def __init__(self, client=None):
+        # Без socket_timeout: XREAD блокируется на FEED_READ_BLOCK_MS
+        self.client = client or aioredis.Redis.from_url(settings.REDIS_URL)
+        self.subscribers = set()
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self):
+        """
+        Новая очередь событий (id, событие); None в очереди - подписка закрыта.
+
+        Чтение потока начинается не позже возврата из subscribe, поэтому всё,
+        что записано после, попадёт в очередь.
+        """
+        queue = asyncio.Queue(maxsize=settings.FEED_SUBSCRIBER_QUEUE_SIZE)
+        async with self._lock:
+            self.subscribers.add(queue)
+            if self._task is None or self._task.done():
+                try:
+                    start = await stream_tail(self.client)
+                except RedisError:
+                    self.subscribers.discard(queue)
+                    raise
+                self._task = asyncio.create_task(self._run(start))
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def close(self):
+        """Остановка чтения потока; открытые подписки закрываются"""
+        for queue in list(self.subscribers):
+            self._close(queue)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _dispatch(self, item):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._close(queue)
+
+    def _close(self, queue):
+        self.subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _run(self, last_id):
+        while self.subscribers:
+            try:
+                response = await self.client.xread(
+                    {FEED_STREAM: last_id}, count=FEED_READ_COUNT, block=FEED_READ_BLOCK_MS
+                )
+            except RedisError as e:
+                logger.warning(f"Ошибка чтения ленты тикетов: {e}")
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response or []:
+                for entry in entries:
+                    item = _decode(*entry)
+                    last_id = item[0]
+                    self._dispatch(item)
+
+
+feed_hub = TicketFeedHub()
+
+
+def format_sse(event_id=None, data=None, event_type=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event_type is not None:
+        lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def replay_events(client, last_event_id):
+    """События потока после last_event_id страницами по FEED_READ_COUNT"""
+    while True:
+        entries = await client.xrange(FEED_STREAM, min=f"({last_event_id}", count=FEED_READ_COUNT)
+        for entry in entries:
+            item = _decode(*entry)
+            last_event_id = item[0]
+            yield item
+        if len(entries) < FEED_READ_COUNT:
+            return
+
+
+async def ticket_feed(matches, last_event_id=None, hub=None, client=None):
+    """
+    Лента событий тикетов в формате SSE для событий, подходящих под matches(event).
+
+    С last_event_id сначала отдаются пропущенные события из потока; если он
+    старше начала потока, консоль получает событие reset и должна перечитать
+    список. Раз в FEED_HEARTBEAT_INTERVAL уходит комментарий, чтобы прокси не
+    закрывали простаивающее соединение.
+    """
+    hub = hub or feed_hub
+    client = client or redis_client
+    yield f"retry: {settings.FEED_RETRY_MS}\n\n"
+    try:
+        queue = await hub.subscribe()
+    except RedisError as e:
+        # Клиент переподключится через FEED_RETRY_MS
+        logger.warning(f"Лента тикетов недоступна: {e}")
+        return
+    try:
+        if last_event_id is None:
+            position = parse_event_id(await stream_tail(client))
+        else:
+            position = parse_event_id(last_event_id)
+            first = await client.xrange(FEED_STREAM, count=1)
+            if first and parse_event_id(_decode(*first[0])[0]) > position:
+                yield format_sse(data={"type": "reset"}, event_type="reset")
+            async for event_id, data in replay_events(client, last_event_id):
+                position = parse_event_id(event_id)
+                if matches(data):
+                    yield format_sse(event_id, data, "ticket")
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), settings.FEED_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is None:
+                return
+            event_id, data = item
+            if parse_event_id(event_id) <= position:
+                continue
+            position = parse_event_id(event_id)
+            if matches(data):
+                yield format_sse(event_id, data, "ticket")
+    except RedisError as e:
+        logger.warning(f"Лента тикетов прервана: {e}")
+    finally:
+        hub.unsubscribe(queue)
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.models.models import Ticket, TicketMessage
+from app.core.cache import redis_client
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключи источника длиннее этого хэшируются, чтобы уникальный индекс не разрастался
+SOURCE_KEY_MAX_LENGTH = 200
+
+
+def _bounded(prefix, value):
+    key = f"{prefix}:{value}"
+    if len(key) <= SOURCE_KEY_MAX_LENGTH:
+        return key
+    return f"{prefix}-sha256:{hashlib.sha256(value.encode()).hexdigest()}"
+
+
+def email_source_key(message_id, raw):
+    """
+    Ключ источника письма: Message-ID, а без него - sha256 исходного письма.
+
+    Повторная доставка или повторное чтение того же письма дают тот же ключ.
+    """
+    message_id = (message_id or "").strip()
+    if message_id:
+        return message_source_key(message_id)
+    return f"email-sha256:{hashlib.sha256(raw).hexdigest()}"
+
+
+def message_source_key(message_id):
+    """Ключ источника по Message-ID, в том числе из In-Reply-To и References ответа"""
+    return _bounded("email", message_id.strip())
+
+
+def api_source_key(user_id, idempotency_key):
+    """Ключ источника запроса API: Idempotency-Key в пределах пользователя"""
+    return _bounded(f"api:{user_id}", idempotency_key)
+
+
+def _redis_key(source_key):
+    return f"idempotency:{source_key}"
+
+
+async def find_tickets_by_source(db: AsyncSession, source_keys, client=None):
+    """
+    {ключ источника: id тикета} для уже принятых тикетов и ответов переписки.
+
+    Ответ Redis (один MGET) - только подсказка: тикет могли удалить, базу -
+    восстановить, ключ мог остаться от другого окружения. Поэтому попадания
+    подтверждаются в базе тем же запросом по уникальным индексам source_key
+    тикетов и сообщений, что и промахи, а записи Redis, не совпавшие с базой,
+    перезаписываются или удаляются. Недоступный Redis проверку не ломает.
+    По этим же ключам ingestion находит тикет, к которому относится ответ
+    (In-Reply-To/References).
+    """
+    source_keys = list(dict.fromkeys(source_keys))
+    if not source_keys:
+        return {}
+    client = client or redis_client
+    try:
+        cached = await client.mget([_redis_key(key) for key in source_keys])
+    except RedisError as e:
+        logger.warning(f"Кэш ключей идемпотентности недоступен: {e}")
+        cached = [None] * len(source_keys)
+
+    result = await db.execute(union_all(
+        select(Ticket.source_key, Ticket.id).where(Ticket.source_key.in_(source_keys)),
+        select(TicketMessage.source_key, TicketMessage.ticket_id).where(TicketMessage.source_key.in_(source_keys)),
+    ))
+    found = dict(result.all())
+
+    stale = {}
+    for key, ticket_id in zip(source_keys, cached):
+        if ticket_id is not None and int(ticket_id) != found.get(key):
+            stale[key] = found.get(key)
+    if stale:
+        logger.warning(f"{len(stale)} ключей идемпотентности в Redis не совпали с базой")
+        await remember_sources({key: ticket_id for key, ticket_id in stale.items() if ticket_id is not None}, client)
+        await forget_sources([key for key, ticket_id in stale.items() if ticket_id is None], client)
+    return found
+
+
+async def remember_sources(sources, client=None):
+    """Запоминание {ключ источника: id тикета} в Redis на IDEMPOTENCY_CACHE_TTL после коммита"""
+    if not sources or not settings.IDEMPOTENCY_CACHE_TTL:
+        return
+    client = client or redis_client
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for key, ticket_id in sources.items():
+                pipe.set(_redis_key(key), ticket_id, ex=settings.IDEMPOTENCY_CACHE_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось сохранить {len(sources)} ключей идемпотентности: {e}")
+
+
+async def forget_sources(source_keys, client=None):
+    """Удаление из Redis ключей, id тикетов у которых не подтвердились в базе"""
+    source_keys = list(source_keys)
+    if not source_keys:
+        return
+    client = client or redis_client
+    try:
+        await client.delete(*[_redis_key(key) for key in source_keys])
+    except RedisError as e:
+        logger.warning(f"Не удалось удалить {len(source_keys)} ключей идемпотентности: {e}")
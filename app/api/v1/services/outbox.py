@@ -0,0 +1,23 @@
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.models.models import OutboxEvent
+
+
+async def enqueue_notifications(db: AsyncSession, notifications):
+    """
+    Запись уведомлений [(kind, to_email, context)] в outbox текущей транзакции.
+
+    Коммит остаётся за вызывающим: уведомление появится в outbox только вместе
+    с изменением тикета, а в Celery его опубликует outbox_relay.
+    """
+    rows = [
+        {"kind": kind, "to_email": to_email, "context": context or {}}
+        for kind, to_email, context in notifications
+    ]
+    if rows:
+        await db.execute(insert(OutboxEvent), rows)
+
+
+async def enqueue_notification(db: AsyncSession, kind, to_email, **context):
+    await enqueue_notifications(db, [(kind, to_email, context)])
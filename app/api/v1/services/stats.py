@@ -0,0 +1,145 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, cast, delete, func, insert, literal, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.models.models import Ticket, TicketCounter, TicketStatus
+from app.core.config import settings
+from app.core.db.dialect import dialect_insert
+
+SCOPE_STATUS = "status"
+SCOPE_OPERATOR = "operator"
+SCOPE_DAY = "day"
+
+
+def counter_keys(status, operator_id, created_at):
+    """Счётчики (scope, scope_key, status), в которые попадает тикет"""
+    if status is None:
+        return ()
+    return (
+        (SCOPE_STATUS, "", status),
+        (SCOPE_OPERATOR, "" if operator_id is None else str(operator_id), status),
+        (SCOPE_DAY, created_at.date().isoformat() if created_at else "", status),
+    )
+
+
+async def apply_counter_deltas(db: AsyncSession, deltas: Counter):
+    """Все изменения счётчиков одним INSERT ... ON CONFLICT DO UPDATE в текущей транзакции"""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    # Один слот на транзакцию и сортировка ключей: строки блокируются в одном порядке
+    slot = random.randrange(settings.TICKET_COUNTER_SLOTS)
+    insert_query = dialect_insert(db, TicketCounter).values([
+        {"scope": scope, "scope_key": scope_key, "status": status, "slot": slot, "count": value}
+        for (scope, scope_key, status), value in sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2].name))
+    ])
+    await db.execute(
+        insert_query.on_conflict_do_update(
+            index_elements=["scope", "scope_key", "status", "slot"],
+            set_={"count": TicketCounter.count + insert_query.excluded.count},
+        )
+    )
+
+
+async def record_created_tickets(db: AsyncSession, created):
+    """Учёт новых тикетов: created - [(status, operator_id, created_at)]"""
+    deltas = Counter()
+    for status, operator_id, created_at in created:
+        deltas.update(counter_keys(status, operator_id, created_at))
+    await apply_counter_deltas(db, deltas)
+
+
+async def record_ticket_changes(db: AsyncSession, changes):
+    """Учёт переходов: changes - TicketChange со старыми и новыми статусом и оператором"""
+    deltas = Counter()
+    for change in changes:
+        deltas.subtract(counter_keys(change.previous_status, change.previous_operator_id, change.created_at))
+        deltas.update(counter_keys(change.status, change.operator_id, change.created_at))
+    await apply_counter_deltas(db, deltas)
+
+
+async def read_ticket_stats(db: AsyncSession, days: int):
+    """
+    Статистика из счётчиков: по статусу, по оператору и по дню создания за days дней.
+
+    Размер чтения зависит от числа операторов и дней, а не от числа тикетов.
+    """
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    result = await db.execute(
+        select(TicketCounter.scope, TicketCounter.scope_key, TicketCounter.status, func.sum(TicketCounter.count))
+        .where(
+            TicketCounter.scope.in_([SCOPE_STATUS, SCOPE_OPERATOR])
+            | ((TicketCounter.scope == SCOPE_DAY) & (TicketCounter.scope_key >= since))
+        )
+        .group_by(TicketCounter.scope, TicketCounter.scope_key, TicketCounter.status)
+    )
+    by_status = {status.value: 0 for status in TicketStatus}
+    by_operator = {}
+    by_day = {}
+    for scope, scope_key, status, count in result.all():
+        if not count:
+            continue
+        if scope == SCOPE_STATUS:
+            by_status[status.value] = count
+        elif scope == SCOPE_OPERATOR:
+            by_operator.setdefault(int(scope_key) if scope_key else None, {})[status.value] = count
+        else:
+            by_day.setdefault(scope_key, {})[status.value] = count
+    return {
+        "by_status": by_status,
+        "by_operator": [
+            {"operator_id": operator_id, "counts": counts}
+            for operator_id, counts in sorted(by_operator.items(), key=lambda item: (item[0] is None, item[0] or 0))
+        ],
+        "by_day": [{"day": day, "counts": counts} for day, counts in sorted(by_day.items())],
+    }
+
+
+async def read_operator_loads(db: AsyncSession):
+    """Число открытых (не закрытых) тикетов каждого оператора из счётчиков: {operator_id: count}"""
+    result = await db.execute(
+        select(TicketCounter.scope_key, func.sum(TicketCounter.count))
+        .where(
+            TicketCounter.scope == SCOPE_OPERATOR,
+            TicketCounter.scope_key != "",
+            TicketCounter.status != TicketStatus.CLOSED,
+        )
+        .group_by(TicketCounter.scope_key)
+    )
+    return {int(scope_key): count for scope_key, count in result.all() if count}
+
+
+async def reconcile_ticket_counters(db: AsyncSession):
+    """
+    Пересборка счётчиков с нуля по таблице тикетов.
+
+    В PostgreSQL таблица счётчиков блокируется на время пересборки: переходы,
+    начатые параллельно, применят свои изменения после неё, и ничего не
+    задвоится и не потеряется.
+    """
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("LOCK TABLE ticket_counters IN EXCLUSIVE MODE"))
+    await db.execute(delete(TicketCounter))
+    columns = ["scope", "scope_key", "status", "slot", "count"]
+    # Без bind-параметров: выражение в SELECT и GROUP BY должно совпадать буквально
+    empty = literal_column("''")
+    operator_key = func.coalesce(cast(Ticket.operator_id, String), empty)
+    day_key = func.coalesce(cast(func.date(Ticket.created_at), String), empty)
+    scopes = (
+        (SCOPE_STATUS, empty, ()),
+        (SCOPE_OPERATOR, operator_key, (operator_key,)),
+        (SCOPE_DAY, day_key, (day_key,)),
+    )
+    for scope, scope_key, group_by in scopes:
+        await db.execute(
+            insert(TicketCounter).from_select(
+                columns,
+                select(literal(scope), scope_key, Ticket.status, literal(0), func.count())
+                .where(Ticket.status.is_not(None))
+                .group_by(*group_by, Ticket.status),
+            )
+        )
+    await db.commit()
@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, asc, desc, func, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.enums.enums import SortOrder
+from app.api.v1.models.models import Ticket, TicketStatus, ticket_search_document
+from app.core.cache import ResponseCache
+from app.core.config import settings
+
+CURSOR_NEXT = "next"
+CURSOR_PREV = "prev"
+
+# Колонки для списка тикетов: без description, чтобы не тянуть тела писем
+TICKET_LIST_COLUMNS = (
+    Ticket.id,
+    Ticket.title,
+    Ticket.status,
+    Ticket.created_at,
+    Ticket.updated_at,
+    Ticket.user_id,
+    Ticket.operator_id,
+)
+
+# Ответы списка тикетов; поколение сбрасывают все пути, меняющие тикеты.
+# Промахи читаются с реплики, поэтому сразу после сброса они не сохраняются
+tickets_cache = ResponseCache(
+    "tickets",
+    ttl=settings.TICKETS_CACHE_TTL,
+    settle=settings.DATABASE_REPLICA_MAX_LAG if settings.DATABASE_REPLICA_URL else 0,
+)
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации повреждён или сформирован не сервером"""
+
+
+def encode_cursor(created_at: datetime, ticket_id: int, direction: str, rank: Optional[float] = None) -> str:
+    """Упаковка позиции (created_at, id) или (rank, created_at, id) в непрозрачный курсор"""
+    payload = {"c": created_at.isoformat(), "i": ticket_id, "d": direction}
+    if rank is not None:
+        payload["r"] = rank
+    payload = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Распаковка курсора в (created_at, id, direction, rank); rank - None для сортировки по дате"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        direction = payload["d"]
+        if direction not in (CURSOR_NEXT, CURSOR_PREV):
+            raise ValueError(direction)
+        rank = float(payload["r"]) if "r" in payload else None
+        return datetime.fromisoformat(payload["c"]), int(payload["i"]), direction, rank
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def search_tickets(query, search: str, dialect: str):
+    """
+    Фильтр по словам из заголовка и описания, возвращает (запрос, выражение ранга).
+
+    В PostgreSQL - полнотекстовый поиск по GIN-индексу ix_tickets_search:
+    строка разбирается websearch_to_tsquery (слова, "фразы", -исключения),
+    ранг - ts_rank с перевесом заголовка. В остальных СУБД (тесты на SQLite)
+    каждое слово ищется подстрокой без учёта регистра, ранг постоянный.
+    """
+    if dialect == "postgresql":
+        document = ticket_search_document(Ticket.title, Ticket.description)
+        terms = func.websearch_to_tsquery(literal_column("'simple'"), search)
+        return query.filter(document.op("@@")(terms)), func.ts_rank(document, terms)
+    words = [
+        or_(
+            Ticket.title.icontains(word, autoescape=True),
+            Ticket.description.icontains(word, autoescape=True),
+        )
+        for word in search.split()
+    ]
+    return query.filter(and_(*words)), literal_column("0.0")
+
+
+def filter_tickets(
+    query,
+    status: Optional[TicketStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    """Фильтры списка тикетов по статусу и диапазону дат создания"""
+    if status:
+        query = query.filter(Ticket.status == status)
+    if start_date:
+        query = query.filter(Ticket.created_at >= start_date)
+    if end_date:
+        query = query.filter(Ticket.created_at <= end_date)
+    return query
+
+
+def build_tickets_page_query(
+    status: Optional[TicketStatus],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    sort_order: Optional[SortOrder],
+    cursor: Optional[str],
+    limit: int,
+    search: Optional[str] = None,
+    dialect: str = "postgresql",
+):
+    """
+    Keyset-запрос одной страницы по ключу (created_at, id).
+
+    С поиском search и без явного sort_order тикеты идут по релевантности,
+    ключ страницы - (rank, created_at, id). Возвращает запрос и направление
+    обхода. Запрос выбирает limit + 1 строку, лишняя строка показывает,
+    есть ли страница дальше.
+    """
+    direction = CURSOR_NEXT
+    position = None
+    if cursor:
+        created_at, ticket_id, direction, rank = decode_cursor(cursor)
+        position = (created_at, ticket_id)
+
+    query = filter_tickets(select(*TICKET_LIST_COLUMNS), status, start_date, end_date)
+    columns = [Ticket.created_at, Ticket.id]
+    if search:
+        query, rank_column = search_tickets(query, search, dialect)
+        if sort_order is None:
+            query = query.add_columns(rank_column.label("rank"))
+            columns.insert(0, rank_column)
+            if position is not None:
+                if rank is None:
+                    raise InvalidCursorError("Invalid cursor")
+                position = (rank, *position)
+
+    descending = sort_order != SortOrder.early
+    if direction == CURSOR_PREV:
+        descending = not descending
+
+    key = tuple_(*columns)
+    if position is not None:
+        query = query.filter(key < position if descending else key > position)
+    order = desc if descending else asc
+    query = query.order_by(*(order(column) for column in columns)).limit(limit + 1)
+    return query, direction
+
+
+async def fetch_tickets_page(
+    db: AsyncSession,
+    status: Optional[TicketStatus],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    sort_order: Optional[SortOrder],
+    cursor: Optional[str],
+    limit: int,
+    search: Optional[str] = None,
+) -> dict:
+    """Страница тикетов с курсорами на соседние страницы"""
+    query, direction = build_tickets_page_query(
+        status, start_date, end_date, sort_order, cursor, limit, search, db.bind.dialect.name
+    )
+    result = await db.execute(query)
+    rows = result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    def row_cursor(row, row_direction):
+        rank = row.rank if "rank" in row._fields else None
+        return encode_cursor(row.created_at, row.id, row_direction, rank)
+
+    next_cursor = prev_cursor = None
+    if direction == CURSOR_PREV:
+        rows.reverse()
+        if rows:
+            next_cursor = row_cursor(rows[-1], CURSOR_NEXT)
+            if has_more:
+                prev_cursor = row_cursor(rows[0], CURSOR_PREV)
+    elif rows:
+        if has_more:
+            next_cursor = row_cursor(rows[-1], CURSOR_NEXT)
+        if cursor:
+            prev_cursor = row_cursor(rows[0], CURSOR_PREV)
+
+    return {"items": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
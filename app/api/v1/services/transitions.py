@@ -0,0 +1,288 @@
+from collections import namedtuple
+
+from sqlalchemy import case, exists, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.enums.enums import BulkOutcome
+from app.api.v1.models.models import Operator, Ticket, TicketStatus, User
+from app.api.v1.services.feed import queue_ticket_changes
+from app.api.v1.services.stats import record_ticket_changes
+from app.api.v1.services.tickets import CURSOR_NEXT, encode_cursor, filter_tickets
+from app.core.config import settings
+
+tickets = Ticket.__table__
+
+# Сколько раз повторять переход, если тикет изменили между снимком и UPDATE
+TRANSITION_ATTEMPTS = 3
+
+# Тикет до и после перехода; extra - дополнительные колонки RETURNING
+TicketChange = namedtuple(
+    "TicketChange",
+    "id previous_status previous_operator_id created_at status operator_id extra",
+)
+
+
+class TransitionError(Exception):
+    """Переход статуса невозможен: status_code и detail для ответа API"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _transition(db: AsyncSession, select_tickets, condition, values, *extra):
+    """
+    Условный UPDATE тикетов, отобранных select_tickets(statement), со старыми значениями.
+
+    В PostgreSQL это один запрос: UPDATE ... FROM tickets AS previous RETURNING
+    previous.*, где previous - снимок строки на начало запроса. Строка
+    обновляется, только если статус и оператор не менялись после снимка, иначе
+    она пропускается и переход повторяет вызывающий. SQLite в RETURNING отдаёт
+    уже новые значения, поэтому там снимок читается отдельным SELECT.
+    Счётчики статистики обновляются в той же транзакции, события ленты
+    публикуются после коммита.
+    """
+    returning = (tickets.c.id, tickets.c.status, tickets.c.operator_id, *extra)
+    if db.bind.dialect.name == "postgresql":
+        previous = tickets.alias("previous")
+        statement = update(tickets).where(
+            tickets.c.id == previous.c.id,
+            tickets.c.status == previous.c.status,
+            tickets.c.operator_id.is_not_distinct_from(previous.c.operator_id),
+            condition,
+        )
+        statement = select_tickets(statement).values(**values).returning(
+            previous.c.status, previous.c.operator_id, previous.c.created_at, *returning
+        )
+        rows = (await db.execute(statement)).all()
+        snapshots = {row[3]: row[:3] for row in rows}
+        rows = [row[3:] for row in rows]
+    else:
+        snapshot_query = select_tickets(
+            select(tickets.c.id, tickets.c.status, tickets.c.operator_id, tickets.c.created_at).where(condition)
+        )
+        snapshots = {row[0]: row[1:] for row in (await db.execute(snapshot_query)).all()}
+        if not snapshots:
+            return []
+        statement = update(tickets).where(tickets.c.id.in_(snapshots), condition)
+        rows = (await db.execute(statement.values(**values).returning(*returning))).all()
+
+    changes = [
+        TicketChange(ticket_id, *snapshots[ticket_id], status, operator_id, tuple(extra_values))
+        for ticket_id, status, operator_id, *extra_values in rows
+    ]
+    await record_ticket_changes(db, changes)
+    queue_ticket_changes(db, changes)
+    return changes
+
+
+async def _ticket_status(db: AsyncSession, ticket_id):
+    """Разбор неудачного перехода: статус тикета или 404, если его нет"""
+    status = await db.scalar(select(Ticket.status).where(Ticket.id == ticket_id))
+    if status is None:
+        raise TransitionError(404, "Ticket not found")
+    return status
+
+
+async def _transition_one(db: AsyncSession, ticket_id, condition, values, check, *extra):
+    """
+    Переход одного тикета. Если UPDATE ничего не изменил, check(status) по
+    текущему статусу выбрасывает TransitionError или разрешает повтор.
+    """
+    for _ in range(TRANSITION_ATTEMPTS):
+        changes = await _transition(
+            db, lambda statement: statement.where(tickets.c.id == ticket_id), condition, values, *extra
+        )
+        if changes:
+            return changes[0]
+        await check(await _ticket_status(db, ticket_id))
+    raise TransitionError(409, "Ticket was modified concurrently")
+
+
+async def close_ticket(db: AsyncSession, ticket_id):
+    """
+    Закрытие тикета условным UPDATE ... RETURNING, возвращает email автора (или None).
+
+    Условие на статус в WHERE защищает от гонки двух операторов: закроет
+    только один, второй получит 400.
+    """
+    async def check(status):
+        if status == TicketStatus.CLOSED:
+            raise TransitionError(400, "Ticket is already closed")
+
+    user_email = select(User.email).where(User.id == tickets.c.user_id).scalar_subquery()
+    change = await _transition_one(
+        db,
+        ticket_id,
+        tickets.c.status != TicketStatus.CLOSED,
+        {"status": TicketStatus.CLOSED},
+        check,
+        user_email,
+    )
+    return change.extra[0]
+
+
+async def assign_ticket(db: AsyncSession, ticket_id, operator_id):
+    """Назначение нового тикета оператору с проверкой оператора в том же UPDATE"""
+    async def check(status):
+        if status != TicketStatus.NEW:
+            raise TransitionError(400, "Ticket is not in a valid state to be assigned")
+        if await db.scalar(select(Operator.id).where(Operator.id == operator_id)) is None:
+            raise TransitionError(404, "Operator not found")
+
+    await _transition_one(
+        db,
+        ticket_id,
+        (tickets.c.status == TicketStatus.NEW) & exists().where(Operator.id == operator_id),
+        {"operator_id": operator_id, "status": TicketStatus.IN_PROGRESS},
+        check,
+    )
+
+
+async def update_ticket_status(db: AsyncSession, ticket_id, status: TicketStatus):
+    """Смена статуса незакрытого тикета условным UPDATE ... RETURNING"""
+    async def check(current):
+        if current == TicketStatus.CLOSED:
+            raise TransitionError(400, "Cannot update a closed ticket")
+
+    await _transition_one(
+        db,
+        ticket_id,
+        tickets.c.status != TicketStatus.CLOSED,
+        {"status": status},
+        check,
+    )
+
+
+async def assign_new_tickets(db: AsyncSession, assignments):
+    """
+    Назначение новых неназначенных тикетов разным операторам одним UPDATE.
+
+    assignments - {ticket_id: operator_id}. Возвращает TicketChange
+    назначенных тикетов, extra[0] - email автора; тикеты, которые уже
+    взяли в работу, пропускаются.
+    """
+    if not assignments:
+        return []
+    user_email = select(User.email).where(User.id == tickets.c.user_id).scalar_subquery()
+    return await _transition(
+        db,
+        lambda statement: statement.where(tickets.c.id.in_(assignments)),
+        (tickets.c.status == TicketStatus.NEW) & tickets.c.operator_id.is_(None),
+        {"operator_id": case(assignments, value=tickets.c.id), "status": TicketStatus.IN_PROGRESS},
+        user_email,
+    )
+
+
+def build_bulk_window_query(filters, after, condition):
+    """
+    Keyset-запрос окна тикетов по фильтру, подходящих под условие перехода:
+    по ключу (created_at, id) после позиции after, TICKETS_BULK_MAX_SIZE + 1
+    строка - лишняя показывает, есть ли следующее окно. Для закрытия и смены
+    статуса без status в фильтре (status <> CLOSED) это частичный индекс
+    ix_tickets_open_created_at_id.
+    """
+    query = filter_tickets(select(tickets.c.id, tickets.c.created_at).where(condition), **filters)
+    if after is not None:
+        query = query.where(tuple_(tickets.c.created_at, tickets.c.id) > tuple_(*after))
+    return query.order_by(tickets.c.created_at, tickets.c.id).limit(settings.TICKETS_BULK_MAX_SIZE + 1)
+
+
+async def _select_bulk_window(db: AsyncSession, filters, after, condition):
+    """ID очередного окна тикетов по фильтру и курсор следующего окна (None, если окно последнее)"""
+    rows = (await db.execute(build_bulk_window_query(filters, after, condition))).all()
+    next_cursor = None
+    if len(rows) > settings.TICKETS_BULK_MAX_SIZE:
+        rows = rows[:settings.TICKETS_BULK_MAX_SIZE]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id, CURSOR_NEXT)
+    return [row.id for row in rows], next_cursor
+
+
+async def _bulk_update(db: AsyncSession, ticket_ids, filters, after, condition, values, *extra):
+    """
+    Один переход по списку ID или фильтру списка тикетов (filters - status/start_date/end_date).
+
+    Возвращает (результаты по тикетам, изменения TicketChange, курсор следующего окна).
+    Фильтр, как и список ID, обрабатывает не больше TICKETS_BULK_MAX_SIZE
+    тикетов за запрос: окно по (created_at, id) после позиции after, остальное -
+    следующими запросами с курсором. Тикеты, которые всё ещё подходят под
+    условие, но не обновились (их изменили между снимком и UPDATE),
+    переводятся повторно, всего до TRANSITION_ATTEMPTS раз, как и одиночный
+    переход. Оставшиеся разбираются одним SELECT: нет в базе - not_found,
+    иначе invalid_state.
+    """
+    next_cursor = None
+    if ticket_ids is None:
+        ticket_ids, next_cursor = await _select_bulk_window(db, filters, after, condition)
+        if not ticket_ids:
+            return [], [], None
+
+    def select_tickets(statement):
+        return statement.where(tickets.c.id.in_(ticket_ids))
+
+    changes = await _transition(db, select_tickets, condition, values, *extra)
+
+    outcomes = {change.id: BulkOutcome.ok for change in changes}
+    missing = [ticket_id for ticket_id in dict.fromkeys(ticket_ids) if ticket_id not in outcomes]
+    for _ in range(TRANSITION_ATTEMPTS - 1):
+        if not missing:
+            break
+        retry = list(await db.scalars(select(tickets.c.id).where(tickets.c.id.in_(missing), condition)))
+        if not retry:
+            break
+        retried = await _transition(
+            db, lambda statement: statement.where(tickets.c.id.in_(retry)), condition, values, *extra
+        )
+        changes += retried
+        outcomes.update((change.id, BulkOutcome.ok) for change in retried)
+        missing = [ticket_id for ticket_id in missing if ticket_id not in outcomes]
+    if missing:
+        existing = set(await db.scalars(select(Ticket.id).where(Ticket.id.in_(missing))))
+        for ticket_id in missing:
+            outcomes[ticket_id] = BulkOutcome.invalid_state if ticket_id in existing else BulkOutcome.not_found
+    results = [{"ticket_id": ticket_id, "outcome": outcome} for ticket_id, outcome in outcomes.items()]
+    return results, changes, next_cursor
+
+
+async def bulk_close_tickets(db: AsyncSession, ticket_ids=None, filters=None, after=None):
+    """Закрытие пачки тикетов, возвращает (результаты, курсор следующего окна, email авторов закрытых тикетов)"""
+    user_email = select(User.email).where(User.id == tickets.c.user_id).scalar_subquery()
+    results, changes, next_cursor = await _bulk_update(
+        db,
+        ticket_ids,
+        filters,
+        after,
+        tickets.c.status != TicketStatus.CLOSED,
+        {"status": TicketStatus.CLOSED},
+        user_email,
+    )
+    return results, next_cursor, [change.extra[0] for change in changes if change.extra[0]]
+
+
+async def bulk_assign_tickets(db: AsyncSession, operator_id, ticket_ids=None, filters=None, after=None):
+    """Назначение пачки новых тикетов оператору, возвращает (результаты, курсор следующего окна)"""
+    results, changes, next_cursor = await _bulk_update(
+        db,
+        ticket_ids,
+        filters,
+        after,
+        (tickets.c.status == TicketStatus.NEW) & exists().where(Operator.id == operator_id),
+        {"operator_id": operator_id, "status": TicketStatus.IN_PROGRESS},
+    )
+    if not changes and await db.scalar(select(Operator.id).where(Operator.id == operator_id)) is None:
+        raise TransitionError(404, "Operator not found")
+    return results, next_cursor
+
+
+async def bulk_update_status(db: AsyncSession, status: TicketStatus, ticket_ids=None, filters=None, after=None):
+    """Смена статуса пачки незакрытых тикетов, возвращает (результаты, курсор следующего окна)"""
+    results, _, next_cursor = await _bulk_update(
+        db,
+        ticket_ids,
+        filters,
+        after,
+        tickets.c.status != TicketStatus.CLOSED,
+        {"status": status},
+    )
+    return results, next_cursor
@@ -1,8 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator, model_validator
 
-from app.api.v1.enums.enums import TicketStatusEnum
+from app.api.v1.enums.enums import BulkOutcome, TicketStatusEnum
+from app.core.config import settings
 
 
 class TicketCreateRequest(BaseModel):
@@ -35,6 +37,94 @@ class TicketResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TicketListItem(BaseModel):
+    id: int
+    title: str
+    status: TicketStatusEnum
+    created_at: datetime
+    updated_at: datetime
+    user_id: int
+    operator_id: Optional[int] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TicketPage(BaseModel):
+    items: List[TicketListItem]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class TicketFilter(BaseModel):
+    status: Optional[TicketStatusEnum] = None
+    start_date: Optional[datetime] = Field(None, description="Начальная дата создания тикета")
+    end_date: Optional[datetime] = Field(None, description="Конечная дата создания тикета")
+
+    @model_validator(mode="after")
+    def validate_not_empty(self):
+        if self.status is None and self.start_date is None and self.end_date is None:
+            raise ValueError("Фильтр должен содержать хотя бы одно условие")
+        return self
+
+
+class BulkTicketRequest(BaseModel):
+    ticket_ids: Optional[List[int]] = Field(
+        None,
+        min_length=1,
+        max_length=settings.TICKETS_BULK_MAX_SIZE,
+        description="ID тикетов; либо ticket_ids, либо filter",
+    )
+    filter: Optional[TicketFilter] = Field(
+        None,
+        description=f"Фильтр тикетов как в списке; либо ticket_ids, либо filter. "
+        f"За запрос обрабатывается не больше {settings.TICKETS_BULK_MAX_SIZE} тикетов",
+    )
+    cursor: Optional[str] = Field(None, description="Курсор next_cursor предыдущего ответа для того же filter")
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        if (self.ticket_ids is None) == (self.filter is None):
+            raise ValueError("Нужно указать либо ticket_ids, либо filter")
+        if self.cursor is not None and self.filter is None:
+            raise ValueError("cursor задаётся только вместе с filter")
+        return self
+
+
+class BulkAssignRequest(BulkTicketRequest):
+    operator_id: int = Field(..., ge=1, description="ID оператора")
+
+
+class BulkStatusRequest(BulkTicketRequest):
+    status: TicketStatusEnum
+
+
+class BulkTicketResult(BaseModel):
+    ticket_id: int
+    outcome: BulkOutcome
+
+
+class BulkOperationResponse(BaseModel):
+    updated: int
+    results: List[BulkTicketResult]
+    # Для filter: курсор следующего окна, None - все подходящие тикеты обработаны
+    next_cursor: Optional[str] = None
+
+
+class OperatorTicketCounts(BaseModel):
+    operator_id: Optional[int] = None
+    counts: Dict[TicketStatusEnum, int]
+
+
+class DayTicketCounts(BaseModel):
+    day: date
+    counts: Dict[TicketStatusEnum, int]
+
+
+class TicketStats(BaseModel):
+    by_status: Dict[TicketStatusEnum, int]
+    by_operator: List[OperatorTicketCounts]
+    by_day: List[DayTicketCounts]
+
+
 class UserCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50, description="Имя пользователя должно быть от 1 до 50 символов")
     email: EmailStr = Field(..., description="Должен быть корректным email-адресом")
@@ -56,6 +146,11 @@ class UserResponse(BaseModel):
 class OperatorCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=50, description="Имя оператора должно быть от 1 до 50 символов")
     email: EmailStr = Field(..., description="Должен быть корректным email-адресом")
+    skills: List[str] = Field(
+        default_factory=list,
+        max_length=50,
+        description="Ключевые слова для автоназначения: тикеты с ними в заголовке уходят этому оператору",
+    )
 
     @field_validator("name")
     def validate_name(cls, value: str) -> str:
@@ -63,9 +158,49 @@ class OperatorCreate(BaseModel):
             raise ValueError("Имя оператора не должно быть пустым или состоять только из пробелов")
         return value
 
+    @field_validator("skills", mode="before")
+    def split_skills(cls, value):
+        # Из CSV навыки приходят одной ячейкой через запятую
+        if isinstance(value, str):
+            return value.split(",")
+        return value
+
+    @field_validator("skills")
+    def validate_skills(cls, value: List[str]) -> List[str]:
+        return list(dict.fromkeys(skill.strip().lower() for skill in value if skill.strip()))
+
 
 class OperatorResponse(BaseModel):
     id: int
     name: str
     email: str
+    skills: Optional[List[str]] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class TicketAttachmentResponse(BaseModel):
+    id: int
+    filename: str
+    content_type: str
+    size: int
+    message_id: Optional[int] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TicketMessageResponse(BaseModel):
+    id: int
+    sender_email: str
+    body: str
+    created_at: datetime
     model_config = ConfigDict(from_attributes=True)
+
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
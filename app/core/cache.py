@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+redis_client = aioredis.Redis.from_url(
+    settings.REDIS_URL,
+    socket_timeout=settings.CACHE_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.CACHE_SOCKET_TIMEOUT,
+)
+
+
+class ResponseCache:
+    """
+    Кэш готовых ответов API в Redis с инвалидацией по поколению.
+
+    Ключ ответа - cache:<namespace>:<поколение>:<хэш параметров>. invalidate()
+    увеличивает поколение, и все прежние ответы перестают читаться сразу,
+    а из Redis уходят сами по TTL. Недоступность Redis не ломает запрос:
+    ответ просто собирается заново. ttl=0 выключает кэш.
+
+    settle - сколько секунд после invalidate() промахи отдаются, но не
+    сохраняются: ответ, прочитанный с отстающей реплики, иначе лёг бы в новое
+    поколение и отдавался бы весь TTL. 0 - сохранять сразу (чтение с основной базы).
+    """
+
+    def __init__(self, namespace, ttl, client=None, settle=0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.settle = settle
+        self.client = client or redis_client
+        self.generation_key = f"cache:{namespace}:generation"
+        self.settling_key = f"cache:{namespace}:settling"
+        self.hits = self.misses = self.errors = 0
+
+    def _key(self, generation, params):
+        payload = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        return f"cache:{self.namespace}:{generation}:{digest}"
+
+    async def get_or_set(self, params, produce):
+        """Ответ (str) из кэша по params или из produce() с сохранением в кэш"""
+        if not self.ttl:
+            return await produce()
+        try:
+            generation, settling = await self.client.mget([self.generation_key, self.settling_key])
+            key = self._key(int(generation or 0), params)
+            cached = await self.client.get(key)
+        except RedisError as e:
+            self._count("errors", "error")
+            logger.warning(f"Кэш {self.namespace} недоступен: {e}")
+            return await produce()
+        if cached is not None:
+            self._count("hits", "hit")
+            return cached.decode()
+
+        self._count("misses", "miss")
+        value = await produce()
+        if settling is not None:
+            return value
+        try:
+            await self.client.set(key, value, ex=self.ttl)
+        except RedisError as e:
+            self._count("errors", "error")
+            logger.warning(f"Не удалось сохранить ответ в кэш {self.namespace}: {e}")
+        return value
+
+    async def invalidate(self):
+        """Новое поколение: все закэшированные ответы пространства устаревают"""
+        if not self.ttl:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.incr(self.generation_key)
+                if self.settle:
+                    pipe.set(self.settling_key, 1, ex=self.settle)
+                await pipe.execute()
+        except RedisError as e:
+            self._count("errors", "error")
+            logger.warning(f"Не удалось сбросить кэш {self.namespace}: {e}")
+
+    def _count(self, attr, result):
+        setattr(self, attr, getattr(self, attr) + 1)
+        CACHE_REQUESTS.labels(self.namespace, result).inc()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
@@ -1,3 +1,5 @@
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -12,10 +14,46 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
+    # Реплика для чтения (список и выгрузка тикетов); без неё чтение идёт в основную базу
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # Допустимое отставание реплики в секундах: столько после изменения тикетов
+    # кэш списка не сохраняет прочитанные с неё страницы
+    DATABASE_REPLICA_MAX_LAG: int = 2
+
+    # Профиль движка БД. Параметры пула и asyncpg применяются только к PostgreSQL
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    # statement_timeout сессии в миллисекундах, 0 - без ограничения
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Кэш подготовленных выражений asyncpg на соединение, 0 - выключен (нужно за pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Порт /metrics для воркеров без HTTP API (ingest, auto_assign, Celery); 0 - не отдавать.
+    # API отдаёт метрики на своём /metrics. Для нескольких процессов на сервис
+    # (uvicorn --workers, prefork Celery) нужна переменная PROMETHEUS_MULTIPROC_DIR
+    WORKER_METRICS_PORT: int = 0
+    # Отдельный порт ретранслятора outbox, чтобы не занимать порт соседнего воркера на том же хосте
+    OUTBOX_RELAY_METRICS_PORT: int = 0
 
     # Добавляем параметры для Redis
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_DB: int = 0
+    # Таймаут операций кэша: при медленном Redis ответ собирается из базы
+    CACHE_SOCKET_TIMEOUT: float = 0.2
+    # Лента событий тикетов (SSE): длина потока в Redis, очередь одного
+    # подписчика, интервал heartbeat в секундах и пауза переподключения клиента
+    FEED_STREAM_MAXLEN: int = 10000
+    FEED_SUBSCRIBER_QUEUE_SIZE: int = 1000
+    FEED_HEARTBEAT_INTERVAL: float = 15
+    FEED_RETRY_MS: int = 3000
+    # Сколько секунд Redis помнит ключ источника тикета (Message-ID, Idempotency-Key);
+    # дольше дубликаты ловит уникальный индекс tickets.source_key, 0 - только база
+    IDEMPOTENCY_CACHE_TTL: int = 86400
 
     # Добавляем параметры для почты отправки
     SMTP_SERVER: str
@@ -23,12 +61,71 @@ class Settings(BaseSettings):
     SMTP_EMAIL: str
     SMTP_PASSWORD: str
     SENDER_NAME: str
+    SMTP_STARTTLS: bool = True
+    SMTP_TIMEOUT: float = 10
+    # Пул SMTP-соединений на процесс воркера
+    SMTP_POOL_SIZE: int = 4
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    SMTP_IDLE_CHECK_INTERVAL: float = 30
+    # Уведомления из outbox уходят в Celery пачками; пауза опроса outbox, если пачка не набралась
+    NOTIFICATION_BATCH_WINDOW: float = 2
+    NOTIFICATION_BATCH_SIZE: int = 100
 
     # Добавляем параметры для почты считывания
     IMAP_SERVER: str
     IMAP_PORT: int
     EMAIL_ACCOUNT: str
     EMAIL_PASSWORD: str
+    IMAP_SSL: bool = True
+    IMAP_FOLDER: str = "inbox"
+    # Папки ящика, которые читает воркер ингестии (python -m app.workers.ingest);
+    # пустой список - только IMAP_FOLDER. Каждую папку держит один воркер по аренде в Redis
+    IMAP_FOLDERS: List[str] = []
+    # Аренда папки: TTL в секундах (продлевается каждые TTL/3), пауза между
+    # попытками захватить свободные папки и предел папок на воркер (0 - без предела)
+    INGEST_LEASE_TTL: float = 30
+    INGEST_CLAIM_INTERVAL: float = 10
+    INGEST_MAX_FOLDERS_PER_WORKER: int = 0
+    IMAP_FETCH_BATCH_SIZE: int = 200
+    # Тело письма в описании тикета обрезается до этой длины (символов);
+    # исходное письмо целиком хранится сжатым в ticket_raw_messages
+    TICKET_DESCRIPTION_MAX_LENGTH: int = 20000
+    # Каталог для вложений входящих писем
+    ATTACHMENTS_DIR: str = "data/attachments"
+
+    # Режим получения почты: idle - push через IMAP IDLE, poll - опрос с backoff.
+    # Если сервер не поддерживает IDLE, используется опрос
+    EMAIL_LISTENER_MODE: Literal["idle", "poll"] = "idle"
+    EMAIL_IDLE_TIMEOUT: int = 300
+    EMAIL_POLL_MIN_INTERVAL: float = 5
+    EMAIL_POLL_MAX_INTERVAL: float = 60
+
+    # Параметры пагинации списка тикетов
+    TICKETS_PAGE_SIZE: int = 50
+    TICKETS_MAX_PAGE_SIZE: int = 200
+    TICKETS_EXPORT_CHUNK_SIZE: int = 1000
+    # Время жизни ответа списка тикетов в кэше Redis, секунды; 0 - без кэша
+    TICKETS_CACHE_TTL: int = 5
+    TICKETS_BULK_MAX_SIZE: int = 1000
+    # Число слотов каждого счётчика статистики тикетов (см. TicketCounter)
+    TICKET_COUNTER_SLOTS: int = 8
+    IMPORT_CHUNK_SIZE: int = 1000
+
+    # Автоназначение новых тикетов (python -m app.workers.auto_assign):
+    # стратегия, пауза между пачками, размер пачки и предел открытых тикетов
+    # на оператора (0 - без предела)
+    AUTO_ASSIGN_STRATEGY: Literal["round_robin", "least_open", "skills"] = "least_open"
+    AUTO_ASSIGN_INTERVAL: float = 5
+    AUTO_ASSIGN_BATCH_SIZE: int = 200
+    AUTO_ASSIGN_MAX_OPEN_TICKETS: int = 0
+
+    @property
+    def INGEST_FOLDERS(self) -> List[str]:
+        return self.IMAP_FOLDERS or [self.IMAP_FOLDER]
+
+    @property
+    def REDIS_URL(self) -> str:
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,9 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def dialect_insert(db: AsyncSession, model):
+    """insert() с поддержкой ON CONFLICT для диалекта, к которому привязана сессия"""
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
@@ -1,9 +1,37 @@
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+
+def engine_options(url):
+    """Параметры create_async_engine из настроек DB_* для данного URL"""
+    options = {"echo": settings.DB_ECHO}
+    if make_url(url).get_backend_name() != "postgresql":
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    connect_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+    options["connect_args"] = connect_args
+    return options
+
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+
+if settings.DATABASE_REPLICA_URL:
+    read_engine = create_async_engine(
+        settings.DATABASE_REPLICA_URL, **engine_options(settings.DATABASE_REPLICA_URL)
+    )
+else:
+    read_engine = engine
 
 
 async_session = sessionmaker(
@@ -12,7 +40,19 @@ async_session = sessionmaker(
     expire_on_commit=False
 )
 
+async_read_session = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 
 async def get_db():
     async with async_session() as session:
         yield session
+
+
+async def get_read_db():
+    """Сессия только для чтения: реплика, если задан DATABASE_REPLICA_URL"""
+    async with async_read_session() as session:
+        yield session
@@ -0,0 +1,41 @@
+import secrets
+
+# Продление и освобождение только своей аренды: ключ сравнивается с токеном владельца
+RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    Аренда ресурса в Redis: ключ со случайным токеном владельца и TTL.
+
+    Захват - SET NX PX, продление и освобождение - Lua-скрипты, которые
+    трогают ключ, только если он всё ещё наш. Если владелец упал, аренда
+    освобождается сама через ttl секунд.
+    """
+
+    def __init__(self, client, key, ttl):
+        self.client = client
+        self.key = key
+        self.ttl_ms = int(ttl * 1000)
+        self.token = secrets.token_hex(16)
+
+    async def acquire(self):
+        return bool(await self.client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    async def renew(self):
+        """True, если аренда продлена; False - её уже забрал кто-то другой или она истекла"""
+        return bool(await self.client.eval(RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms))
+
+    async def release(self):
+        await self.client.eval(RELEASE_SCRIPT, 1, self.key, self.token)
@@ -0,0 +1,204 @@
+import contextvars
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Все метрики процесса в реестре prometheus_client по умолчанию. Лейблы только
+# с ограниченным набором значений (шаблон маршрута, а не путь; тип запроса,
+# а не SQL), иначе число временных рядов растёт вместе с трафиком.
+# Процессы с несколькими воркерами (uvicorn --workers, prefork Celery) пишут
+# метрики в PROMETHEUS_MULTIPROC_DIR, и отдаются они суммой по процессам.
+
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "servicedesk_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+HTTP_DB_QUERIES = Histogram(
+    "servicedesk_http_db_queries",
+    "Число SQL-запросов на один HTTP-запрос",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+HTTP_DB_DURATION = Histogram(
+    "servicedesk_http_db_duration_seconds",
+    "Суммарное время SQL-запросов одного HTTP-запроса",
+    ["route"],
+    buckets=DB_QUERY_BUCKETS,
+)
+HTTP_STREAM_DURATION = Histogram(
+    "servicedesk_http_stream_duration_seconds",
+    "Длительность SSE-подключений (text/event-stream), не входит во время HTTP-запросов",
+    ["route"],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600),
+)
+DB_QUERY_DURATION = Histogram(
+    "servicedesk_db_query_duration_seconds",
+    "Время одного SQL-запроса",
+    ["operation"],
+    buckets=DB_QUERY_BUCKETS,
+)
+
+CACHE_REQUESTS = Counter(
+    "servicedesk_cache_requests_total",
+    "Обращения к кэшу ответов: hit, miss, error",
+    ["namespace", "result"],
+)
+
+INGEST_STAGE_DURATION = Histogram(
+    "servicedesk_ingest_stage_duration_seconds",
+    "Этапы обработки пачки писем: fetch, parse, commit",
+    ["stage"],
+)
+INGEST_MESSAGES = Counter(
+    "servicedesk_ingest_messages_total",
+    "Письма по исходу: ticket, reply, duplicate, filtered",
+    ["outcome"],
+)
+INGEST_WATCHER_FAILURES = Counter(
+    "servicedesk_ingest_watcher_failures_total",
+    "Слушатели папок, завершившиеся исключением",
+    ["folder"],
+)
+
+TASK_DURATION = Histogram(
+    "servicedesk_celery_task_duration_seconds",
+    "Время выполнения задачи Celery",
+    ["task"],
+)
+TASK_FAILURES = Counter(
+    "servicedesk_celery_task_failures_total",
+    "Задачи Celery, завершившиеся исключением",
+    ["task"],
+)
+NOTIFICATIONS = Counter(
+    "servicedesk_notifications_total",
+    "Уведомления по шаблону и результату: sent, failed",
+    ["kind", "status"],
+)
+SMTP_CONNECT_DURATION = Histogram(
+    "servicedesk_smtp_connect_duration_seconds",
+    "Установка SMTP-соединения: connect, STARTTLS, LOGIN",
+)
+SMTP_SEND_DURATION = Histogram(
+    "servicedesk_smtp_send_duration_seconds",
+    "Отправка одного письма по открытому соединению",
+)
+SMTP_FAILURES = Counter(
+    "servicedesk_smtp_failures_total",
+    "Ошибки SMTP: connect - соединение, connection - обрыв при отправке, message - отказ по письму",
+    ["stage"],
+)
+
+# [число запросов, время] SQL текущего HTTP-запроса; None вне запроса
+_request_db = contextvars.ContextVar("request_db", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip()[:6].lower()
+    if operation not in ("select", "insert", "update", "delete"):
+        operation = "other"
+    DB_QUERY_DURATION.labels(operation).observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute для упавшего запроса не вызывается
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware метрик HTTP: время ответа и SQL-запросы по шаблону маршрута.
+
+    Чистый ASGI без BaseHTTPMiddleware: тело ответа не буферизуется и не
+    копируется, поэтому потоковые ответы (выгрузка, лента) не замедляются.
+    Время потокового ответа - до последнего отправленного байта. SSE-подключения
+    (лента) живут минуты и часы и исказили бы перцентили времени ответа,
+    поэтому их длительность идёт в отдельную метрику HTTP_STREAM_DURATION.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        event_stream = False
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                event_stream = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            # Несуществующие пути не плодят временных рядов
+            if route is not None and event_stream:
+                HTTP_STREAM_DURATION.labels(route).observe(elapsed)
+            elif route is not None and route != "/metrics":
+                HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(elapsed)
+                HTTP_DB_QUERIES.labels(route).observe(stats[0])
+                HTTP_DB_DURATION.labels(route).observe(stats[1])
+
+
+def metrics_registry():
+    """Реестр для отдачи: сумма по процессам в multiprocess-режиме, иначе реестр процесса"""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """(тело, Content-Type) для ответа /metrics"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port):
+    """HTTP-сервер /metrics в отдельном потоке для воркеров без FastAPI; port=0 - не запускать"""
+    if port:
+        start_http_server(port, registry=metrics_registry())
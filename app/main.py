@@ -1,11 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 
 from app.core.config import settings
 from app.api.v1.endpoints.endpoints import router
 from app.core.db.init_db import init_models
-from app.api.v1.handlers.email_handler import check_emails_periodically
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.api.v1.services.feed import feed_hub
 
 import logging
 logger = logging.getLogger(__name__)
@@ -31,16 +32,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 app.include_router(router, prefix="/api/v1/tickets", tags=["Tickets"])
 
 
-@app.on_event("startup")
-async def on_startup():
-    """Запуск обработчика почты при старте приложения"""
-    logger.info("Периодическая проверка почты запущена")
-    asyncio.create_task(check_emails_periodically())
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Закрытие подписок ленты тикетов"""
+    await feed_hub.close()
 
 
 @app.get("/")
@@ -48,6 +49,12 @@ def root():
     return {"message": "Добро пожаловать в ServiceDesk API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Метрики Prometheus: HTTP, SQL, кэш"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
-    asyncio.run(init_models())
-    asyncio.run(on_startup())
\ No newline at end of file
+    asyncio.run(init_models())
\ No newline at end of file
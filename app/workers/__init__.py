@@ -1 +1 @@
-from app.workers.tasks import send_email, send_auto_reply, send_close_notification
\ No newline at end of file
+from app.workers.tasks import send_email, send_auto_reply, send_close_notification, send_notification
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Автоназначение новых тикетов операторам пачками.
+
+Запуск отдельным процессом:
+    python -m app.workers.auto_assign
+"""
+import asyncio
+import logging
+
+from app.api.v1.services.assignment import auto_assign_batch
+from app.api.v1.services.feed import publish_ticket_events
+from app.api.v1.services.tickets import tickets_cache
+from app.core.config import settings
+from app.core.db.session import async_session
+from app.core.metrics import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+
+async def run_auto_assign():
+    """
+    Бесконечный цикл назначения. Пока находятся полные пачки новых тикетов и
+    все они назначаются, пачки разбираются подряд, иначе следующая проверка
+    через AUTO_ASSIGN_INTERVAL. Пачка, назначенная не целиком (нет операторов
+    или все на пределе), снова выберет те же тикеты, поэтому после неё тоже пауза.
+    """
+    logger.info(f"Автоназначение запущено, стратегия {settings.AUTO_ASSIGN_STRATEGY}")
+    while True:
+        assigned = selected = 0
+        try:
+            async with async_session() as db:
+                assigned, selected = await auto_assign_batch(db)
+                await db.commit()
+                if assigned:
+                    await tickets_cache.invalidate()
+                    await publish_ticket_events(db)
+                    logger.info(f"Назначено {assigned} из {selected} новых тикетов")
+        except Exception as e:
+            logger.error(f"Ошибка автоназначения: {e}")
+        if selected < settings.AUTO_ASSIGN_BATCH_SIZE or assigned < selected:
+            await asyncio.sleep(settings.AUTO_ASSIGN_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server(settings.WORKER_METRICS_PORT)
+    asyncio.run(run_auto_assign())
@@ -0,0 +1,110 @@
+"""Воркер ингестии почты: превращает входящие письма в тикеты.
+
+Запуск отдельным процессом (экземпляров может быть несколько):
+    python -m app.workers.ingest
+
+Каждую папку из IMAP_FOLDERS читает ровно один воркер: он держит аренду
+ingest:lease:<ящик>/<папка> в Redis и продлевает её, пока читает папку.
+Если воркер упал, через INGEST_LEASE_TTL папку подхватит другой. API-процессы
+почту не читают.
+"""
+import asyncio
+import logging
+import random
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.api.v1.handlers.email_handler import mailbox_key, watch_mailbox
+from app.core.config import settings
+from app.core.lease import RedisLease
+from app.core.metrics import INGEST_WATCHER_FAILURES, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+
+def lease_key(folder):
+    return f"ingest:lease:{mailbox_key(folder)}"
+
+
+async def hold_folder(folder, lease, watch=watch_mailbox):
+    """
+    Чтение папки, пока продлевается аренда. Потеря аренды (её забрал другой
+    воркер или Redis недоступен дольше TTL) останавливает чтение.
+    """
+    logger.info(f"Папка {folder} захвачена, начинаем чтение")
+    watcher = asyncio.create_task(watch(folder))
+    try:
+        while True:
+            done, _ = await asyncio.wait({watcher}, timeout=settings.INGEST_LEASE_TTL / 3)
+            if done:
+                watcher.result()
+                return
+            try:
+                renewed = await lease.renew()
+            except RedisError as e:
+                logger.warning(f"Не удалось продлить аренду папки {folder}: {e}")
+                renewed = False
+            if not renewed:
+                logger.warning(f"Аренда папки {folder} потеряна, чтение остановлено")
+                return
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        try:
+            await lease.release()
+        except RedisError:
+            pass
+
+
+async def claim_folders(client, folders, held, watch=watch_mailbox):
+    """
+    Захват свободных папок в held ({папка: задача}), не больше
+    INGEST_MAX_FOLDERS_PER_WORKER на воркер. Папки перебираются в случайном
+    порядке, чтобы одновременно стартовавшие воркеры делили их поровну.
+    Упавший слушатель папки логируется и считается до повторного захвата.
+    """
+    for folder, task in list(held.items()):
+        if not task.done():
+            continue
+        del held[folder]
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            INGEST_WATCHER_FAILURES.labels(folder).inc()
+            logger.error(f"Чтение папки {folder} завершилось ошибкой: {error!r}", exc_info=error)
+    limit = settings.INGEST_MAX_FOLDERS_PER_WORKER
+    for folder in random.sample(folders, len(folders)):
+        if limit and len(held) >= limit:
+            break
+        if folder in held:
+            continue
+        lease = RedisLease(client, lease_key(folder), settings.INGEST_LEASE_TTL)
+        if await lease.acquire():
+            held[folder] = asyncio.create_task(hold_folder(folder, lease, watch))
+    return held
+
+
+async def run_ingest():
+    """Бесконечный цикл: раз в INGEST_CLAIM_INTERVAL подхватываем свободные папки"""
+    folders = settings.INGEST_FOLDERS
+    client = aioredis.Redis.from_url(settings.REDIS_URL, socket_timeout=5, socket_connect_timeout=5)
+    held = {}
+    logger.info(f"Воркер ингестии запущен, папки: {', '.join(folders)}")
+    try:
+        while True:
+            try:
+                await claim_folders(client, folders, held)
+            except RedisError as e:
+                logger.error(f"Не удалось захватить папки: {e}")
+            await asyncio.sleep(settings.INGEST_CLAIM_INTERVAL)
+    finally:
+        for task in held.values():
+            task.cancel()
+        await asyncio.gather(*held.values(), return_exceptions=True)
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server(settings.WORKER_METRICS_PORT)
+    asyncio.run(run_ingest())
@@ -0,0 +1,112 @@
+from email.message import Message
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from html import escape
+from string import Template
+
+from app.core.config import settings
+
+
+class UnknownNotificationError(KeyError):
+    pass
+
+
+class NotificationTemplate:
+    """
+    Шаблон уведомления: тема, текстовая и (необязательно) HTML-часть.
+
+    Подстановки в стиле string.Template ($ticket_id). Шаблон разбирается один
+    раз при импорте модуля воркером. Если в тексте нет подстановок, тело письма
+    сериализуется тоже один раз: на каждое письмо остаётся собрать заголовки.
+    fallback_subject - тема для контекста без подстановок темы (задачи и
+    события outbox, поставленные до того, как тема начала их требовать).
+    """
+
+    def __init__(self, name, subject, text, html=None, fallback_subject=None):
+        self.name = name
+        self.subject = Template(subject)
+        self.fallback_subject = fallback_subject
+        self.text = Template(text)
+        self.html = Template(html) if html is not None else None
+        placeholders = set(self.text.get_identifiers())
+        if self.html is not None:
+            placeholders.update(self.html.get_identifiers())
+        self._static_body = None if placeholders else self._serialize(self._build_body({}))
+
+    def _build_body(self, context):
+        text = MIMEText(self.text.substitute(context), "plain", "utf-8")
+        if self.html is None:
+            return text
+        html_context = {key: escape(str(value)) for key, value in context.items()}
+        body = MIMEMultipart("alternative")
+        body.attach(text)
+        body.attach(MIMEText(self.html.substitute(html_context), "html", "utf-8"))
+        return body
+
+    @staticmethod
+    def _serialize(body):
+        # as_string() заодно фиксирует boundary, поэтому заголовки берутся после него
+        _, _, payload = body.as_string().partition("\n\n")
+        return body.items(), payload
+
+    def render(self, to_email, context=None):
+        context = context or {}
+        if self._static_body is None:
+            message = self._build_body(context)
+        else:
+            headers, payload = self._static_body
+            message = Message()
+            for name, value in headers:
+                message[name] = value
+            message.set_payload(payload)
+        message["From"] = settings.SMTP_EMAIL
+        message["To"] = to_email
+        try:
+            message["Subject"] = self.subject.substitute(context)
+        except KeyError:
+            if self.fallback_subject is None:
+                raise
+            message["Subject"] = self.fallback_subject
+        return message
+
+
+TEMPLATES = {
+    template.name: template
+    for template in (
+        NotificationTemplate("email", "$subject", "$body"),
+        NotificationTemplate(
+            "auto_reply",
+            "Ваше обращение #$ticket_id принято",
+            "Спасибо за ваше обращение. Мы начали обработку вашего тикета. Ожидайте ответа.",
+            "<p>Спасибо за ваше обращение. Мы начали обработку вашего тикета. Ожидайте ответа.</p>",
+            fallback_subject="Ваше обращение принято",
+        ),
+        NotificationTemplate(
+            "close",
+            "Ваше обращение закрыто",
+            "Ваше обращение успешно закрыто. Спасибо, что обратились к нам!",
+            "<p>Ваше обращение успешно закрыто. Спасибо, что обратились к нам!</p>",
+        ),
+        NotificationTemplate(
+            "status_change",
+            "Статус обращения #$ticket_id изменён",
+            "Статус вашего обращения #$ticket_id изменён на $status.",
+            "<p>Статус вашего обращения #$ticket_id изменён на <b>$status</b>.</p>",
+        ),
+        NotificationTemplate(
+            "assignment",
+            "Обращение #$ticket_id назначено оператору",
+            "Вашим обращением #$ticket_id занимается оператор $operator_name.",
+            "<p>Вашим обращением #$ticket_id занимается оператор <b>$operator_name</b>.</p>",
+        ),
+    )
+}
+
+
+def render_notification(kind, to_email, context=None):
+    """Сборка письма по имени шаблона и контексту подстановок"""
+    try:
+        template = TEMPLATES[kind]
+    except KeyError:
+        raise UnknownNotificationError(kind) from None
+    return template.render(to_email, context)
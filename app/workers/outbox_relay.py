@@ -0,0 +1,72 @@
+"""Ретранслятор outbox: переносит уведомления из базы в Celery пачками.
+
+Запуск отдельным процессом (экземпляров может быть несколько):
+    python -m app.workers.outbox_relay
+"""
+import asyncio
+import logging
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.models.models import OutboxEvent
+from app.core.config import settings
+from app.core.db.session import async_session
+from app.core.metrics import start_metrics_server
+from app.workers.tasks import send_notification_batch
+
+logger = logging.getLogger(__name__)
+
+
+async def relay_outbox_batch(db: AsyncSession, limit=None):
+    """
+    Публикация одной пачки outbox, возвращает число отправленных в Celery событий.
+
+    Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому параллельные
+    ретрансляторы берут разные пачки. Строки удаляются в той же транзакции
+    после публикации: если коммит не прошёл, пачка уйдёт повторно (at-least-once).
+    """
+    limit = limit or settings.NOTIFICATION_BATCH_SIZE
+    result = await db.execute(
+        select(OutboxEvent)
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    events = result.scalars().all()
+    if not events:
+        await db.rollback()
+        return 0
+
+    notifications = [
+        {"kind": event.kind, "to_email": event.to_email, "context": event.context or {}}
+        for event in events
+    ]
+    # Публикация в брокер синхронная, не держим на ней event loop
+    await asyncio.to_thread(send_notification_batch.delay, notifications)
+    await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
+    await db.commit()
+    return len(events)
+
+
+async def run_relay():
+    """
+    Бесконечный цикл ретрансляции. Пока outbox отдаёт полные пачки, они
+    выгружаются подряд, иначе следующий опрос через NOTIFICATION_BATCH_WINDOW.
+    """
+    logger.info("Ретранслятор outbox запущен")
+    while True:
+        try:
+            async with async_session() as db:
+                relayed = await relay_outbox_batch(db)
+        except Exception as e:
+            logger.error(f"Ошибка ретрансляции outbox: {e}")
+            relayed = 0
+        if relayed < settings.NOTIFICATION_BATCH_SIZE:
+            await asyncio.sleep(settings.NOTIFICATION_BATCH_WINDOW)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server(settings.OUTBOX_RELAY_METRICS_PORT)
+    asyncio.run(run_relay())
@@ -0,0 +1,23 @@
+"""Пересборка счётчиков статистики тикетов с нуля.
+
+Запускается по расписанию (например, раз в сутки из cron) и после миграции:
+    python -m app.workers.reconcile_counters
+"""
+import asyncio
+import logging
+
+from app.api.v1.services.stats import reconcile_ticket_counters
+from app.core.db.session import async_session
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    async with async_session() as db:
+        await reconcile_ticket_counters(db)
+    logger.info("Счётчики тикетов пересобраны")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import SMTP_CONNECT_DURATION, SMTP_FAILURES, SMTP_SEND_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых соединение считается мёртвым и выбрасывается
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+# Отказы по конкретному письму: соединение остаётся рабочим.
+# Проверяются раньше CONNECTION_ERRORS, так как SMTPException наследует OSError
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class PooledSMTPConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Пул постоянных SMTP-соединений процесса воркера.
+
+    Соединение открывается один раз (connect, STARTTLS, LOGIN) и переиспользуется
+    для следующих писем. Простаивавшее дольше idle_check_interval соединение
+    перед выдачей проверяется NOOP, после max_messages писем закрывается.
+    После fork (prefork-пул Celery) дочерний процесс начинает с пустого пула.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        user,
+        password,
+        starttls=True,
+        max_size=4,
+        max_messages=100,
+        idle_check_interval=30,
+        timeout=10,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.idle_check_interval = idle_check_interval
+        self.timeout = timeout
+        self._reset()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.SMTP_SERVER,
+            settings.SMTP_PORT,
+            settings.SMTP_EMAIL,
+            settings.SMTP_PASSWORD,
+            starttls=settings.SMTP_STARTTLS,
+            max_size=settings.SMTP_POOL_SIZE,
+            max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+            idle_check_interval=settings.SMTP_IDLE_CHECK_INTERVAL,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+
+    def _connect(self):
+        started = time.perf_counter()
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except Exception:
+            SMTP_FAILURES.labels("connect").inc()
+            raise
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            SMTP_FAILURES.labels("connect").inc()
+            smtp.close()
+            raise
+        SMTP_CONNECT_DURATION.observe(time.perf_counter() - started)
+        return PooledSMTPConnection(smtp)
+
+    def _sendmail(self, connection, message, to_email):
+        started = time.perf_counter()
+        try:
+            connection.smtp.sendmail(message["From"], to_email, message.as_string())
+        except MESSAGE_ERRORS:
+            SMTP_FAILURES.labels("message").inc()
+            raise
+        except CONNECTION_ERRORS:
+            SMTP_FAILURES.labels("connection").inc()
+            raise
+        SMTP_SEND_DURATION.observe(time.perf_counter() - started)
+
+    def _is_alive(self, connection):
+        if time.monotonic() - connection.last_used < self.idle_check_interval:
+            return True
+        try:
+            return connection.smtp.noop()[0] == 250
+        except CONNECTION_ERRORS:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.smtp.close()
+
+    def acquire(self):
+        if self._pid != os.getpid():
+            self._reset()
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_alive(connection):
+                    return connection
+                self._close(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        connection.last_used = time.monotonic()
+        if broken:
+            connection.smtp.close()
+        elif connection.sent >= self.max_messages:
+            self._close(connection)
+        else:
+            self._idle.put(connection)
+        self._slots.release()
+
+    def send_message(self, message, to_email):
+        """
+        Отправка письма через соединение из пула.
+
+        Если соединение оборвалось, письмо один раз переотправляется на новом.
+        Ошибки протокола (например, отказ получателю) пробрасываются как есть.
+        """
+        for attempt in (1, 2):
+            connection = self.acquire()
+            try:
+                self._sendmail(connection, message, to_email)
+            except MESSAGE_ERRORS:
+                self.release(connection)
+                raise
+            except CONNECTION_ERRORS as e:
+                self.release(connection, broken=True)
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP-соединение потеряно, переподключаемся: {e}")
+                continue
+            except Exception:
+                self.release(connection)
+                raise
+            connection.sent += 1
+            self.release(connection)
+            return
+
+    def send_messages(self, messages, errors=None):
+        """
+        Отправка пачки [(message, to_email)] через одно соединение.
+
+        Возвращает список ошибок в порядке писем (None - письмо отправлено).
+        Оборвавшееся соединение заменяется новым, письмо переотправляется один раз.
+        Ошибки дописываются в errors по мере отправки: если пачку прервало
+        необработанное исключение, в переданном списке остаются результаты уже
+        отправленных писем, и повторно их не отправляют.
+        """
+        errors = [] if errors is None else errors
+        connection = None
+        try:
+            for message, to_email in messages:
+                error = None
+                for _ in range(2):
+                    if connection is not None and connection.sent >= self.max_messages:
+                        self.release(connection)
+                        connection = None
+                    try:
+                        if connection is None:
+                            connection = self.acquire()
+                        self._sendmail(connection, message, to_email)
+                    except MESSAGE_ERRORS as e:
+                        error = str(e)
+                    except CONNECTION_ERRORS as e:
+                        if connection is not None:
+                            self.release(connection, broken=True)
+                            connection = None
+                        error = str(e)
+                        continue
+                    else:
+                        connection.sent += 1
+                        error = None
+                    break
+                errors.append(error)
+        finally:
+            if connection is not None:
+                self.release(connection)
+        return errors
+
+    def close_all(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(connection)
+
+
+smtp_pool = SMTPConnectionPool.from_settings()
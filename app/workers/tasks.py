@@ -1,71 +1,104 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
 import logging
+import time
+
+from celery.signals import task_failure, task_postrun, task_prerun, worker_init, worker_process_shutdown
 
-from app.workers.celery_config import celery_app
 from app.core.config import settings
+from app.core.metrics import NOTIFICATIONS, TASK_DURATION, TASK_FAILURES, start_metrics_server
+from app.workers.celery_config import celery_app
+from app.workers.notifications import render_notification
+from app.workers.smtp_pool import smtp_pool
 
+# Время старта выполняемых задач процесса по task_id
+_task_started = {}
 
-smtp_server = settings.SMTP_SERVER
-smtp_port = settings.SMTP_PORT
-sender_email = settings.SMTP_EMAIL
-sender_password = settings.SMTP_PASSWORD
 
+@worker_process_shutdown.connect
+def close_smtp_connections(**kwargs):
+    smtp_pool.close_all()
 
-@celery_app.task
-def send_email(to_email: str, subject: str, body: str):
+
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    start_metrics_server(settings.WORKER_METRICS_PORT)
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name).observe(time.perf_counter() - started)
+
+
+@task_failure.connect
+def _task_failure(sender=None, **kwargs):
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+def deliver_notification(kind: str, to_email: str, context: dict = None):
     try:
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(sender_email, sender_password) 
-            server.sendmail(sender_email, to_email, message.as_string())
-        logging.info(f"Email sent to {to_email}")
-        return f"Email sent to {to_email}"
+        smtp_pool.send_message(render_notification(kind, to_email, context), to_email)
+        NOTIFICATIONS.labels(kind, "sent").inc()
+        logging.info(f"Notification {kind} sent to {to_email}")
+        return f"Notification {kind} sent to {to_email}"
     except Exception as e:
-        logging.error(f"Failed to send email: {str(e)}")
-        return f"Failed to send email: {str(e)}"
+        NOTIFICATIONS.labels(kind, "failed").inc()
+        logging.error(f"Failed to send notification {kind}: {str(e)}")
+        return f"Failed to send notification {kind}: {str(e)}"
 
 @celery_app.task
-def send_auto_reply(to_email: str):
-    try:
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = to_email
-        message["Subject"] = "Ваше обращение принято"
-        body = "Спасибо за ваше обращение. Мы начали обработку вашего тикета. Ожидайте ответа."
-        message.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, to_email, message.as_string())
-        logging.info(f"Auto-reply sent to {to_email}")
-        return f"Auto-reply sent to {to_email}"
-    except Exception as e:
-        logging.error(f"Failed to send auto-reply: {str(e)}")
-        return f"Failed to send auto-reply: {str(e)}"
+def send_notification(kind: str, to_email: str, context: dict = None):
+    return deliver_notification(kind, to_email, context)
+
+@celery_app.task
+def send_email(to_email: str, subject: str, body: str):
+    return deliver_notification("email", to_email, {"subject": subject, "body": body})
+
+@celery_app.task
+def send_auto_reply(to_email: str, ticket_id: int | None = None):
+    context = {"ticket_id": ticket_id} if ticket_id is not None else None
+    return deliver_notification("auto_reply", to_email, context)
 
 @celery_app.task
 def send_close_notification(to_email: str):
+    return deliver_notification("close", to_email)
+
+@celery_app.task
+def send_notification_batch(notifications: list):
+    """
+    Отправка пачки уведомлений через одну SMTP-сессию.
+
+    notifications - [{"kind": ..., "to_email": ..., "context": {...}}].
+    Возвращает результат по каждому получателю в том же порядке.
+    """
+    results = []
+    messages = []
+    for notification in notifications:
+        kind, to_email = notification["kind"], notification["to_email"]
+        try:
+            messages.append((render_notification(kind, to_email, notification.get("context")), to_email))
+            results.append({"kind": kind, "to_email": to_email, "status": "sent"})
+        except Exception as e:
+            results.append({"kind": kind, "to_email": to_email, "status": "failed", "error": str(e)})
+
+    pending = [result for result in results if result["status"] == "sent"]
+    errors = []
     try:
-        message = MIMEMultipart()
-        message["From"] = sender_email
-        message["To"] = to_email
-        message["Subject"] = "Ваше обращение закрыто"
-        body = "Ваше обращение успешно закрыто. Спасибо, что обратились к нам!"
-        message.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, to_email, message.as_string())
-        logging.info(f"Close notification sent to {to_email}")
-        return f"Close notification sent to {to_email}"
+        smtp_pool.send_messages(messages, errors)
     except Exception as e:
-        logging.error(f"Failed to send close notification: {str(e)}")
-        return f"Failed to send close notification: {str(e)}"
+        # Письма до сбоя уже ушли и сохраняют свой результат, остальные не отправлены
+        errors += [str(e)] * (len(messages) - len(errors))
+    for result, error in zip(pending, errors):
+        if error:
+            result.update(status="failed", error=error)
+
+    for result in results:
+        NOTIFICATIONS.labels(result["kind"], result["status"]).inc()
+    failed = sum(result["status"] == "failed" for result in results)
+    logging.info(f"Notification batch sent: {len(results) - failed} ok, {failed} failed")
+    return results
@@ -0,0 +1,114 @@
+"""Задержка API во время ингестии почты.
+
+Пока в том же event loop идёт обработка ящика, зонд непрерывно дёргает
+GET / и собирает распределение задержек. Режим blocking повторяет прежнее
+поведение (imaplib прямо в event loop), режим executor — AsyncIMAPClient.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.api_latency_during_ingestion --messages 1000 --rtt 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_imap import FakeIMAPServer, make_message
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000, help="Количество писем в ящике")
+    parser.add_argument("--rtt", type=float, default=0.02, help="Имитация сетевой задержки IMAP, секунд")
+    parser.add_argument("--batch-size", type=int, default=50, help="Размер пачки UID FETCH")
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def probe(client, stop, latencies, interval=0.005):
+    """
+    Запросы по расписанию раз в interval. Задержка считается от запланированного
+    момента, поэтому время, пока event loop был занят, тоже попадает в замер.
+    """
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get("/")
+        latencies.append(time.perf_counter() - scheduled)
+        assert response.status_code == 200
+        scheduled += interval
+
+
+async def run(mode, args):
+    import httpx
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.api.v1.handlers import email_handler
+    from app.api.v1.handlers.imap_client import AsyncIMAPClient
+    from app.api.v1.models.models import Base
+    from app.core.config import settings
+    from app.main import app
+
+    server = FakeIMAPServer(rtt=args.rtt).start()
+    for index in range(args.messages):
+        server.mailbox.append(make_message(index, settings.SENDER_NAME, settings.SMTP_EMAIL))
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    mail = AsyncIMAPClient("127.0.0.1", server.port, "bench", "bench", use_ssl=False)
+    if mode == "blocking":
+        async def run_inline(func, *call_args):
+            return func(*call_args)
+        mail._run = run_inline
+
+    latencies = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        probe_task = asyncio.create_task(probe(client, stop, latencies))
+        started = time.perf_counter()
+        async with session_factory() as db:
+            await email_handler.process_incoming_emails(db, mail)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    await mail.close()
+    await engine.dispose()
+    server.shutdown()
+    server.server_close()
+
+    print(
+        f"{mode:<9} ингестия {elapsed:6.2f} с, запросов {len(latencies):5d}, "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} мс, "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f} мс, "
+        f"max {max(latencies) * 1000:7.1f} мс"
+    )
+
+
+def main():
+    args = parse_args()
+
+    import logging
+    import os
+
+    os.environ["IMAP_FETCH_BATCH_SIZE"] = str(args.batch_size)
+
+    from benchmarks.common import use_in_memory_broker
+
+    logging.disable(logging.INFO)
+    use_in_memory_broker()
+
+    print(f"{args.messages} писем, RTT {args.rtt * 1000:.1f} мс, пачка {args.batch_size}")
+    for mode in ("blocking", "executor"):
+        asyncio.run(run(mode, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Симуляция автоназначения: тысячи операторов и высокий поток тикетов.
+
+Тикеты приходят пачками по --arrival-rate в секунду модельного времени,
+каждый закрывается через случайное время обслуживания. Для каждой стратегии
+меряется время решения на тикет и разброс открытых тикетов по операторам.
+Для сравнения - наивный выбор полным перебором операторов (O(n) на решение),
+из-за его медленности он гоняется на 1/20 тикетов.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.assignment_simulation --operators 5000 --tickets 200000
+"""
+import argparse
+import heapq
+import random
+import time
+
+SKILLS = ["vpn", "printer", "email", "billing", "access", "laptop", "phone", "wifi"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operators", type=int, default=5000, help="Количество операторов")
+    parser.add_argument("--tickets", type=int, default=200000, help="Количество тикетов")
+    parser.add_argument("--arrival-rate", type=int, default=2000, help="Новых тикетов в секунду модельного времени")
+    parser.add_argument("--mean-service", type=float, default=300, help="Среднее время до закрытия тикета, секунд")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+class ScanRouter:
+    """Наименее загруженный оператор полным перебором"""
+
+    def __init__(self, operators, loads, max_open=0):
+        self.loads = {operator_id: loads.get(operator_id, 0) for operator_id in operators}
+
+    def route(self, title):
+        return min(self.loads, key=self.loads.__getitem__)
+
+    def record(self, operator_id, delta=1):
+        self.loads[operator_id] += delta
+
+
+def make_operators(count, rng):
+    return {operator_id: rng.sample(SKILLS, 2) for operator_id in range(1, count + 1)}
+
+
+def make_titles(count, rng):
+    return [f"Проблема: {rng.choice(SKILLS)} #{index}" if rng.random() < 0.7 else f"Вопрос #{index}" for index in range(count)]
+
+
+def simulate(name, router, titles, args, rng):
+    closes = []  # (время закрытия, оператор)
+    routing = 0.0
+    now = 0.0
+    for index, title in enumerate(titles):
+        now = index / args.arrival_rate
+        while closes and closes[0][0] <= now:
+            _, operator_id = heapq.heappop(closes)
+            router.record(operator_id, -1)
+        started = time.perf_counter()
+        operator_id = router.route(title)
+        router.record(operator_id)
+        routing += time.perf_counter() - started
+        heapq.heappush(closes, (now + rng.expovariate(1 / args.mean_service), operator_id))
+
+    loads = router.loads.values()
+    print(
+        f"{name:<12} {len(titles):>7} тикетов: {routing / len(titles) * 1e6:8.2f} мкс/решение, "
+        f"открытых на оператора min {min(loads)} / max {max(loads)}"
+    )
+
+
+def main():
+    args = parse_args()
+
+    from app.api.v1.services.assignment import ROUTERS
+
+    rng = random.Random(args.seed)
+    operators = make_operators(args.operators, rng)
+    titles = make_titles(args.tickets, rng)
+    strategies = {"scan": ScanRouter, **ROUTERS}
+    for name, router_class in strategies.items():
+        tickets = titles if name != "scan" else titles[: max(len(titles) // 20, 1)]
+        simulate(name, router_class(operators, {}), tickets, args, random.Random(args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+def use_in_memory_broker():
+    """Celery на in-memory брокере: бенчмаркам не нужны ни Redis, ни воркер"""
+    from app.workers.celery_config import celery_app
+
+    celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://")
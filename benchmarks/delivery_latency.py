@@ -0,0 +1,95 @@
+"""Время от доставки письма до появления тикета: IMAP IDLE против опроса.
+
+Письма подкладываются в поддельный ящик по одному с паузой, слушатель
+watch_mailbox работает как в приложении. Для каждого письма замеряется,
+через сколько секунд в базе появился тикет.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.delivery_latency --messages 10
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import time
+
+from benchmarks.fake_imap import FakeIMAPServer, make_message
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10, help="Количество доставляемых писем")
+    parser.add_argument("--gap", type=float, default=3.0, help="Пауза между письмами, секунд")
+    return parser.parse_args()
+
+
+async def run(mode, args):
+    from sqlalchemy import func, select
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.api.v1.handlers import email_handler
+    from app.api.v1.models.models import Base, Ticket
+    from app.core.config import settings
+
+    server = FakeIMAPServer(idle=mode == "idle").start()
+    settings.IMAP_SERVER, settings.IMAP_PORT, settings.IMAP_SSL = "127.0.0.1", server.port, False
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_db():
+        async with session_factory() as session:
+            yield session
+
+    email_handler.get_db = get_db
+    listener = asyncio.create_task(email_handler.watch_mailbox())
+    await asyncio.sleep(0.5)
+
+    latencies = []
+    async with session_factory() as db:
+        for index in range(args.messages):
+            delivered = time.perf_counter()
+            server.mailbox.append(make_message(index, settings.SENDER_NAME, settings.SMTP_EMAIL))
+            while await db.scalar(select(func.count()).select_from(Ticket)) <= index:
+                await asyncio.sleep(0.01)
+            latencies.append(time.perf_counter() - delivered)
+            await asyncio.sleep(args.gap)
+
+    listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await listener
+    await engine.dispose()
+    server.shutdown()
+    server.server_close()
+    print(
+        f"{mode:<5} среднее {statistics.mean(latencies):6.2f} с, "
+        f"медиана {statistics.median(latencies):6.2f} с, max {max(latencies):6.2f} с"
+    )
+
+
+def main():
+    args = parse_args()
+
+    import logging
+
+    from app.core.config import settings
+    from benchmarks.common import use_in_memory_broker
+
+    logging.disable(logging.INFO)
+    use_in_memory_broker()
+
+    print(
+        f"{args.messages} писем с паузой {args.gap} с, опрос "
+        f"{settings.EMAIL_POLL_MIN_INTERVAL}-{settings.EMAIL_POLL_MAX_INTERVAL} с"
+    )
+    for mode in ("idle", "poll"):
+        os.environ["EMAIL_LISTENER_MODE"] = mode
+        settings.EMAIL_LISTENER_MODE = mode
+        asyncio.run(run(mode, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Минимальный IMAP4rev1 сервер для бенчмарков ингестии почты.
+
+Поддерживает только команды, которые использует email_handler. Почтовый
+ящик живёт в памяти, задержка сети имитируется паузой перед каждым ответом.
+"""
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+
+def make_message(index, sender_name, sender_email, body_size=512):
+    msg = EmailMessage()
+    msg["From"] = f"{sender_name} <{sender_email}>"
+    msg["To"] = "support@example.com"
+    msg["Subject"] = f"Обращение {index}"
+    msg["Message-ID"] = f"<bench-{index}@example.com>"
+    msg.set_content(f"Текст обращения {index}. " + "x" * body_size)
+    return msg.as_bytes()
+
+
+class Mailbox:
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.messages = []  # [uid, flags, raw]
+        self.changed = threading.Condition()
+
+    def append(self, raw, seen=False):
+        with self.changed:
+            self.messages.append([self.uidnext, {"\\Seen"} if seen else set(), raw])
+            self.uidnext += 1
+            self.changed.notify_all()
+
+    def exists(self):
+        return len(self.messages)
+
+
+def _parse_set(spec, maximum):
+    numbers = set()
+    for part in spec.split(","):
+        if ":" in part:
+            low, high = part.split(":")
+            low = maximum if low == "*" else int(low)
+            high = maximum if high == "*" else int(high)
+            low, high = min(low, high), max(low, high)
+            numbers.update(range(low, high + 1))
+        else:
+            numbers.add(maximum if part == "*" else int(part))
+    return numbers
+
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode()
+        self.wfile.write(line + b"\r\n")
+
+    def respond(self, tag, text="OK done"):
+        if self.server.rtt:
+            time.sleep(self.server.rtt)
+        self.send(f"{tag} {text}")
+        self.wfile.flush()
+
+    def handle(self):
+        self.mailbox = self.server.mailbox
+        self.send("* OK Fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode().rstrip("\r\n")
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if command == "UID":
+                command, _, args = args.partition(" ")
+                command = "UID " + command.upper()
+            handler = getattr(self, "do_" + command.replace(" ", "_"), None)
+            if handler is None:
+                self.respond(tag, f"BAD unknown command {command}")
+                continue
+            if handler(tag, args) is False:
+                return
+
+    def do_CAPABILITY(self, tag, args):
+        capabilities = "IMAP4rev1 UIDPLUS" + (" IDLE" if self.server.idle else "")
+        self.send(f"* CAPABILITY {capabilities}")
+        self.respond(tag)
+
+    def do_LOGIN(self, tag, args):
+        self.respond(tag, "OK LOGIN completed")
+
+    def do_NOOP(self, tag, args):
+        self.respond(tag)
+
+    def do_LOGOUT(self, tag, args):
+        self.send("* BYE logging out")
+        self.respond(tag)
+        return False
+
+    def do_SELECT(self, tag, args):
+        box = self.mailbox
+        self.send(f"* {box.exists()} EXISTS")
+        self.send(f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid")
+        self.send(f"* OK [UIDNEXT {box.uidnext}] Predicted next UID")
+        self.respond(tag, "OK [READ-WRITE] SELECT completed")
+
+    def do_EXAMINE(self, tag, args):
+        return self.do_SELECT(tag, args)
+
+    def do_STATUS(self, tag, args):
+        box = self.mailbox
+        name = args.split(" ")[0]
+        self.send(f"* STATUS {name} (UIDNEXT {box.uidnext} UIDVALIDITY {box.uidvalidity})")
+        self.respond(tag)
+
+    def _search(self, args, by_uid):
+        criteria = args.upper().split()
+        found = []
+        for seq, (uid, flags, _) in enumerate(self.mailbox.messages, start=1):
+            if "UNSEEN" in criteria and "\\Seen" in flags:
+                continue
+            if "UID" in criteria:
+                spec = criteria[criteria.index("UID") + 1]
+                if uid not in _parse_set(spec, self.mailbox.uidnext - 1 or 1):
+                    continue
+            found.append(uid if by_uid else seq)
+        self.send("* SEARCH" + "".join(f" {number}" for number in found))
+
+    def do_SEARCH(self, tag, args):
+        self._search(args, by_uid=False)
+        self.respond(tag)
+
+    def do_UID_SEARCH(self, tag, args):
+        self._search(args, by_uid=True)
+        self.respond(tag)
+
+    def _fetch(self, args, by_uid):
+        spec, _, items = args.partition(" ")
+        items = items.upper()
+        peek = "PEEK" in items
+        want_body = "RFC822" in items or "BODY" in items
+        item_name = "BODY[]" if "BODY" in items else "RFC822"
+        messages = self.mailbox.messages
+        maximum = (messages[-1][0] if by_uid else len(messages)) if messages else 1
+        wanted = _parse_set(spec, maximum)
+        for seq, message in enumerate(messages, start=1):
+            uid, flags, raw = message
+            if (uid if by_uid else seq) not in wanted:
+                continue
+            if want_body:
+                if not peek:
+                    flags.add("\\Seen")
+                self.wfile.write(f"* {seq} FETCH (UID {uid} {item_name} {{{len(raw)}}}\r\n".encode())
+                self.wfile.write(raw)
+                self.send(")")
+            else:
+                self.send(f"* {seq} FETCH (UID {uid})")
+
+    def do_FETCH(self, tag, args):
+        self._fetch(args, by_uid=False)
+        self.respond(tag)
+
+    def do_UID_FETCH(self, tag, args):
+        self._fetch(args, by_uid=True)
+        self.respond(tag)
+
+    def do_UID_STORE(self, tag, args):
+        spec, _, rest = args.partition(" ")
+        messages = self.mailbox.messages
+        wanted = _parse_set(spec, messages[-1][0] if messages else 1)
+        for seq, (uid, flags, _) in enumerate(messages, start=1):
+            if uid in wanted and "\\Seen" in rest:
+                flags.add("\\Seen")
+        self.respond(tag)
+
+    def do_IDLE(self, tag, args):
+        if not self.server.idle:
+            self.respond(tag, "BAD IDLE not supported")
+            return
+        box = self.mailbox
+        known = box.exists()
+        self.send("+ idling")
+        self.wfile.flush()
+        done = threading.Event()
+
+        def wait_done():
+            self.rfile.readline()
+            done.set()
+            with box.changed:
+                box.changed.notify_all()
+
+        threading.Thread(target=wait_done, daemon=True).start()
+        with box.changed:
+            while not done.is_set():
+                if box.exists() != known:
+                    known = box.exists()
+                    self.send(f"* {known} EXISTS")
+                    self.wfile.flush()
+                box.changed.wait(timeout=1)
+        self.respond(tag, "OK IDLE terminated")
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, rtt=0.0, idle=True):
+        super().__init__((host, port), IMAPHandler)
+        self.mailbox = Mailbox()
+        self.rtt = rtt
+        self.idle = idle
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
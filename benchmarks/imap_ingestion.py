@@ -0,0 +1,116 @@
+"""Бенчмарк ингестии почты: по одному письму против пакетного режима.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.imap_ingestion --messages 2000 --rtt 0.002
+
+IMAP-сервер поддельный (benchmarks/fake_imap.py), база — SQLite в памяти,
+брокер Celery — in-memory, поэтому измеряется только сам конвейер.
+"""
+import argparse
+import asyncio
+import imaplib
+import os
+import time
+
+from benchmarks.fake_imap import FakeIMAPServer, make_message
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="Количество писем в ящике")
+    parser.add_argument("--rtt", type=float, default=0.002, help="Имитация сетевой задержки IMAP, секунд")
+    parser.add_argument("--batch-size", type=int, default=200, help="Размер пачки UID FETCH")
+    return parser.parse_args()
+
+
+def start_server(args, sender_name, sender_email):
+    server = FakeIMAPServer(rtt=args.rtt).start()
+    for index in range(args.messages):
+        server.mailbox.append(make_message(index, sender_name, sender_email))
+    return server
+
+
+async def make_session_factory():
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.api.v1.models.models import Base
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def ingest_one_by_one(db, port):
+    """Прежний конвейер: FETCH, пользователь, коммит и задача на каждое письмо"""
+    from app.api.v1.handlers import email_handler
+    from app.api.v1.models.models import Ticket, TicketStatus
+    from app.workers.tasks import send_auto_reply
+
+    mail = imaplib.IMAP4("127.0.0.1", port)
+    mail.login("bench", "bench")
+    try:
+        mail.select("inbox")
+        _, messages = mail.search(None, "UNSEEN")
+        for email_id in messages[0].split():
+            _, msg_data = mail.fetch(email_id, "(RFC822)")
+            subject, from_, body = email_handler.parse_message(msg_data[0][1])
+            if subject and from_ and body:
+                user = await email_handler.ensure_user_exists(db, from_)
+                ticket = Ticket(title=subject, description=body, user_id=user.id, status=TicketStatus.NEW)
+                db.add(ticket)
+                await db.commit()
+                await db.refresh(ticket)
+                send_auto_reply.delay(user.email, ticket.id)
+    finally:
+        mail.logout()
+
+
+async def ingest_batched(db, port):
+    from app.api.v1.handlers import email_handler
+    from app.api.v1.handlers.imap_client import AsyncIMAPClient
+
+    mail = AsyncIMAPClient("127.0.0.1", port, "bench", "bench", use_ssl=False)
+    try:
+        await email_handler.process_incoming_emails(db, mail)
+    finally:
+        await mail.close()
+
+
+async def run(name, ingest, args, sender_name, sender_email):
+    from sqlalchemy import func, select
+
+    from app.api.v1.models.models import Ticket
+
+    server = start_server(args, sender_name, sender_email)
+    engine, session_factory = await make_session_factory()
+    async with session_factory() as db:
+        started = time.perf_counter()
+        await ingest(db, server.port)
+        elapsed = time.perf_counter() - started
+        created = await db.scalar(select(func.count()).select_from(Ticket))
+    await engine.dispose()
+    server.shutdown()
+    server.server_close()
+    print(f"{name:<12} {created:>7} тикетов за {elapsed:7.2f} с  ->  {created / elapsed:9.1f} писем/с")
+
+
+def main():
+    args = parse_args()
+    os.environ["IMAP_FETCH_BATCH_SIZE"] = str(args.batch_size)
+
+    import logging
+
+    from app.core.config import settings
+    from benchmarks.common import use_in_memory_broker
+
+    logging.disable(logging.INFO)
+    use_in_memory_broker()
+
+    print(f"{args.messages} писем, RTT {args.rtt * 1000:.1f} мс, пачка {args.batch_size}")
+    for name, ingest in (("по одному", ingest_one_by_one), ("пакетами", ingest_batched)):
+        asyncio.run(run(name, ingest, args, settings.SENDER_NAME, settings.SMTP_EMAIL))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Стоимость сборки письма: MIMEMultipart с нуля против скомпилированного шаблона.
+
+Оба варианта доводят письмо до строки (message.as_string()), как перед SMTP.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.notification_render --messages 20000
+"""
+import argparse
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Количество писем")
+    return parser.parse_args()
+
+
+def build_from_scratch(to_email):
+    message = MIMEMultipart()
+    message["From"] = "support@example.com"
+    message["To"] = to_email
+    message["Subject"] = "Ваше обращение #1 принято"
+    message.attach(MIMEText("Спасибо за ваше обращение. Мы начали обработку вашего тикета. Ожидайте ответа.", "plain"))
+    return message
+
+
+def run(name, build, count):
+    started = time.perf_counter()
+    for index in range(count):
+        build(f"user{index}@example.com").as_string()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<18} {count:>6} писем за {elapsed:6.2f} с -> {elapsed / count * 1e6:7.1f} мкс/письмо")
+
+
+def main():
+    args = parse_args()
+
+    from app.workers.notifications import render_notification
+
+    run("с нуля", build_from_scratch, args.messages)
+    run("шаблон", lambda to_email: render_notification("auto_reply", to_email, {"ticket_id": 1}), args.messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Пропускная способность отправки писем: новое соединение на письмо против пула.
+
+Письма уходят в локальный aiosmtpd-приёмник, который их только считает.
+STARTTLS и LOGIN приёмник не поддерживает, их стоимость имитируется
+задержкой --handshake-delay на EHLO (одна на каждое новое соединение).
+
+Запуск (нужен .env с остальными настройками приложения и пакет aiosmtpd):
+    python -m benchmarks.smtp_throughput --messages 500 --handshake-delay 0.03
+"""
+import argparse
+import asyncio
+import smtplib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+from aiosmtpd.controller import Controller
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500, help="Количество писем")
+    parser.add_argument("--threads", type=int, default=4, help="Параллельных отправителей (как потоков воркера)")
+    parser.add_argument("--handshake-delay", type=float, default=0.03, help="Имитация STARTTLS + LOGIN, секунд")
+    return parser.parse_args()
+
+
+class CountingSink:
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.received = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def make_message(index):
+    message = MIMEText(f"Уведомление {index}", "plain")
+    message["From"] = "support@example.com"
+    message["To"] = f"user{index}@example.com"
+    message["Subject"] = "Ваше обращение принято"
+    return message
+
+
+def run(name, send, args, sink):
+    sink.received = sink.connections = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(send, range(args.messages)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<22} {sink.received:>6} писем за {elapsed:6.2f} с -> "
+        f"{sink.received / elapsed:8.1f} писем/с, соединений {sink.connections}"
+    )
+
+
+def main():
+    args = parse_args()
+
+    from app.workers.smtp_pool import SMTPConnectionPool
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        host, port = probe.getsockname()
+    sink = CountingSink(args.handshake_delay)
+    controller = Controller(sink, hostname=host, port=port)
+    controller.start()
+
+    def send_new_connection(index):
+        message = make_message(index)
+        with smtplib.SMTP(host, port, timeout=10) as server:
+            server.sendmail(message["From"], message["To"], message.as_string())
+
+    pool = SMTPConnectionPool(host, port, "", "", starttls=False, max_size=args.threads, max_messages=100)
+
+    def send_pooled(index):
+        message = make_message(index)
+        pool.send_message(message, message["To"])
+
+    print(f"{args.messages} писем, {args.threads} потока, рукопожатие {args.handshake_delay * 1000:.0f} мс")
+    run("соединение на письмо", send_new_connection, args, sink)
+    run("пул соединений", send_pooled, args, sink)
+    pool.close_all()
+    controller.stop()
+
+
+if __name__ == "__main__":
+    main()
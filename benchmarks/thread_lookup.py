@@ -0,0 +1,157 @@
+"""Цена поиска переписки при ingestion в зависимости от числа хранимых писем.
+
+База наполняется тикетами и ответами (на каждый тикет --replies-per-ticket
+ответов), и на каждой контрольной точке меряется resolve_threads на пачке
+писем, половина которых отвечает на существующие письма, половина - нет.
+Для сравнения тот же поиск без индекса (выражение source_key || '' не
+попадает в уникальный индекс), из-за его медленности - только до --scan-limit писем.
+Redis в бенчмарке всегда промахивается, так что меряется именно база.
+
+Запуск (нужен .env с остальными настройками приложения):
+    python -m benchmarks.thread_lookup --messages 2000000
+    python -m benchmarks.thread_lookup --database-url postgresql+asyncpg://... --messages 5000000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+
+FILL_CHUNK_SIZE = 50000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:", help="База (пустая, таблицы создаются)")
+    parser.add_argument("--messages", type=int, default=2000000, help="Сколько писем хранить к концу прогона")
+    parser.add_argument("--checkpoints", type=int, default=4, help="Число контрольных точек (каждая x10 к предыдущей)")
+    parser.add_argument("--replies-per-ticket", type=int, default=4, help="Ответов на один тикет")
+    parser.add_argument("--batch-size", type=int, default=200, help="Писем в пачке ingestion")
+    parser.add_argument("--rounds", type=int, default=20, help="Пачек на контрольную точку")
+    parser.add_argument("--scan-limit", type=int, default=200000, help="До какого числа писем мерить поиск без индекса")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+class MissingCache:
+    """Redis, в котором никогда ничего нет"""
+
+    async def mget(self, keys):
+        return [None] * len(keys)
+
+
+def message_key(index):
+    return f"email:<thread-{index}@example.com>"
+
+
+async def fill(db, start, stop, replies_per_ticket):
+    """Письма с номерами [start, stop): каждое (replies_per_ticket + 1)-е - тикет, остальные - ответы на него"""
+    from sqlalchemy import insert
+
+    from app.api.v1.models.models import Ticket, TicketMessage, TicketStatus
+
+    group = replies_per_ticket + 1
+    created_at = datetime.utcnow()
+    for chunk_start in range(start, stop, FILL_CHUNK_SIZE):
+        indexes = range(chunk_start, min(chunk_start + FILL_CHUNK_SIZE, stop))
+        tickets = [
+            {"id": index // group + 1, "title": "t", "description": "d", "user_id": 1,
+             "status": TicketStatus.NEW, "created_at": created_at, "source_key": message_key(index)}
+            for index in indexes if index % group == 0
+        ]
+        if tickets:
+            await db.execute(insert(Ticket), tickets)
+        messages = [
+            {"ticket_id": index // group + 1, "sender_email": "user@example.com", "body": "b",
+             "created_at": created_at, "source_key": message_key(index), "raw_size": 1, "raw": b"x"}
+            for index in indexes if index % group
+        ]
+        if messages:
+            await db.execute(insert(TicketMessage), messages)
+        await db.commit()
+
+
+def make_batch(stored, args, rng):
+    from app.api.v1.handlers.email_handler import IncomingEmail
+
+    batch = []
+    for index in range(args.batch_size):
+        if index % 2:
+            references = [message_key(rng.randrange(stored)), "email:<unknown@example.com>"]
+        else:
+            references = [f"email:<missing-{rng.random()}@example.com>"]
+        batch.append(IncomingEmail("Re: t", "user@example.com", "b", b"", 0, [], f"new-{index}", references, None))
+    return batch
+
+
+async def scan_lookup(db, keys):
+    from sqlalchemy import select, union_all
+
+    from app.api.v1.models.models import Ticket, TicketMessage
+
+    result = await db.execute(union_all(
+        select(Ticket.source_key, Ticket.id).where((Ticket.source_key + "").in_(keys)),
+        select(TicketMessage.source_key, TicketMessage.ticket_id).where((TicketMessage.source_key + "").in_(keys)),
+    ))
+    return dict(result.all())
+
+
+async def measure(db, stored, args, rng):
+    from app.api.v1.handlers.email_handler import resolve_threads
+
+    batches = [make_batch(stored, args, rng) for _ in range(args.rounds)]
+    started = time.perf_counter()
+    for batch in batches:
+        threads = await resolve_threads(db, batch)
+        assert len(threads) == args.batch_size // 2
+    indexed = (time.perf_counter() - started) / (args.rounds * args.batch_size)
+
+    scanned = None
+    if stored <= args.scan_limit:
+        started = time.perf_counter()
+        for batch in batches[:2]:
+            await scan_lookup(db, [key for message in batch for key in message.references])
+        scanned = (time.perf_counter() - started) / (2 * args.batch_size)
+    await db.rollback()
+    return indexed, scanned
+
+
+async def run(args):
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.api.v1.models.models import Base, User
+    from app.api.v1.services import idempotency
+
+    idempotency.redis_client = MissingCache()
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    rng = random.Random(args.seed)
+    checkpoints = [args.messages // 10 ** power for power in reversed(range(args.checkpoints))]
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        db.add(User(id=1, name="Bench", email="user@example.com"))
+        await db.commit()
+        stored = 0
+        for checkpoint in checkpoints:
+            started = time.perf_counter()
+            await fill(db, stored, checkpoint, args.replies_per_ticket)
+            filled = time.perf_counter() - started
+            stored = checkpoint
+            indexed, scanned = await measure(db, stored, args, rng)
+            scan = f"{scanned * 1e6:10.1f} мкс/письмо" if scanned is not None else "         -"
+            print(
+                f"{stored:>10} писем (наполнение {filled:6.1f} с): "
+                f"индекс {indexed * 1e6:8.1f} мкс/письмо, без индекса {scan}"
+            )
+    await engine.dispose()
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.models.models import Base, Operator, OutboxEvent, Ticket, TicketStatus, User
+from app.api.v1.services.assignment import LeastOpenRouter, RoundRobinRouter, SkillRouter, auto_assign_batch
+from app.api.v1.services.stats import read_operator_loads, reconcile_ticket_counters
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def test_least_open_router_balances_and_respects_limit():
+    router = LeastOpenRouter({1: [], 2: [], 3: []}, {1: 2, 2: 0}, max_open=3)
+    routed = []
+    for _ in range(7):
+        operator_id = router.route("any")
+        routed.append(operator_id)
+        router.record(operator_id)
+    assert routed[:4] == [2, 3, 2, 3]
+    assert sorted(routed) == [1, 2, 2, 2, 3, 3, 3]
+    assert router.loads == {1: 3, 2: 3, 3: 3}
+    assert router.route("any") is None
+
+    router.record(1, -1)
+    assert router.route("any") == 1
+
+
+def test_round_robin_and_skill_routers():
+    router = RoundRobinRouter({3: [], 1: [], 2: []}, {2: 5}, max_open=5)
+    assert [router.route("t") for _ in range(4)] == [1, 3, 1, 3]
+
+    router = SkillRouter({1: ["vpn"], 2: ["vpn", "printer"], 3: []}, {2: 1})
+    assert router.route("VPN is down") == 1
+    router.record(1)
+    router.record(1)
+    assert router.route("vpn and printer") == 2
+    assert router.route("Broken chair") == 3
+
+
+@pytest.mark.asyncio
+async def test_auto_assign_batch(db_session):
+    user = User(name="Author", email="author@example.com")
+    busy = Operator(name="Busy", email="busy@example.com", skills=["vpn"])
+    free = Operator(name="Free", email="free@example.com", skills=[])
+    db_session.add_all([user, busy, free])
+    await db_session.flush()
+    db_session.add_all(
+        [Ticket(title="old", description="d", user_id=user.id, status=TicketStatus.IN_PROGRESS, operator_id=busy.id)]
+        + [Ticket(title=f"new {i}", description="d", user_id=user.id, status=TicketStatus.NEW) for i in range(3)]
+        + [Ticket(title="vpn down", description="d", user_id=user.id, status=TicketStatus.NEW)]
+    )
+    await db_session.commit()
+    await reconcile_ticket_counters(db_session)
+
+    assert await auto_assign_batch(db_session, "skills", limit=10) == (4, 4)
+    await db_session.commit()
+
+    result = await db_session.execute(select(Ticket.title, Ticket.operator_id, Ticket.status).where(Ticket.title != "old"))
+    assigned = {title: (operator_id, status) for title, operator_id, status in result.all()}
+    assert assigned["vpn down"] == (busy.id, TicketStatus.IN_PROGRESS)
+    assert sorted(operator_id for operator_id, _ in assigned.values()) == [busy.id, busy.id, free.id, free.id]
+    assert await read_operator_loads(db_session) == {busy.id: 3, free.id: 2}
+
+    notifications = (await db_session.execute(select(OutboxEvent.kind, OutboxEvent.to_email))).all()
+    assert notifications == [("assignment", user.email)] * 4
+    assert await auto_assign_batch(db_session, "least_open") == (0, 0)
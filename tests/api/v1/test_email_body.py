@@ -0,0 +1,45 @@
+from email.message import EmailMessage
+
+from app.api.v1.handlers.email_body import extract_body, html_to_text, normalize_body, strip_quoted
+
+
+def test_html_to_text_drops_markup_and_quotes():
+    html = (
+        "<html><head><style>p {color: red}</style></head><body>"
+        "<p>Не&nbsp;работает   <b>принтер</b></p><div>Второй абзац<br>строка</div>"
+        "<blockquote>старая переписка</blockquote><script>alert(1)</script>"
+        "</body></html>"
+    )
+    assert normalize_body(html, html=True) == "Не работает принтер\n\nВторой абзац\nстрока"
+    assert "старая" not in html_to_text(html)
+
+
+def test_strip_quoted_reply_and_signature():
+    text = "Спасибо, всё заработало.\n\n> старый ответ\nЕщё вопрос\n-- \nИван\nтел. 123"
+    assert strip_quoted(text) == "Спасибо, всё заработало.\n\nЕщё вопрос"
+
+    gmail = "Новый текст\n\nOn Mon, 1 Jan 2024 at 10:00, Support <s@example.com> wrote:\n> Старый текст"
+    assert normalize_body(gmail) == "Новый текст"
+
+    outlook = "Ответ\n\nFrom: Support <s@example.com>\nSent: Monday, January 1, 2024\nSubject: Re"
+    assert normalize_body(outlook) == "Ответ"
+
+    assert normalize_body("> только цитата") == "> только цитата"
+
+
+def test_normalize_body_caps_length():
+    body = normalize_body("слово " * 1000, max_length=100)
+    assert len(body) <= 100
+    assert body.endswith("…")
+
+
+def test_extract_body_prefers_plain_text_and_skips_attachments():
+    msg = EmailMessage()
+    msg.set_content("Текст письма")
+    msg.add_alternative("<p>HTML письма</p>", subtype="html")
+    msg.add_attachment(b"data", maintype="text", subtype="plain", filename="log.txt")
+    assert extract_body(msg) == "Текст письма"
+
+    html_only = EmailMessage()
+    html_only.set_content("<p>Только <i>HTML</i></p>", subtype="html", charset="koi8-r")
+    assert extract_body(html_only) == "Только HTML"
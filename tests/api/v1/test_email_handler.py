@@ -0,0 +1,258 @@
+import os
+import socket
+import time
+import zlib
+from email.message import EmailMessage
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.handlers.email_handler import build_message_set, ensure_users_exist, process_incoming_emails
+from app.api.v1.handlers.imap_client import AsyncIMAPClient
+from app.api.v1.handlers.attachments import attachment_path
+from app.api.v1.models.models import (
+    Base,
+    MailboxCheckpoint,
+    OutboxEvent,
+    Ticket,
+    TicketAttachment,
+    TicketMessage,
+    TicketRawMessage,
+    User,
+)
+from app.core.config import settings
+from benchmarks.fake_imap import FakeIMAPServer, make_message
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+class SocketMail:
+    """Минимальный imaplib.IMAP4 для IDLE: чтение через буферизованный файл сокета"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile("rb")
+
+    def _new_tag(self):
+        return b"A1"
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def readline(self):
+        return self.file.readline()
+
+
+def test_idle_sees_exists_buffered_with_continuation():
+    client = AsyncIMAPClient("127.0.0.1", 0, "user", "password", use_ssl=False)
+    ours, server = socket.socketpair()
+    client._mail = SocketMail(ours)
+    # Всё одним пакетом: после чтения "+ idling" остальное уже в буфере mail.file
+    server.sendall(b"+ idling\r\n* 5 EXISTS\r\nA1 OK IDLE terminated\r\n")
+
+    started = time.monotonic()
+    assert client._idle(timeout=5) is True
+    assert time.monotonic() - started < 1
+    assert server.recv(64).endswith(b"DONE\r\n")
+    ours.close()
+    server.close()
+
+
+def test_build_message_set():
+    assert build_message_set([b"7", b"1", b"2", b"3", b"9", b"10"]) == "1:3,7,9:10"
+    assert build_message_set([b"5"]) == "5"
+
+
+@pytest.mark.asyncio
+async def test_ensure_users_exist_creates_only_missing(db_session):
+    db_session.add(User(name="Existing", email="existing@example.com"))
+    await db_session.commit()
+
+    users = await ensure_users_exist(
+        db_session, ["existing@example.com", "new@example.com", "new@example.com"]
+    )
+    await db_session.commit()
+
+    assert set(users) == {"existing@example.com", "new@example.com"}
+    assert len(set(users.values())) == 2
+
+
+@pytest_asyncio.fixture
+async def imap_server():
+    server = FakeIMAPServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest_asyncio.fixture
+async def mail(imap_server):
+    client = AsyncIMAPClient("127.0.0.1", imap_server.port, "user", "password", use_ssl=False)
+    yield client
+    await client.close()
+
+
+def deliver(server, count):
+    for _ in range(count):
+        server.mailbox.append(make_message(server.mailbox.uidnext, settings.SENDER_NAME, settings.SMTP_EMAIL))
+
+
+@pytest.mark.asyncio
+async def test_process_incoming_emails_uses_uid_checkpoint(db_session, imap_server, mail):
+    imap_server.mailbox.append(b"Subject: old\r\n\r\nalready read", seen=True)
+    deliver(imap_server, 3)
+
+    assert await process_incoming_emails(db_session, mail) == 3
+    assert await db_session.scalar(select(func.count()).select_from(Ticket)) == 3
+    assert await db_session.scalar(select(MailboxCheckpoint.last_uid)) == 4
+    assert all("\\Seen" in flags for _, flags, _ in imap_server.mailbox.messages)
+    assert await db_session.scalar(select(func.count()).select_from(OutboxEvent)) == 3
+
+    assert await process_incoming_emails(db_session, mail) == 0
+
+    deliver(imap_server, 2)
+    assert await process_incoming_emails(db_session, mail) == 2
+    assert await db_session.scalar(select(func.count()).select_from(Ticket)) == 5
+    assert await db_session.scalar(select(MailboxCheckpoint.last_uid)) == 6
+
+
+@pytest.mark.asyncio
+async def test_ingestion_normalizes_body_and_stores_original(db_session, imap_server, mail, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ATTACHMENTS_DIR", str(tmp_path))
+    msg = EmailMessage()
+    msg["From"] = f"{settings.SENDER_NAME} <{settings.SMTP_EMAIL}>"
+    msg["Subject"] = "Re: printer"
+    msg.set_content("<p>Printer is <b>still</b> broken</p><blockquote>" + "old reply " * 1000 + "</blockquote>", subtype="html")
+    msg.add_attachment(b"\x89PNG" + b"0" * 4096, maintype="image", subtype="png", filename="screen.png")
+    raw = msg.as_bytes()
+    imap_server.mailbox.append(raw)
+
+    assert await process_incoming_emails(db_session, mail) == 1
+    ticket = (await db_session.execute(select(Ticket))).scalar_one()
+    assert ticket.description == "Printer is still broken"
+
+    stored = await db_session.get(TicketRawMessage, ticket.id)
+    assert stored.size == len(raw)
+    assert len(stored.data) < len(raw)
+    assert zlib.decompress(stored.data).replace(b"\r\n", b"\n") == raw.replace(b"\r\n", b"\n")
+
+    attachment = (await db_session.execute(select(TicketAttachment))).scalar_one()
+    assert (attachment.ticket_id, attachment.filename, attachment.content_type) == (ticket.id, "screen.png", "image/png")
+    with open(attachment_path(attachment.sha256), "rb") as file:
+        assert file.read() == b"\x89PNG" + b"0" * 4096
+    assert attachment.size == 4100
+    assert not [name for name in os.listdir(os.path.dirname(attachment_path(attachment.sha256))) if name.startswith(".tmp-")]
+
+
+@pytest.mark.asyncio
+async def test_redelivered_message_creates_one_ticket(db_session, imap_server, mail):
+    raw = make_message(1, settings.SENDER_NAME, settings.SMTP_EMAIL)
+    # Тот же Message-ID дважды в одной пачке и ещё раз в следующей
+    imap_server.mailbox.append(raw)
+    imap_server.mailbox.append(raw)
+    assert await process_incoming_emails(db_session, mail) == 2
+
+    imap_server.mailbox.append(raw)
+    deliver(imap_server, 1)
+    assert await process_incoming_emails(db_session, mail) == 2
+
+    source_keys = (await db_session.execute(select(Ticket.source_key).order_by(Ticket.id))).scalars().all()
+    assert source_keys == ["email:<bench-1@example.com>", "email:<bench-4@example.com>"]
+    assert await db_session.scalar(select(func.count()).select_from(TicketRawMessage)) == 2
+    assert await db_session.scalar(select(func.count()).select_from(OutboxEvent)) == 2
+
+
+
+@pytest.mark.asyncio
+async def test_stale_redis_key_does_not_drop_email(db_session, imap_server, mail, monkeypatch):
+    from app.api.v1.services import idempotency
+    from tests.core.test_cache import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(idempotency, "redis_client", redis)
+    # Ключ от тикета, которого в базе нет (удалён, база восстановлена из бэкапа)
+    redis.data["idempotency:email:<bench-1@example.com>"] = b"424242"
+    imap_server.mailbox.append(make_message(1, settings.SENDER_NAME, settings.SMTP_EMAIL))
+
+    assert await process_incoming_emails(db_session, mail) == 1
+    ticket_id = await db_session.scalar(select(Ticket.id).where(Ticket.source_key == "email:<bench-1@example.com>"))
+    assert ticket_id is not None
+    assert redis.data["idempotency:email:<bench-1@example.com>"] == str(ticket_id).encode()
+
+
+@pytest.mark.asyncio
+async def test_reply_to_missing_ticket_becomes_ticket(db_session, imap_server, mail, monkeypatch):
+    from app.api.v1.handlers import email_handler
+
+    async def stale_threads(db, messages):
+        return {message.source_key: 999999 for message in messages if message.references}
+
+    monkeypatch.setattr(email_handler, "resolve_threads", stale_threads)
+    imap_server.mailbox.append(thread_message("Re: VPN", "<orphan-1@example.com>", "<gone@example.com>"))
+    imap_server.mailbox.append(thread_message("Re: Re: VPN", "<orphan-2@example.com>", "<orphan-1@example.com>"))
+
+    assert await process_incoming_emails(db_session, mail) == 2
+    tickets = (await db_session.execute(select(Ticket.id, Ticket.source_key))).all()
+    assert [source_key for _, source_key in tickets] == ["email:<orphan-1@example.com>"]
+    messages = (await db_session.execute(select(TicketMessage.ticket_id, TicketMessage.source_key))).all()
+    assert messages == [(tickets[0].id, "email:<orphan-2@example.com>")]
+    assert await db_session.scalar(select(MailboxCheckpoint.last_uid)) == 2
+
+def thread_message(subject, message_id, in_reply_to=None, body="Текст письма"):
+    msg = EmailMessage()
+    msg["From"] = f"{settings.SENDER_NAME} <{settings.SMTP_EMAIL}>"
+    msg["Subject"] = subject
+    msg["Message-ID"] = message_id
+    if in_reply_to:
+        msg["In-Reply-To"] = in_reply_to
+        msg["References"] = f"<unknown@example.com> {in_reply_to}"
+    msg.set_content(body)
+    return msg.as_bytes()
+
+
+@pytest.mark.asyncio
+async def test_replies_are_appended_to_existing_tickets(db_session, imap_server, mail, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ATTACHMENTS_DIR", str(tmp_path))
+    imap_server.mailbox.append(thread_message("VPN", "<vpn@example.com>"))
+    assert await process_incoming_emails(db_session, mail) == 1
+    ticket_id = await db_session.scalar(select(Ticket.id))
+
+    raw = thread_message("Re: VPN", "<vpn-2@example.com>", "<vpn@example.com>", "Всё ещё не работает")
+    imap_server.mailbox.append(raw)
+    # Ответ на ответ, ответ по номеру из темы автоответа, новое письмо и ответ на него в той же пачке
+    imap_server.mailbox.append(thread_message("Re: Re: VPN", "<vpn-3@example.com>", "<vpn-2@example.com>"))
+    imap_server.mailbox.append(thread_message(f"Re: Ваше обращение #{ticket_id} принято", "<vpn-4@example.com>"))
+    imap_server.mailbox.append(thread_message("Принтер", "<printer@example.com>"))
+    imap_server.mailbox.append(thread_message("Re: Принтер", "<printer-2@example.com>", "<printer@example.com>"))
+    imap_server.mailbox.append(thread_message("Re: Ваше обращение #999 принято", "<other@example.com>"))
+    assert await process_incoming_emails(db_session, mail) == 6
+
+    tickets = (await db_session.execute(select(Ticket.title, Ticket.id).order_by(Ticket.id))).all()
+    assert [title for title, _ in tickets] == ["VPN", "Принтер", "Re: Ваше обращение #999 принято"]
+    messages = (await db_session.execute(
+        select(TicketMessage.ticket_id, TicketMessage.body).order_by(TicketMessage.id)
+    )).all()
+    assert messages == [
+        (ticket_id, "Всё ещё не работает"),
+        (ticket_id, "Текст письма"),
+        (ticket_id, "Текст письма"),
+        (tickets[1].id, "Текст письма"),
+    ]
+    # Автоответ только на новые тикеты, с номером тикета для темы
+    contexts = (await db_session.execute(select(OutboxEvent.context).order_by(OutboxEvent.id))).scalars().all()
+    assert contexts == [{"ticket_id": ticket_id}, {"ticket_id": tickets[1].id}, {"ticket_id": tickets[2].id}]
+
+    # Повторная доставка ответа ничего не добавляет
+    imap_server.mailbox.append(raw)
+    assert await process_incoming_emails(db_session, mail) == 1
+    assert await db_session.scalar(select(func.count()).select_from(TicketMessage)) == 4
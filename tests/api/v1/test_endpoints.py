@@ -1,13 +1,32 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 
 from app.main import app
-from app.core.db.session import get_db
-from app.api.v1.models.models import Base, User, Operator
+from app.core.config import settings
+from app.core.db.session import get_db, get_read_db
+from app.api.v1.handlers.attachments import compress_raw_message, write_attachment
+from app.api.v1.models.models import (
+    Base,
+    Operator,
+    OutboxEvent,
+    Ticket,
+    TicketAttachment,
+    TicketMessage,
+    TicketRawMessage,
+    TicketStatus,
+    User,
+)
+from app.api.v1.services.tickets import CURSOR_NEXT, build_tickets_page_query, encode_cursor
 
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -37,6 +56,7 @@ def test_client(db_session):
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     with TestClient(app=app, base_url="http://test") as client:
         yield client
@@ -69,6 +89,9 @@ async def test_create_tickets_success(test_client, db_session):
     assert data["description"] == payload["description"]
     assert data["user_id"] == payload["user_id"]
 
+    outbox = await db_session.execute(select(OutboxEvent.kind, OutboxEvent.to_email))
+    assert outbox.all() == [("auto_reply", "john.doe@example.com")]
+
 
 @pytest.mark.asyncio
 async def test_create_operator_success(test_client, db_session):
@@ -84,3 +107,572 @@ async def test_create_operator_success(test_client, db_session):
     operator = query.scalars().first()
     assert operator is not None
     assert operator.email == payload["email"]
+
+
+@pytest.mark.asyncio
+async def test_get_tickets_cursor_pagination(test_client, db_session):
+    user = User(name="Paging User", email="paging@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    base = datetime(2001, 1, 1)
+    db_session.add_all([
+        Ticket(
+            title=f"page {i}",
+            description="description",
+            user_id=user.id,
+            status=TicketStatus.NEW,
+            created_at=base + timedelta(minutes=i // 2),
+        )
+        for i in range(7)
+    ])
+    await db_session.commit()
+    params = {"start_date": "2001-01-01T00:00:00", "end_date": "2001-01-02T00:00:00", "limit": 3}
+
+    seen = []
+    cursor = None
+    pages = []
+    while True:
+        response = test_client.get("/api/v1/tickets/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        data = response.json()
+        assert all("description" not in item for item in data["items"])
+        pages.append(data)
+        seen.extend(item["title"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [f"page {i}" for i in reversed(range(7))]
+    assert pages[0]["prev_cursor"] is None
+
+    response = test_client.get("/api/v1/tickets/", params={**params, "cursor": pages[-1]["prev_cursor"]})
+    assert [item["title"] for item in response.json()["items"]] == [item["title"] for item in pages[-2]["items"]]
+
+    response = test_client.get("/api/v1/tickets/", params={**params, "sort_order": "asc"})
+    assert [item["title"] for item in response.json()["items"]] == ["page 0", "page 1", "page 2"]
+
+
+@pytest.mark.asyncio
+async def test_get_tickets_search(test_client, db_session):
+    user = User(name="Search User", email="search@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    base = datetime(2005, 1, 1)
+    db_session.add_all([
+        Ticket(title="Printer is broken", description="paper jam 100% of the time", user_id=user.id,
+               status=TicketStatus.NEW, created_at=base),
+        Ticket(title="Office request", description="the PRINTER on floor 2 is broken too", user_id=user.id,
+               status=TicketStatus.CLOSED, created_at=base + timedelta(minutes=1)),
+        Ticket(title="Broken chair", description="nothing to print here", user_id=user.id,
+               status=TicketStatus.NEW, created_at=base + timedelta(minutes=2)),
+    ])
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "printer  broken", "start_date": "2005-01-01T00:00:00", "limit": 1, **({"cursor": cursor} if cursor else {})}
+        data = test_client.get("/api/v1/tickets/", params=params).json()
+        seen.extend(item["title"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["Office request", "Printer is broken"]
+
+    response = test_client.get("/api/v1/tickets/", params={"q": "printer", "status": "new", "start_date": "2005-01-01T00:00:00", "sort_order": "asc"})
+    assert [item["title"] for item in response.json()["items"]] == ["Printer is broken"]
+
+    response = test_client.get("/api/v1/tickets/", params={"q": "100%", "start_date": "2005-01-01T00:00:00"})
+    assert [item["title"] for item in response.json()["items"]] == ["Printer is broken"]
+
+    # Курсор сортировки по дате не подходит для сортировки по релевантности
+    date_cursor = encode_cursor(base, 1, CURSOR_NEXT)
+    response = test_client.get("/api/v1/tickets/", params={"q": "printer", "cursor": date_cursor})
+    assert response.status_code == 400
+
+
+def test_search_query_matches_index_expression():
+    query, _ = build_tickets_page_query(None, None, None, None, None, 10, "printer", "postgresql")
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    index = next(index for index in Ticket.__table__.indexes if index.name == "ix_tickets_search")
+    expression = str(index.expressions[0].compile(dialect=postgresql.dialect()))
+    assert f"({expression}) @@ websearch_to_tsquery('simple', " in sql
+
+
+@pytest.mark.asyncio
+async def test_ticket_raw_message_and_attachments(test_client, db_session, tmp_path, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ATTACHMENTS_DIR", str(tmp_path))
+    user = User(name="Raw User", email="raw@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    ticket = Ticket(title="raw", description="d", user_id=user.id)
+    db_session.add(ticket)
+    await db_session.flush()
+    raw = b"Subject: raw\r\n\r\nbody"
+    db_session.add(TicketRawMessage(ticket_id=ticket.id, size=len(raw), data=compress_raw_message(raw)))
+    db_session.add(TicketAttachment(
+        ticket_id=ticket.id, filename="log.txt", content_type="text/plain", size=3, sha256=write_attachment(b"log")
+    ))
+    await db_session.commit()
+
+    response = test_client.get(f"/api/v1/tickets/{ticket.id}/raw")
+    assert response.headers["content-type"] == "message/rfc822"
+    assert response.content == raw
+
+    attachments = test_client.get(f"/api/v1/tickets/{ticket.id}/attachments").json()
+    assert [(a["filename"], a["size"]) for a in attachments] == [("log.txt", 3)]
+    response = test_client.get(f"/api/v1/tickets/{ticket.id}/attachments/{attachments[0]['id']}")
+    assert response.content == b"log"
+    assert test_client.get(f"/api/v1/tickets/{ticket.id + 1}/raw").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_ticket_messages(test_client, db_session):
+    user = User(name="Thread User", email="thread@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    ticket = Ticket(title="thread", description="first", user_id=user.id)
+    db_session.add(ticket)
+    await db_session.flush()
+    raw = b"Subject: Re: thread\r\n\r\nsecond"
+    for index, body in enumerate(["second", "third"]):
+        db_session.add(TicketMessage(
+            ticket_id=ticket.id,
+            sender_email=user.email,
+            body=body,
+            created_at=datetime(2006, 1, 1, index),
+            raw_size=len(raw),
+            raw=compress_raw_message(raw),
+        ))
+    await db_session.commit()
+
+    messages = test_client.get(f"/api/v1/tickets/{ticket.id}/messages").json()
+    assert [message["body"] for message in messages] == ["second", "third"]
+    response = test_client.get(f"/api/v1/tickets/{ticket.id}/messages/{messages[0]['id']}/raw")
+    assert response.content == raw
+    assert test_client.get(f"/api/v1/tickets/{ticket.id + 1}/messages/{messages[0]['id']}/raw").status_code == 404
+
+
+def test_get_tickets_invalid_cursor(test_client):
+    response = test_client.get("/api/v1/tickets/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_tickets_ndjson_and_csv(test_client, db_session):
+    user = User(name="Export User", email="export@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    db_session.add_all([
+        Ticket(
+            title=f"export {i}",
+            description="exported description",
+            user_id=user.id,
+            status=TicketStatus.CLOSED if i % 2 else TicketStatus.NEW,
+            created_at=datetime(2002, 1, 1) + timedelta(hours=i),
+        )
+        for i in range(5)
+    ])
+    await db_session.commit()
+    params = {"start_date": "2002-01-01T00:00:00", "end_date": "2002-01-02T00:00:00"}
+
+    response = test_client.get("/api/v1/tickets/export", params={**params, "status": "new"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["export 0", "export 2", "export 4"]
+    assert rows[0]["description"] == "exported description"
+    assert rows[0]["status"] == "new"
+
+    response = test_client.get("/api/v1/tickets/export", params={**params, "format": "csv"})
+    assert response.status_code == 200
+    lines = list(csv.reader(io.StringIO(response.text)))
+    assert lines[0][:3] == ["id", "title", "description"]
+    assert len(lines) == 6
+
+
+@pytest.mark.asyncio
+async def test_ticket_transitions(test_client, db_session):
+    user = User(name="Transition User", email="transition@example.com")
+    operator = Operator(name="Transition Operator", email="transition.operator@example.com")
+    db_session.add_all([user, operator])
+    await db_session.flush()
+    tickets = [Ticket(title=f"transition {i}", description="d", user_id=user.id, status=TicketStatus.NEW) for i in range(2)]
+    db_session.add_all(tickets)
+    await db_session.commit()
+    ticket, other = (t.id for t in tickets)
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        response = test_client.patch(f"/api/v1/tickets/assign/{ticket}/{operator.id}")
+        assert response.status_code == 200
+        # В SQLite снимок строки читается отдельно, в PostgreSQL это часть UPDATE (см. test_stats.py)
+        assert statements == ["SELECT", "UPDATE", "INSERT"]
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    assert test_client.patch(f"/api/v1/tickets/assign/{ticket}/{operator.id}").status_code == 400
+    response = test_client.patch(f"/api/v1/tickets/assign/{other}/999999")
+    assert (response.status_code, response.json()["detail"]) == (404, "Operator not found")
+    assert test_client.patch(f"/api/v1/tickets/update-status/{other}", params={"status": "in_progress"}).status_code == 200
+
+    response = test_client.put(f"/api/v1/tickets/tickets/{ticket}/close")
+    assert response.status_code == 200
+    assert test_client.put(f"/api/v1/tickets/tickets/{ticket}/close").status_code == 400
+    assert test_client.put("/api/v1/tickets/tickets/999999/close").status_code == 404
+    assert test_client.patch(f"/api/v1/tickets/update-status/{ticket}", params={"status": "new"}).status_code == 400
+
+    rows = await db_session.execute(
+        select(Ticket.id, Ticket.status, Ticket.operator_id).where(Ticket.id.in_([ticket, other])).order_by(Ticket.id)
+    )
+    assert rows.all() == [(ticket, TicketStatus.CLOSED, operator.id), (other, TicketStatus.IN_PROGRESS, None)]
+    outbox = await db_session.execute(select(OutboxEvent.kind).where(OutboxEvent.to_email == user.email))
+    assert outbox.scalars().all() == ["close"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_transitions(test_client, db_session):
+    user = User(name="Bulk User", email="bulk@example.com")
+    operator = Operator(name="Bulk Operator", email="bulk.operator@example.com")
+    db_session.add_all([user, operator])
+    await db_session.flush()
+    tickets = [
+        Ticket(
+            title=f"bulk {i}",
+            description="d",
+            user_id=user.id,
+            status=TicketStatus.CLOSED if i == 3 else TicketStatus.NEW,
+            created_at=datetime(2003, 1, 1) + timedelta(hours=i),
+        )
+        for i in range(4)
+    ]
+    db_session.add_all(tickets)
+    await db_session.commit()
+    ids = [t.id for t in tickets]
+
+    response = test_client.post(
+        "/api/v1/tickets/bulk/assign",
+        json={"ticket_ids": [ids[0], ids[1], ids[3], 999999], "operator_id": operator.id},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["updated"] == 2
+    assert {r["ticket_id"]: r["outcome"] for r in data["results"]} == {
+        ids[0]: "ok", ids[1]: "ok", ids[3]: "invalid_state", 999999: "not_found"
+    }
+
+    response = test_client.post("/api/v1/tickets/bulk/assign", json={"ticket_ids": [ids[2]], "operator_id": 999999})
+    assert response.status_code == 404
+
+    response = test_client.post(
+        "/api/v1/tickets/bulk/close",
+        json={"filter": {"start_date": "2003-01-01T00:00:00", "end_date": "2003-01-01T02:00:00"}},
+    )
+    assert response.status_code == 200
+    assert response.json()["updated"] == 3
+    outbox = await db_session.execute(select(OutboxEvent.kind).where(OutboxEvent.to_email == user.email))
+    assert outbox.scalars().all() == ["close"] * 3
+
+    response = test_client.post("/api/v1/tickets/bulk/update-status", json={"ticket_ids": ids, "status": "in_progress"})
+    assert [r["outcome"] for r in response.json()["results"]] == ["invalid_state"] * 4
+
+    assert test_client.post("/api/v1/tickets/bulk/close", json={}).status_code == 422
+    assert test_client.post("/api/v1/tickets/bulk/close", json={"filter": {}}).status_code == 422
+
+
+
+
+@pytest.mark.asyncio
+async def test_bulk_filter_is_capped_with_cursor(test_client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "TICKETS_BULK_MAX_SIZE", 2)
+    user = User(name="Window User", email="window@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    tickets = [
+        Ticket(
+            title=f"window {i}",
+            description="d",
+            user_id=user.id,
+            status=TicketStatus.NEW,
+            created_at=datetime(2009, 1, 1) + timedelta(hours=i),
+        )
+        for i in range(5)
+    ]
+    db_session.add_all(tickets)
+    await db_session.commit()
+
+    # Смена статуса оставляет тикеты под фильтром: дальше ведёт только курсор
+    body = {"filter": {"start_date": "2009-01-01T00:00:00", "end_date": "2009-01-02T00:00:00"}, "status": "in_progress"}
+    windows = []
+    while True:
+        response = test_client.post("/api/v1/tickets/bulk/update-status", json=body)
+        assert response.status_code == 200
+        data = response.json()
+        windows.append([result["ticket_id"] for result in data["results"]])
+        if data["next_cursor"] is None:
+            break
+        body["cursor"] = data["next_cursor"]
+    ids = [t.id for t in tickets]
+    assert windows == [ids[:2], ids[2:4], ids[4:]]
+
+    body["cursor"] = "garbage"
+    assert test_client.post("/api/v1/tickets/bulk/update-status", json=body).status_code == 400
+    response = test_client.post("/api/v1/tickets/bulk/close", json={"ticket_ids": ids, "cursor": body["cursor"]})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_bulk_transition_retries_lost_race(test_client, db_session, monkeypatch):
+    from app.api.v1.services import transitions
+
+    user = User(name="Race User", email="race@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    tickets = [Ticket(title=f"race {i}", description="d", user_id=user.id, status=TicketStatus.NEW) for i in range(2)]
+    db_session.add_all(tickets)
+    await db_session.commit()
+    ids = [t.id for t in tickets]
+
+    # Первый UPDATE пропускает строку, как если бы её изменили после снимка
+    transition = transitions._transition
+    calls = []
+
+    async def losing_transition(db, select_tickets, *args):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            return await transition(
+                db, lambda statement: select_tickets(statement).where(transitions.tickets.c.id != ids[1]), *args
+            )
+        return await transition(db, select_tickets, *args)
+
+    monkeypatch.setattr(transitions, "_transition", losing_transition)
+    response = test_client.post("/api/v1/tickets/bulk/close", json={"ticket_ids": ids})
+    assert response.status_code == 200
+    assert response.json()["updated"] == 2
+    assert [r["outcome"] for r in response.json()["results"]] == ["ok", "ok"]
+    assert len(calls) == 2
+    outbox = await db_session.execute(select(OutboxEvent.kind).where(OutboxEvent.to_email == user.email))
+    assert outbox.scalars().all() == ["close"] * 2
+
+@pytest.mark.asyncio
+async def test_import_users_upsert(test_client, db_session):
+    db_session.add(User(name="Old Name", email="import1@example.com"))
+    await db_session.commit()
+
+    body = "\n".join([
+        json.dumps({"name": "New Name", "email": "import1@example.com"}),
+        json.dumps({"name": "Second", "email": "import2@example.com"}),
+        "not json",
+        json.dumps({"name": "Bad", "email": "not-an-email"}),
+        "",
+    ])
+    response = test_client.post("/api/v1/tickets/import_users", content=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["imported"], data["failed"]) == (2, 2)
+    assert [error["line"] for error in data["errors"]] == [3, 4]
+
+    csv_body = "name,email\r\nThird,import3@example.com\r\nSecond Renamed,import2@example.com\r\n"
+    response = test_client.post("/api/v1/tickets/import_users", params={"format": "csv"}, content=csv_body)
+    assert response.json()["imported"] == 2
+
+    rows = await db_session.execute(
+        select(User.email, User.name).where(User.email.like("import%")).order_by(User.email)
+    )
+    assert rows.all() == [
+        ("import1@example.com", "New Name"),
+        ("import2@example.com", "Second Renamed"),
+        ("import3@example.com", "Third"),
+    ]
+
+
+
+@pytest.mark.asyncio
+async def test_import_operators_updates_skills(test_client, db_session):
+    db_session.add_all([
+        Operator(name="Skilled", email="skilled@example.com", skills=["vpn"]),
+        Operator(name="Kept", email="kept@example.com", skills=["billing"]),
+    ])
+    await db_session.commit()
+
+    body = "\n".join([
+        json.dumps({"name": "Skilled", "email": "skilled@example.com", "skills": ["VPN", "Printer"]}),
+        json.dumps({"name": "Kept Renamed", "email": "kept@example.com"}),
+    ])
+    response = test_client.post("/api/v1/tickets/import_operators", content=body)
+    assert response.json()["imported"] == 2
+
+    # Поле в кавычках с переводом строки и навыки через запятую
+    csv_body = 'name,email,skills\r\n"Multi\r\nLine",multiline@example.com,"mail, vpn"\r\nBroken,"oops\r\n'
+    response = test_client.post("/api/v1/tickets/import_operators", params={"format": "csv"}, content=csv_body)
+    data = response.json()
+    assert (data["imported"], data["failed"]) == (1, 1)
+    assert [error["line"] for error in data["errors"]] == [4]
+
+    rows = await db_session.execute(
+        select(Operator.email, Operator.name, Operator.skills)
+        .where(Operator.email.in_(["skilled@example.com", "kept@example.com", "multiline@example.com"]))
+        .order_by(Operator.email)
+    )
+    assert rows.all() == [
+        ("kept@example.com", "Kept Renamed", ["billing"]),
+        ("multiline@example.com", "Multi\r\nLine", ["mail", "vpn"]),
+        ("skilled@example.com", "Skilled", ["vpn", "printer"]),
+    ]
+
+def test_create_user_duplicate(test_client):
+    payload = {"name": "Duplicate", "email": "duplicate@example.com"}
+    assert test_client.post("/api/v1/tickets/create_user", json=payload).status_code == 200
+    response = test_client.post("/api/v1/tickets/create_user", json=payload)
+    assert (response.status_code, response.json()["detail"]) == (400, "User already exists")
+
+
+@pytest.mark.asyncio
+async def test_get_tickets_cached_until_ticket_changes(test_client, db_session, monkeypatch):
+    from app.api.v1.services.tickets import tickets_cache
+    from tests.core.test_cache import FakeRedis
+
+    monkeypatch.setattr(tickets_cache, "client", FakeRedis())
+    monkeypatch.setattr(tickets_cache, "ttl", 60)
+    user = User(name="Cache User", email="cache@example.com")
+    db_session.add(user)
+    await db_session.commit()
+    params = {"start_date": "2004-01-01T00:00:00", "end_date": "2004-01-02T00:00:00"}
+
+    first = test_client.get("/api/v1/tickets/", params=params).json()
+    db_session.add(Ticket(title="cached", description="d", user_id=user.id, created_at=datetime(2004, 1, 1, 1)))
+    await db_session.commit()
+    assert test_client.get("/api/v1/tickets/", params=params).json() == first == {
+        "items": [], "next_cursor": None, "prev_cursor": None
+    }
+
+    ticket_id = (await db_session.execute(select(Ticket.id).where(Ticket.title == "cached"))).scalar()
+    assert test_client.patch(f"/api/v1/tickets/update-status/{ticket_id}", params={"status": "in_progress"}).status_code == 200
+    items = test_client.get("/api/v1/tickets/", params=params).json()["items"]
+    assert [(item["title"], item["status"]) for item in items] == [("cached", "in_progress")]
+
+    stats = test_client.get("/api/v1/tickets/cache/stats").json()["tickets"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_create_ticket_idempotency_key(test_client, db_session, monkeypatch):
+    from app.api.v1.services import idempotency
+    from tests.core.test_cache import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(idempotency, "redis_client", redis)
+    user = User(name="Retry User", email="retry@example.com")
+    db_session.add(user)
+    await db_session.commit()
+    payload = {"title": "retry", "description": "request timed out", "user_id": user.id}
+    headers = {"Idempotency-Key": "3f0c2d9e-retry"}
+
+    first = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers=headers)
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+    assert redis.data == {f"idempotency:api:{user.id}:3f0c2d9e-retry": str(first.json()["id"]).encode()}
+
+    # Повтор из кэша Redis и, когда Redis недоступен, из базы
+    replayed = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers=headers)
+    redis.down = True
+    from_db = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers=headers)
+    for response in (replayed, from_db):
+        assert response.status_code == 200
+        assert response.headers["Idempotent-Replayed"] == "true"
+        assert response.json() == first.json()
+
+    other = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers={"Idempotency-Key": "other"})
+    assert other.json()["id"] != first.json()["id"]
+    tickets = await db_session.execute(select(Ticket.id).where(Ticket.user_id == user.id))
+    assert len(tickets.all()) == 2
+    outbox = await db_session.execute(select(OutboxEvent.id).where(OutboxEvent.to_email == "retry@example.com"))
+    assert len(outbox.all()) == 2
+
+
+
+@pytest.mark.asyncio
+async def test_create_ticket_idempotency_stale_redis_id(test_client, db_session, monkeypatch):
+    from app.api.v1.services import idempotency
+    from tests.core.test_cache import FakeRedis
+
+    redis = FakeRedis()
+    monkeypatch.setattr(idempotency, "redis_client", redis)
+    user = User(name="Stale User", email="stale@example.com")
+    db_session.add(user)
+    await db_session.commit()
+    payload = {"title": "stale", "description": "redis outlived the ticket", "user_id": user.id}
+    created = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers={"Idempotency-Key": "created"})
+    created_key = f"idempotency:api:{user.id}:created"
+    missing_key = f"idempotency:api:{user.id}:missing"
+
+    # В Redis id несуществующего тикета и id тикета с другим ключом
+    redis.data[created_key] = b"999999"
+    redis.data[missing_key] = str(created.json()["id"]).encode()
+    replayed = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers={"Idempotency-Key": "created"})
+    assert replayed.status_code == 200
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json() == created.json()
+    assert redis.data[created_key] == str(created.json()["id"]).encode()
+
+    fresh = test_client.post("/api/v1/tickets/create_ticket", json=payload, headers={"Idempotency-Key": "missing"})
+    assert fresh.status_code == 200 and "Idempotent-Replayed" not in fresh.headers
+    assert fresh.json()["id"] != created.json()["id"]
+    assert redis.data[missing_key] == str(fresh.json()["id"]).encode()
+
+
+def test_metrics_endpoint(test_client):
+    assert test_client.get("/api/v1/tickets/stats").status_code == 200
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert 'route="/api/v1/tickets/stats"' in response.text
+    assert "servicedesk_http_db_queries_bucket" in response.text
+
+
+@pytest.mark.asyncio
+async def test_get_tickets_reads_replica_and_settles_after_invalidation(test_client, db_session, monkeypatch):
+    from app.api.v1.services.tickets import tickets_cache
+    from tests.core.test_cache import FakeRedis
+
+    # Реплика, которая ещё не получила ни одной записи
+    replica = create_async_engine(TEST_DATABASE_URL)
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def lagging_replica():
+        async with async_sessionmaker(bind=replica, class_=AsyncSession)() as session:
+            yield session
+
+    redis = FakeRedis()
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, lagging_replica)
+    monkeypatch.setattr(tickets_cache, "client", redis)
+    monkeypatch.setattr(tickets_cache, "ttl", settings.TICKETS_CACHE_TTL)
+    monkeypatch.setattr(tickets_cache, "settle", 1)
+    user = User(name="Replica User", email="replica@example.com")
+    db_session.add(user)
+    await db_session.flush()
+    db_session.add(Ticket(title="fresh", description="d", user_id=user.id, created_at=datetime(2007, 1, 1, 1)))
+    await db_session.commit()
+    params = {"start_date": "2007-01-01T00:00:00", "end_date": "2007-01-02T00:00:00"}
+
+    def titles():
+        return [item["title"] for item in test_client.get("/api/v1/tickets/", params=params).json()["items"]]
+
+    # С кэшем по умолчанию промах читается с реплики
+    assert titles() == []
+    # Сразу после сброса страница с реплики отдаётся, но не сохраняется
+    await tickets_cache.invalidate()
+    assert titles() == []
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, app.dependency_overrides[get_db])
+    assert titles() == ["fresh"]
+    # Окно отставания прошло: промах сохраняется и отдаётся из кэша
+    del redis.data[tickets_cache.settling_key]
+    assert titles() == ["fresh"]
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, lagging_replica)
+    assert titles() == ["fresh"]
+    await replica.dispose()
@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.models.models import TicketStatus
+from app.api.v1.services.feed import (
+    PENDING_EVENTS,
+    TicketFeedHub,
+    publish_ticket_events,
+    queue_ticket_events,
+    ticket_event,
+    ticket_feed,
+)
+from app.core.config import settings
+
+
+class FakeStreamRedis:
+    """Redis Stream в памяти: XADD через pipeline, XRANGE, XREVRANGE и блокирующий XREAD"""
+
+    def __init__(self):
+        self.entries = []
+        self.sequence = 0
+        self.added = asyncio.Event()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.sequence += 1
+        entry_id = f"1-{self.sequence}".encode()
+        self.entries.append((entry_id, {key.encode(): value.encode() for key, value in fields.items()}))
+        if maxlen is not None:
+            del self.entries[:-maxlen]
+        self.added.set()
+        return entry_id
+
+    @staticmethod
+    def _sequence(entry_id):
+        return int(entry_id.split(b"-" if isinstance(entry_id, bytes) else "-")[1])
+
+    async def xrange(self, stream, min="-", max="+", count=None):
+        start = -1
+        if min != "-":
+            start = self._sequence(min.lstrip("("))
+        entries = [entry for entry in self.entries if self._sequence(entry[0]) > start]
+        return entries[:count] if count else entries
+
+    async def xrevrange(self, stream, count=None):
+        return list(reversed(self.entries))[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        (stream, last_id), = streams.items()
+        while True:
+            entries = await self.xrange(stream, min=f"({last_id}", count=count)
+            if entries:
+                return [(stream.encode(), entries)]
+            self.added.clear()
+            try:
+                await asyncio.wait_for(self.added.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                return []
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def xadd(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+    async def execute(self):
+        return [self.client.xadd(*args, **kwargs) for args, kwargs in self.commands]
+
+
+def created(ticket_id, status=TicketStatus.NEW):
+    return ticket_event("created", ticket_id, status)
+
+
+async def publish(client, *events):
+    class Session:
+        info = {}
+
+    session = Session()
+    queue_ticket_events(session, list(events))
+    await publish_ticket_events(session, client)
+
+
+async def next_event(feed):
+    while True:
+        chunk = await asyncio.wait_for(feed.__anext__(), 1)
+        if chunk.startswith("id:"):
+            lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+            return lines["id"], json.loads(lines["data"])
+
+
+@pytest.mark.asyncio
+async def test_pending_events_are_dropped_on_rollback():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with async_sessionmaker(bind=engine, class_=AsyncSession)() as db:
+        await db.execute(text("SELECT 1"))
+        queue_ticket_events(db, [created(1)])
+        await db.rollback()
+        assert PENDING_EVENTS not in db.info
+
+        client = FakeStreamRedis()
+        queue_ticket_events(db, [created(2), created(3)])
+        await db.commit()
+        await publish_ticket_events(db, client)
+        assert [json.loads(fields[b"data"])["ticket_id"] for _, fields in client.entries] == [2, 3]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_feed_resumes_from_last_event_id_and_filters(monkeypatch):
+    monkeypatch.setattr(settings, "FEED_HEARTBEAT_INTERVAL", 0.05)
+    client = FakeStreamRedis()
+    hub = TicketFeedHub(client)
+    await publish(client, created(1), created(2, TicketStatus.CLOSED), created(3))
+
+    matches = lambda data: data["status"] == "new"
+    feed = ticket_feed(matches, "1-1", hub=hub, client=client)
+    assert await next_event(feed) == ("1-3", created(3))
+
+    await publish(client, created(4, TicketStatus.CLOSED), created(5))
+    assert await next_event(feed) == ("1-5", created(5))
+    # Между событиями уходит heartbeat
+    assert await asyncio.wait_for(feed.__anext__(), 1) == ": ping\n\n"
+    await feed.aclose()
+    assert not hub.subscribers
+    await hub.close()
+
+
+@pytest.mark.asyncio
+async def test_feed_hub_closes_overflowing_subscriber(monkeypatch):
+    monkeypatch.setattr(settings, "FEED_SUBSCRIBER_QUEUE_SIZE", 2)
+    client = FakeStreamRedis()
+    hub = TicketFeedHub(client)
+    slow = await hub.subscribe()
+    await publish(client, created(1), created(2), created(3))
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert slow.get_nowait() is None
+    assert slow not in hub.subscribers
+    await hub.close()
+
+
+def test_feed_rejects_invalid_last_event_id():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app=app, base_url="http://test") as client:
+        response = client.get("/api/v1/tickets/feed", headers={"Last-Event-ID": "not-an-id"})
+    assert response.status_code == 400
@@ -0,0 +1,122 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.api.v1.enums.enums import SortOrder
+from app.api.v1.models.models import TicketStatus
+from app.api.v1.services.tickets import CURSOR_NEXT, build_tickets_page_query, encode_cursor
+from app.api.v1.services.transitions import build_bulk_window_query, tickets
+
+
+# Планы проверяются только на Postgres: TEST_POSTGRES_URL=postgresql+asyncpg://...
+# Схема строится миграциями (alembic upgrade head), как в рабочей базе,
+# поэтому база должна быть пустой или уже мигрированной
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "alembic")
+
+
+@pytest.fixture(scope="module")
+def migrated_schema():
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    previous = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = TEST_POSTGRES_URL
+    try:
+        command.upgrade(config, "head")
+    finally:
+        if previous is None:
+            del os.environ["DATABASE_URL"]
+        else:
+            os.environ["DATABASE_URL"] = previous
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+CURSOR = encode_cursor(datetime(2024, 6, 1), 1000, CURSOR_NEXT)
+RANK_CURSOR = encode_cursor(datetime(2024, 6, 1), 1000, CURSOR_NEXT, 0.5)
+
+QUERY_SHAPES = {
+    "no filters": (None, None, None, SortOrder.late, None),
+    "status": (TicketStatus.NEW, None, None, SortOrder.late, None),
+    "status and dates": (TicketStatus.IN_PROGRESS, datetime(2024, 1, 1), datetime(2024, 12, 31), SortOrder.early, None),
+    "dates": (None, datetime(2024, 1, 1), datetime(2024, 12, 31), SortOrder.late, None),
+    "status next page": (TicketStatus.NEW, None, None, SortOrder.late, CURSOR),
+    "dates next page": (None, datetime(2024, 1, 1), None, SortOrder.early, CURSOR),
+    "search": (None, None, None, None, None, "printer error"),
+    "search next page": (None, None, None, None, RANK_CURSOR, "printer error"),
+    "search by date": (TicketStatus.NEW, None, None, SortOrder.late, None, "printer"),
+}
+
+
+async def _seq_scans(query):
+    engine = create_async_engine(TEST_POSTGRES_URL)
+    try:
+        async with engine.begin() as conn:
+            # На пустой таблице seq scan дешевле любого индекса, поэтому
+            # запрещаем его: если он всё равно выбран, подходящего индекса нет
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+            result = await conn.execute(Explain(query))
+            plan = result.scalar()
+    finally:
+        await engine.dispose()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return [
+        node["Relation Name"]
+        for node in _plan_nodes(plan[0]["Plan"])
+        if node["Node Type"] == "Seq Scan"
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shape", QUERY_SHAPES)
+async def test_ticket_list_queries_use_indexes(shape, migrated_schema):
+    status, start_date, end_date, sort_order, cursor, *search = QUERY_SHAPES[shape]
+    query, _ = build_tickets_page_query(status, start_date, end_date, sort_order, cursor, 50, *search)
+    seq_scans = await _seq_scans(query)
+    assert not seq_scans, f"{shape}: sequential scan on {seq_scans}"
+
+
+BULK_WINDOW_SHAPES = {
+    "close by dates": ({"start_date": datetime(2024, 1, 1), "end_date": datetime(2024, 12, 31)}, None),
+    "close next window": ({"start_date": datetime(2024, 1, 1)}, (datetime(2024, 6, 1), 1000)),
+    "close by status": ({"status": TicketStatus.IN_PROGRESS}, None),
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shape", BULK_WINDOW_SHAPES)
+async def test_bulk_window_queries_use_indexes(shape, migrated_schema):
+    filters, after = BULK_WINDOW_SHAPES[shape]
+    filters = {"status": None, "start_date": None, "end_date": None, **filters}
+    query = build_bulk_window_query(filters, after, tickets.c.status != TicketStatus.CLOSED)
+    seq_scans = await _seq_scans(query)
+    assert not seq_scans, f"{shape}: sequential scan on {seq_scans}"
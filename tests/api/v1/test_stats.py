@@ -0,0 +1,107 @@
+import os
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.models.models import Base, Operator, Ticket, TicketCounter, TicketStatus, User
+from app.api.v1.services import transitions
+from app.api.v1.services.stats import read_ticket_stats, reconcile_ticket_counters, record_created_tickets
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+async def counters_snapshot(db):
+    result = await db.execute(
+        select(TicketCounter.scope, TicketCounter.scope_key, TicketCounter.status, TicketCounter.count)
+    )
+    totals = {}
+    for scope, scope_key, status, count in result.all():
+        totals[(scope, scope_key, status)] = totals.get((scope, scope_key, status), 0) + count
+    return {key: count for key, count in totals.items() if count}
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_transitions_and_match_reconcile(db_session):
+    user = User(name="Stats", email="stats@example.com")
+    operator = Operator(name="Stats Operator", email="stats.operator@example.com")
+    db_session.add_all([user, operator])
+    await db_session.flush()
+    created_at = datetime.utcnow()
+    tickets = [
+        Ticket(title=f"stats {i}", description="d", user_id=user.id, status=TicketStatus.NEW, created_at=created_at)
+        for i in range(4)
+    ]
+    db_session.add_all(tickets)
+    await record_created_tickets(db_session, [(TicketStatus.NEW, None, created_at)] * 4)
+    await db_session.commit()
+
+    await transitions.assign_ticket(db_session, tickets[0].id, operator.id)
+    await transitions.close_ticket(db_session, tickets[0].id)
+    await transitions.update_ticket_status(db_session, tickets[1].id, TicketStatus.IN_PROGRESS)
+    await transitions.bulk_close_tickets(db_session, ticket_ids=[tickets[2].id, tickets[0].id])
+    await db_session.commit()
+
+    stats = await read_ticket_stats(db_session, days=1)
+    assert stats["by_status"] == {"new": 1, "in_progress": 1, "closed": 2}
+    assert stats["by_operator"] == [
+        {"operator_id": operator.id, "counts": {"closed": 1}},
+        {"operator_id": None, "counts": {"new": 1, "in_progress": 1, "closed": 1}},
+    ]
+    assert stats["by_day"] == [
+        {"day": created_at.date().isoformat(), "counts": {"new": 1, "in_progress": 1, "closed": 2}}
+    ]
+
+    incremental = await counters_snapshot(db_session)
+    await reconcile_ticket_counters(db_session)
+    assert await counters_snapshot(db_session) == incremental
+
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+async def test_postgres_transition_is_single_update():
+    engine = create_async_engine(TEST_POSTGRES_URL)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as db:
+            user = User(name="Stats", email="stats@example.com")
+            db.add(user)
+            await db.flush()
+            ticket = Ticket(title="pg", description="d", user_id=user.id, status=TicketStatus.NEW)
+            db.add(ticket)
+            await db.commit()
+
+            statements = []
+
+            def count(conn, cursor, statement, *args):
+                statements.append(statement.split()[0])
+
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                assert await transitions.close_ticket(db, ticket.id) == "stats@example.com"
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+            await db.commit()
+
+            # UPDATE перехода и INSERT счётчиков
+            assert statements == ["UPDATE", "INSERT"]
+            assert (await read_ticket_stats(db, days=1))["by_status"]["closed"] == 1
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
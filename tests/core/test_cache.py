@@ -0,0 +1,93 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.core.cache import ResponseCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise RedisConnectionError("redis is down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value.encode()
+
+    async def incr(self, key):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+
+    async def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("set", key, str(value)))
+
+    def incr(self, key):
+        self.commands.append(("incr", key))
+
+    async def execute(self):
+        self.client._check()
+        for name, *args in self.commands:
+            await getattr(self.client, name)(*args)
+
+
+@pytest.mark.asyncio
+async def test_response_cache_hits_and_generation_invalidation():
+    cache = ResponseCache("test", ttl=60, client=FakeRedis())
+    produced = []
+
+    async def produce():
+        produced.append(1)
+        return f"body {len(produced)}"
+
+    assert await cache.get_or_set({"limit": 10, "cursor": None}, produce) == "body 1"
+    assert await cache.get_or_set({"cursor": None, "limit": 10}, produce) == "body 1"
+    assert await cache.get_or_set({"limit": 20, "cursor": None}, produce) == "body 2"
+
+    await cache.invalidate()
+    assert await cache.get_or_set({"limit": 10, "cursor": None}, produce) == "body 3"
+    assert cache.stats() == {"hits": 1, "misses": 3, "errors": 0}
+
+
+@pytest.mark.asyncio
+async def test_response_cache_falls_back_when_redis_is_down():
+    client = FakeRedis()
+    client.down = True
+    cache = ResponseCache("test", ttl=60, client=client)
+
+    async def produce():
+        return "fresh"
+
+    assert await cache.get_or_set({}, produce) == "fresh"
+    await cache.invalidate()
+    assert cache.stats() == {"hits": 0, "misses": 0, "errors": 2}
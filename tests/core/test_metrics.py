@@ -0,0 +1,70 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.metrics import MetricsMiddleware, render_metrics
+
+
+@pytest.fixture
+def client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession)
+
+    async def get_db():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/{item_id}")
+    async def read_item(item_id: int, db: AsyncSession = Depends(get_db)):
+        await db.execute(text("SELECT 1"))
+        return {"id": (await db.execute(text("SELECT :id"), {"id": item_id})).scalar()}
+
+    @app.get("/metrics-stream")
+    async def read_stream():
+        async def events():
+            yield "data: 1\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_latency_and_queries_per_route(client):
+    route = "/metrics-test/{item_id}"
+    requests = sample("servicedesk_http_request_duration_seconds_count", method="GET", route=route, status="200")
+    queries = sample("servicedesk_http_db_queries_sum", route=route)
+    selects = sample("servicedesk_db_query_duration_seconds_count", operation="select")
+
+    assert client.get("/metrics-test/1").json() == {"id": 1}
+    assert client.get("/metrics-test/2").json() == {"id": 2}
+    assert client.get("/missing/3").status_code == 404
+
+    assert sample("servicedesk_http_request_duration_seconds_count", method="GET", route=route, status="200") == requests + 2
+    assert sample("servicedesk_http_db_queries_sum", route=route) == queries + 4
+    assert sample("servicedesk_db_query_duration_seconds_count", operation="select") == selects + 4
+    body, content_type = render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b"/missing" not in body
+    assert b'route="/metrics-test/{item_id}"' in body
+
+
+def test_event_streams_are_kept_out_of_request_latency(client):
+    route = "/metrics-stream"
+    streams = sample("servicedesk_http_stream_duration_seconds_count", route=route)
+
+    assert client.get(route).text == "data: 1\n\n"
+
+    assert sample("servicedesk_http_stream_duration_seconds_count", route=route) == streams + 1
+    assert sample("servicedesk_http_request_duration_seconds_count", method="GET", route=route, status="200") == 0
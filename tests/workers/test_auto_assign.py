@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.workers import auto_assign
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_worker_pauses_when_full_batch_is_not_assigned(monkeypatch):
+    batches = iter([(200, 200), (0, 200)])
+    sleeps = []
+
+    async def assign_batch(db):
+        return next(batches)
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        raise asyncio.CancelledError
+
+    async def noop(*args):
+        pass
+
+    monkeypatch.setattr(settings, "AUTO_ASSIGN_BATCH_SIZE", 200)
+    monkeypatch.setattr(auto_assign, "async_session", FakeSession)
+    monkeypatch.setattr(auto_assign, "auto_assign_batch", assign_batch)
+    monkeypatch.setattr(auto_assign, "publish_ticket_events", noop)
+    monkeypatch.setattr(auto_assign.tickets_cache, "invalidate", noop)
+    monkeypatch.setattr(auto_assign.asyncio, "sleep", sleep)
+
+    with pytest.raises(asyncio.CancelledError):
+        await auto_assign.run_auto_assign()
+    # Полная назначенная пачка - сразу следующая, полная неназначенная - пауза
+    assert sleeps == [settings.AUTO_ASSIGN_INTERVAL]
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.core.lease import RedisLease
+from app.workers.ingest import claim_folders, hold_folder, lease_key
+
+
+class FakeLeaseRedis:
+    """SET NX и скрипты продления/освобождения аренды без TTL"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != token:
+            return 0
+        if "DEL" in script:
+            del self.data[key]
+        return 1
+
+
+async def watch_forever(folder):
+    await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_each_folder_is_held_by_one_worker(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_FOLDERS_PER_WORKER", 2)
+    client = FakeLeaseRedis()
+    folders = ["inbox", "support", "billing"]
+
+    first = await claim_folders(client, folders, {}, watch_forever)
+    second = await claim_folders(client, folders, {}, watch_forever)
+    assert len(first) == 2 and len(second) == 1
+    await asyncio.sleep(0)
+    assert set(first) | set(second) == set(folders)
+
+    # Первый воркер остановился и освободил аренды: папки забирает второй
+    for task in first.values():
+        task.cancel()
+    await asyncio.gather(*first.values(), return_exceptions=True)
+    await claim_folders(client, folders, second, watch_forever)
+    assert len(second) == 2
+    await asyncio.sleep(0)
+    assert sum(lease_key(folder) in client.data for folder in folders) == 2
+
+    for task in second.values():
+        task.cancel()
+    await asyncio.gather(*second.values(), return_exceptions=True)
+    assert not client.data
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_stops_reading(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_LEASE_TTL", 0.03)
+    client = FakeLeaseRedis()
+    lease = RedisLease(client, lease_key("inbox"), settings.INGEST_LEASE_TTL)
+    assert await lease.acquire()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def watch(folder):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            cancelled.set()
+
+    holder = asyncio.create_task(hold_folder("inbox", lease, watch))
+    await started.wait()
+    client.data[lease_key("inbox")] = "other worker"
+    await asyncio.wait_for(holder, 1)
+    assert cancelled.is_set()
+    assert client.data[lease_key("inbox")] == "other worker"
+
+
+@pytest.mark.asyncio
+async def test_crashed_watcher_is_logged_and_counted(caplog):
+    client = FakeLeaseRedis()
+
+    async def crash(folder):
+        raise RuntimeError("imap is gone")
+
+    def failures():
+        return REGISTRY.get_sample_value("servicedesk_ingest_watcher_failures_total", {"folder": "crashy"}) or 0
+
+    before = failures()
+    held = await claim_folders(client, ["crashy"], {}, crash)
+    await asyncio.gather(*held.values(), return_exceptions=True)
+    with caplog.at_level(logging.ERROR, logger="app.workers.ingest"):
+        held = await claim_folders(client, ["crashy"], held, watch_forever)
+    assert "crashy" in caplog.text and "imap is gone" in caplog.text
+    assert failures() == before + 1
+    # Аренда освобождена, папку сразу захватывает новый слушатель
+    assert not held["crashy"].done()
+    held["crashy"].cancel()
+    await asyncio.gather(*held.values(), return_exceptions=True)
@@ -0,0 +1,40 @@
+from email import message_from_string
+
+import pytest
+
+from app.workers.notifications import TEMPLATES, UnknownNotificationError, render_notification
+
+
+def test_static_template_reuses_prebuilt_body():
+    first = render_notification("auto_reply", "first@example.com", {"ticket_id": 1})
+    second = render_notification("auto_reply", "second@example.com", {"ticket_id": 2})
+
+    assert first["To"] == "first@example.com"
+    assert first["Subject"] == "Ваше обращение #1 принято"
+    assert first.get_payload() is second.get_payload()
+    parsed = message_from_string(first.as_string())
+    assert [part.get_content_type() for part in parsed.walk()] == ["multipart/alternative", "text/plain", "text/html"]
+    assert "Мы начали обработку" in parsed.get_payload()[0].get_payload(decode=True).decode()
+
+
+def test_template_substitutes_context_and_escapes_html():
+    message = render_notification(
+        "assignment", "user@example.com", {"ticket_id": 7, "operator_name": "<Иван>"}
+    )
+    text, html = message.get_payload()
+
+    assert message["Subject"] == "Обращение #7 назначено оператору"
+    assert "оператор <Иван>" in text.get_payload(decode=True).decode()
+    assert "&lt;Иван&gt;" in html.get_payload(decode=True).decode()
+
+
+def test_auto_reply_without_ticket_id_uses_old_subject():
+    # Задачи и события outbox, поставленные до появления номера тикета в теме
+    assert render_notification("auto_reply", "user@example.com")["Subject"] == "Ваше обращение принято"
+    assert render_notification("auto_reply", "user@example.com", {})["Subject"] == "Ваше обращение принято"
+
+
+def test_unknown_template():
+    assert {"auto_reply", "close", "status_change", "assignment"} <= set(TEMPLATES)
+    with pytest.raises(UnknownNotificationError):
+        render_notification("missing", "user@example.com")
@@ -0,0 +1,63 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.models.models import Base, OutboxEvent
+from app.api.v1.services.outbox import enqueue_notifications
+from app.workers import outbox_relay
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    batches = []
+    monkeypatch.setattr(outbox_relay.send_notification_batch, "delay", batches.append)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_outbox_in_batches(db_session, published):
+    await enqueue_notifications(
+        db_session,
+        [("auto_reply", f"user{index}@example.com", None) for index in range(5)]
+        + [("status_change", "user0@example.com", {"ticket_id": 1, "status": "closed"})],
+    )
+    await db_session.commit()
+
+    assert await outbox_relay.relay_outbox_batch(db_session, limit=4) == 4
+    assert await outbox_relay.relay_outbox_batch(db_session, limit=4) == 2
+    assert await outbox_relay.relay_outbox_batch(db_session, limit=4) == 0
+
+    assert [len(batch) for batch in published] == [4, 2]
+    assert published[1][1] == {
+        "kind": "status_change",
+        "to_email": "user0@example.com",
+        "context": {"ticket_id": 1, "status": "closed"},
+    }
+    assert await db_session.scalar(select(func.count()).select_from(OutboxEvent)) == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_events_when_broker_is_down(db_session, monkeypatch):
+    def broker_down(notifications):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(outbox_relay.send_notification_batch, "delay", broker_down)
+    await enqueue_notifications(db_session, [("close", "user@example.com", None)])
+    await db_session.commit()
+
+    with pytest.raises(ConnectionError):
+        await outbox_relay.relay_outbox_batch(db_session)
+    await db_session.rollback()
+
+    assert await db_session.scalar(select(func.count()).select_from(OutboxEvent)) == 1
@@ -0,0 +1,113 @@
+import smtplib
+from email.mime.text import MIMEText
+
+import pytest
+
+from app.workers import smtp_pool as smtp_pool_module
+from app.workers.smtp_pool import SMTPConnectionPool
+
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.fail_next = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return (250, b"OK")
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if self.fail_next:
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        self.sent.append(to_addrs)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeSMTP.instances = []
+    monkeypatch.setattr(smtp_pool_module.smtplib, "SMTP", FakeSMTP)
+    return SMTPConnectionPool("localhost", 25, "user", "password", max_size=2, max_messages=3)
+
+
+def make_message(to_email):
+    message = MIMEText("body")
+    message["From"] = "support@example.com"
+    message["To"] = to_email
+    return message
+
+
+def test_pool_reuses_connection_and_rotates_after_limit(pool):
+    for index in range(5):
+        pool.send_message(make_message(f"user{index}@example.com"), f"user{index}@example.com")
+
+    assert len(FakeSMTP.instances) == 2
+    assert len(FakeSMTP.instances[0].sent) == 3
+    assert FakeSMTP.instances[0].closed
+    assert len(FakeSMTP.instances[1].sent) == 2
+
+
+def test_pool_reconnects_after_disconnect(pool):
+    pool.send_message(make_message("first@example.com"), "first@example.com")
+    FakeSMTP.instances[0].fail_next = True
+
+    pool.send_message(make_message("second@example.com"), "second@example.com")
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+    assert FakeSMTP.instances[1].sent == ["second@example.com"]
+
+
+def test_send_messages_uses_one_connection_and_reports_per_recipient(pool):
+    messages = [(make_message(f"user{index}@example.com"), f"user{index}@example.com") for index in range(3)]
+    original_sendmail = FakeSMTP.sendmail
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if to_addrs == "user1@example.com":
+            raise smtplib.SMTPRecipientsRefused({to_addrs: (550, b"unknown")})
+        return original_sendmail(self, from_addr, to_addrs, msg)
+
+    FakeSMTP.sendmail = sendmail
+    try:
+        errors = pool.send_messages(messages)
+    finally:
+        FakeSMTP.sendmail = original_sendmail
+
+    assert len(FakeSMTP.instances) == 1
+    assert FakeSMTP.instances[0].sent == ["user0@example.com", "user2@example.com"]
+    assert errors[0] is None and errors[2] is None
+    assert errors[1]
+
+
+def test_notification_batch_keeps_results_sent_before_unexpected_error(pool, monkeypatch):
+    from app.workers import tasks
+
+    original_sendmail = FakeSMTP.sendmail
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if to_addrs == "user1@example.com":
+            raise RuntimeError("unexpected")
+        return original_sendmail(self, from_addr, to_addrs, msg)
+
+    monkeypatch.setattr(FakeSMTP, "sendmail", sendmail)
+    monkeypatch.setattr(tasks, "smtp_pool", pool)
+    notifications = [{"kind": "close", "to_email": f"user{index}@example.com"} for index in range(3)]
+
+    results = tasks.send_notification_batch(notifications)
+
+    assert FakeSMTP.instances[0].sent == ["user0@example.com"]
+    assert [result["status"] for result in results] == ["sent", "failed", "failed"]